@@ -22,9 +22,12 @@
 
 from __future__ import print_function
 import fnmatch
+import multiprocessing
 import os
+import re
 import shutil
 import logging
+import tempfile
 
 import git
 import six
@@ -40,11 +43,18 @@ from rebasehelper.output_tool import output_tools_runner
 from rebasehelper.checker import checkers_runner
 from rebasehelper.build_helper import srpm_build_helper, build_helper, SourcePackageBuildError, BinaryPackageBuildError
 from rebasehelper.patch_helper import Patcher
-from rebasehelper.exceptions import RebaseHelperError, CheckerNotFoundError
+from rebasehelper.exceptions import RebaseHelperError
 from rebasehelper.results_store import results_store
+from rebasehelper.scheduler import StageScheduler
 from rebasehelper.versioneer import versioneers_runner
 from rebasehelper.version import VERSION
 from rebasehelper.helpers.path_helper import PathHelper
+from rebasehelper.helpers.build_cache_helper import BuildCacheHelper
+from rebasehelper.helpers.spec_cache_helper import SpecCacheHelper
+from rebasehelper.helpers.source_cache_helper import SourceCacheHelper
+from rebasehelper.helpers.parallel_helper import ParallelHelper
+from rebasehelper.helpers.timing_helper import TimingHelper
+from rebasehelper.helpers.limit_helper import LimitHelper
 from rebasehelper.helpers.macro_helper import MacroHelper
 from rebasehelper.helpers.input_helper import InputHelper
 from rebasehelper.helpers.git_helper import GitHelper
@@ -52,6 +62,11 @@ from rebasehelper.helpers.koji_helper import KojiHelper
 from rebasehelper.helpers.lookaside_cache_helper import LookasideCacheHelper
 
 
+def _extract_archive(archive_path, destination):
+    """Extracts an archive, to be called in a worker process, see Application.extract_archive()"""
+    Archive(archive_path).extract_archive(destination)
+
+
 class Application(object):
     result_file = ""
     temp_dir = ""
@@ -68,6 +83,16 @@ class Application(object):
     report_log_file = None
     rebased_patches = {}
     rebased_repo = None
+    reuse_old_build = False
+    incremental_build = False
+
+    # maximal time in seconds extraction of an archive in a worker process can take
+    EXTRACTION_TIMEOUT = 60 * 60
+
+    # lines rpmbuild uses to report files missing in or from %files sections
+    FILES_ERROR_RE = re.compile(r'^(BUILDSTDERR:)?\s*(error:\s*)?'
+                                r'(File\s+not\s+found:|Installed\s+\(but\s+unpackaged\)\s+file\(s\)\s+found:)',
+                                re.MULTILINE)
 
     def __init__(self, cli_conf, execution_dir, results_dir, debug_log_file):
         """
@@ -84,6 +109,14 @@ class Application(object):
 
         self.debug_log_file = debug_log_file
 
+        # outcomes of builds of the old version run in advance
+        self.prebuilt_builds = {}
+
+        # source archives extracted while being downloaded
+        self.streamed_sources = []
+
+        SpecCacheHelper.persistent = bool(self.conf.persistent_spec_cache)
+
         # Temporary workspace for Builder, checks, ...
         self.kwargs['workspace_dir'] = self.workspace_dir = os.path.join(self.execution_dir, constants.WORKSPACE_DIR)
         # Directory where results should be put
@@ -185,15 +218,16 @@ class Application(object):
         """
         self.rebase_spec_file_path = get_rebase_name(self.rebased_sources_dir, self.spec_file_path)
 
-        self.spec_file = SpecFile(self.spec_file_path,
-                                  self.conf.changelog_entry,
-                                  self.execution_dir,
-                                  download=not self.conf.not_download_sources)
+        with TimingHelper.measure('stages', 'parse_spec_files'):
+            self.spec_file = SpecFile(self.spec_file_path,
+                                      self.conf.changelog_entry,
+                                      self.execution_dir,
+                                      download=not self.conf.not_download_sources)
+            # create an object representing the rebased SPEC file
+            self.rebase_spec_file = self.spec_file.copy(self.rebase_spec_file_path)
         # Check whether test suite is enabled at build time
         if not self.spec_file.is_test_suite_enabled():
             results_store.set_info_text('WARNING', 'Test suite is not enabled at build time.')
-        # create an object representing the rebased SPEC file
-        self.rebase_spec_file = self.spec_file.copy(self.rebase_spec_file_path)
 
         if not self.conf.sources:
             self.conf.sources = versioneers_runner.run(self.conf.versioneer,
@@ -207,9 +241,10 @@ class Application(object):
                                         'and no SOURCES argument specified!')
 
         # Prepare rebased_sources_dir
-        self.rebased_repo = self._prepare_rebased_repository(self.spec_file.patches,
-                                                             self.execution_dir,
-                                                             self.rebased_sources_dir)
+        with TimingHelper.measure('stages', 'init_rebased_repository'):
+            self.rebased_repo = self._prepare_rebased_repository(self.spec_file.patches,
+                                                                 self.execution_dir,
+                                                                 self.rebased_sources_dir)
 
         # check if argument passed as new source is a file or just a version
         if [True for ext in Archive.get_supported_archives() if self.conf.sources.endswith(ext)]:
@@ -230,11 +265,17 @@ class Application(object):
         spec_hooks_runner.run_spec_hooks(self.spec_file, self.rebase_spec_file, **self.kwargs)
 
         # spec file object has been sanitized downloading can proceed
-        for spec_file in [self.spec_file, self.rebase_spec_file]:
-            if spec_file.download:
-                spec_file.download_remote_sources()
-                # parse spec again with sources downloaded to properly expand %prep section
-                spec_file._update_data()  # pylint: disable=protected-access
+        with TimingHelper.measure('stages', 'download_sources'):
+            for spec_file, sources_dir in zip([self.spec_file, self.rebase_spec_file],
+                                              [constants.OLD_SOURCES_DIR, constants.NEW_SOURCES_DIR]):
+                if spec_file.download:
+                    extract = None
+                    if not self.conf.no_streaming_extraction:
+                        # extract main sources while they are being downloaded
+                        extract = {spec_file.get_archive(): os.path.join(self.workspace_dir, sources_dir)}
+                    self.streamed_sources.extend(spec_file.download_remote_sources(extract))
+                    # parse spec again with sources downloaded to properly expand %prep section
+                    spec_file._update_data()  # pylint: disable=protected-access
 
     def _initialize_data(self):
         """Function fill dictionary with default data"""
@@ -352,12 +393,14 @@ class Application(object):
         os.makedirs(os.path.join(results_dir, constants.REBASED_SOURCES_DIR))
 
     @staticmethod
-    def extract_archive(archive_path, destination):
+    def extract_archive(archive_path, destination, isolated=False):
         """
         Extracts given archive into the destination and handle all exceptions.
 
         :param archive_path: path to the archive to be extracted
         :param destination: path to a destination, where the archive should be extracted to
+        :param isolated: whether to extract the archive in a worker process of the pool started by
+            ParallelHelper.start_process_pool(), so that concurrent extractions don't contend for GIL
         :return:
         """
         try:
@@ -367,17 +410,49 @@ class Application(object):
                                     Archive.get_supported_archives()))
 
         try:
-            archive.extract_archive(destination)
+            with TimingHelper.measure('extractions', os.path.basename(archive_path),
+                                      bytes=os.path.getsize(archive_path)):
+                if isolated:
+                    ParallelHelper.call_in_process(_extract_archive, archive_path, destination,
+                                                   timeout=Application.EXTRACTION_TIMEOUT)
+                else:
+                    archive.extract_archive(destination)
         except IOError:
             raise RebaseHelperError("Archive '%s' can not be extracted" % archive_path)
         except (EOFError, SystemError):
             raise RebaseHelperError("Archive '%s' is damaged" % archive_path)
+        except RuntimeError as e:
+            raise RebaseHelperError("Extraction of archive '%s' failed: %s" % (archive_path, six.text_type(e)))
 
     @staticmethod
-    def extract_sources(archive_path, destination):
-        """Function extracts a given Archive and returns a full dirname to sources"""
-        Application.extract_archive(archive_path, destination)
+    def extract_sources(archive_path, destination, isolated=False, cache_size=None, hardlink=False):
+        """
+        Function extracts a given Archive and returns a full dirname to sources
+
+        :param archive_path: path to the archive to be extracted
+        :param destination: path to a destination, where the archive should be extracted to
+        :param isolated: whether to extract the archive in a child process
+        :param cache_size: maximal size of the cache of extracted archives in bytes,
+            the cache is not used if None, evicting entries is up to the caller
+        :param hardlink: whether to hardlink cached files instead of copying them
+        :return: full dirname to sources
+        """
+        if cache_size is None:
+            Application.extract_archive(archive_path, destination, isolated)
+        else:
+            key = SourceCacheHelper.get_key(archive_path)
+            cached = SourceCacheHelper.lookup(key, destination, hardlink)
+            if not cached and SourceCacheHelper.store(key, os.path.basename(archive_path),
+                                                      lambda path: Application.extract_archive(archive_path, path,
+                                                                                               isolated)):
+                cached = SourceCacheHelper.lookup(key, destination, hardlink)
+            if not cached:
+                Application.extract_archive(archive_path, destination, isolated)
+        return Application.get_sources_dir(destination)
 
+    @staticmethod
+    def get_sources_dir(destination):
+        """Function returns a full dirname to sources extracted into destination"""
         files = os.listdir(destination)
 
         if not files:
@@ -391,50 +466,97 @@ class Application(object):
         # archive without top-level directory
         return destination
 
+    @staticmethod
+    def _merge_tree(source, destination):
+        """Moves content of a directory into another one, replacing existing files as extraction would."""
+        if not os.path.isdir(destination):
+            os.makedirs(destination)
+        for name in os.listdir(source):
+            src = os.path.join(source, name)
+            dst = os.path.join(destination, name)
+            if os.path.isdir(src) and not os.path.islink(src) and os.path.isdir(dst) and not os.path.islink(dst):
+                Application._merge_tree(src, dst)
+                continue
+            if os.path.isdir(dst) and not os.path.islink(dst):
+                shutil.rmtree(dst)
+            elif os.path.lexists(dst):
+                os.remove(dst)
+            os.rename(src, dst)
+
     def prepare_sources(self):
         """
         Function prepares a sources.
 
+        All archives are extracted concurrently, unless limited by --extraction-workers.
+        Targets of the rest of source archives can depend on top-level directories
+        of the main sources, so they are extracted into temporary directories and moved
+        to their targets afterwards.
+
         :return:
         """
-
-        old_sources_dir = os.path.join(self.execution_dir, constants.WORKSPACE_DIR, constants.OLD_SOURCES_DIR)
-        new_sources_dir = os.path.join(self.execution_dir, constants.WORKSPACE_DIR, constants.NEW_SOURCES_DIR)
-
-        old_dir = Application.extract_sources(self.old_sources, old_sources_dir)
-        new_dir = Application.extract_sources(self.new_sources, new_sources_dir)
-
-        old_tld = os.path.relpath(old_dir, old_sources_dir)
-        new_tld = os.path.relpath(new_dir, new_sources_dir)
-
-        dirname = self.spec_file.get_setup_dirname()
-
-        if dirname and os.sep in dirname:
-            dirs = os.path.split(dirname)
-            if old_tld == dirs[0]:
-                old_dir = os.path.join(old_dir, *dirs[1:])
-            if new_tld == dirs[0]:
-                new_dir = os.path.join(new_dir, *dirs[1:])
-
-        new_dirname = os.path.relpath(new_dir, new_sources_dir)
-
-        if new_dirname != '.':
-            self.rebase_spec_file.update_setup_dirname(new_dirname)
-
-        # extract rest of source archives to correct paths
-        rest_sources = [self.old_rest_sources, self.new_rest_sources]
-        spec_files = [self.spec_file, self.rebase_spec_file]
-        sources_dirs = [
-            os.path.join(constants.WORKSPACE_DIR, constants.OLD_SOURCES_DIR),
-            os.path.join(constants.WORKSPACE_DIR, constants.NEW_SOURCES_DIR),
-        ]
-        for sources, spec_file, sources_dir in zip(rest_sources, spec_files, sources_dirs):
+        workspace_dir = os.path.join(self.execution_dir, constants.WORKSPACE_DIR)
+        old_sources_dir = os.path.join(workspace_dir, constants.OLD_SOURCES_DIR)
+        new_sources_dir = os.path.join(workspace_dir, constants.NEW_SOURCES_DIR)
+
+        rest_archives = []
+        for sources, spec_file, sources_dir in zip([self.old_rest_sources, self.new_rest_sources],
+                                                   [self.spec_file, self.rebase_spec_file],
+                                                   [old_sources_dir, new_sources_dir]):
             for rest in sources:
-                archive = [x for x in Archive.get_supported_archives() if rest.endswith(x)]
-                if archive:
-                    dest_dir = spec_file.find_archive_target_in_prep(rest)
-                    if dest_dir:
-                        Application.extract_sources(rest, os.path.join(self.execution_dir, sources_dir, dest_dir))
+                if Archive.get_archive_type(rest) and spec_file.find_archive_target_in_prep(rest):
+                    rest_archives.append((rest, spec_file, sources_dir))
+
+        if not os.path.isdir(workspace_dir):
+            os.makedirs(workspace_dir)
+        staging_dirs = [tempfile.mkdtemp(prefix='.extract-', dir=workspace_dir) for _ in rest_archives]
+        try:
+            extractions = [(self.old_sources, old_sources_dir), (self.new_sources, new_sources_dir)]
+            extractions.extend((rest, staging_dir) for (rest, _, _), staging_dir in zip(rest_archives, staging_dirs))
+            workers = self.conf.extraction_workers
+            # the process pool is started by run() before any threads
+            isolated = workers != 1 and ParallelHelper.has_process_pool()
+            streamed = [os.path.abspath(s) for s in self.streamed_sources]
+            cache_size = self._get_source_cache_size()
+
+            def extract(archive_path, destination):
+                if os.path.abspath(archive_path) in streamed:
+                    logger.verbose("Archive '%s' has been extracted during download", archive_path)
+                    return self.get_sources_dir(destination)
+                return self.extract_sources(archive_path, destination, isolated, cache_size,
+                                            self.conf.source_cache_hardlinks)
+
+            results = ParallelHelper.run(extract, extractions, workers=workers)
+            if cache_size is not None:
+                # evict only after all trees are materialized, extractions run concurrently
+                # and materialized trees don't depend on the cache
+                SourceCacheHelper.evict(cache_size)
+            old_dir, new_dir = results[:2]
+
+            old_tld = os.path.relpath(old_dir, old_sources_dir)
+            new_tld = os.path.relpath(new_dir, new_sources_dir)
+
+            dirname = self.spec_file.get_setup_dirname()
+
+            if dirname and os.sep in dirname:
+                dirs = os.path.split(dirname)
+                if old_tld == dirs[0]:
+                    old_dir = os.path.join(old_dir, *dirs[1:])
+                if new_tld == dirs[0]:
+                    new_dir = os.path.join(new_dir, *dirs[1:])
+
+            new_dirname = os.path.relpath(new_dir, new_sources_dir)
+
+            if new_dirname != '.':
+                self.rebase_spec_file.update_setup_dirname(new_dirname)
+
+            # move rest of source archives to correct paths
+            for (rest, spec_file, sources_dir), staging_dir in zip(rest_archives, staging_dirs):
+                dest_dir = spec_file.find_archive_target_in_prep(rest)
+                if dest_dir:
+                    self._merge_tree(staging_dir, os.path.join(sources_dir, dest_dir))
+        finally:
+            for staging_dir in staging_dirs:
+                shutil.rmtree(staging_dir, ignore_errors=True)
 
         return [old_dir, new_dir]
 
@@ -539,9 +661,70 @@ class Application(object):
             'build_tasks',
             'builder_options',
             'srpm_builder_options',
+            'concurrent_build_id',
+            'cpus',
+            'build_tree_dir',
+            'incremental_build',
         ]
         return {k: v for k, v in six.iteritems(build_dict) if k not in blacklist}
 
+    def _get_rebase_spec_sections(self):
+        return {k.lower(): list(v) for k, v in six.iteritems(self.rebase_spec_file.spec_content.sections)}
+
+    def _get_versions_to_build(self):
+        """Gets versions of the package that need to be built.
+
+        Returns:
+            list: 'new' if results of the old version from the previous run can be reused,
+            'old' and 'new' otherwise.
+
+        """
+        return ['new'] if self.reuse_old_build else ['old', 'new']
+
+    def _get_stage_workers(self):
+        """Gets maximal number of rebase stages to run at the same time.
+
+        Returns:
+            int: Number of stages, unlimited if None. Stages are run sequentially
+            in interactive mode by default, because they can ask for user input.
+
+        """
+        if self.conf.stage_workers is not None:
+            return self.conf.stage_workers
+        return None if self.conf.non_interactive else 1
+
+    def _can_prebuild_old_version(self):
+        if self._get_stage_workers() == 1 or self.conf.build_tasks is not None:
+            return False
+        if self.conf.comparepkgs or self.conf.patch_only or self.conf.builds_nowait or self.reuse_old_build:
+            return False
+        try:
+            srpm_build_helper.get_tool(self.conf.srpm_buildtool)
+            builder = build_helper.get_tool(self.conf.buildtool)
+        except NotImplementedError:
+            return False
+        return not builder.CREATES_TASKS
+
+    def prebuild_old_version(self):
+        """Builds source and binary packages of the old version in advance.
+
+        The old version doesn't depend on preparation and patching of the sources,
+        so it can be built alongside. Nothing is stored, the outcomes are picked up
+        by build_source_packages() and build_binary_packages(), which report them
+        as if the builds were run at that point.
+        """
+        srpm_builder = srpm_build_helper.get_tool(self.conf.srpm_buildtool)
+        builder = build_helper.get_tool(self.conf.buildtool)
+        build_dict, error = self.prebuilt_builds['srpm'] = self._build_source_package(srpm_builder, 'old')
+        if error is not None:
+            return
+        try:
+            args = self._prepare_binary_package_build(builder, 'old', self._sanitize_build_dict(build_dict))
+        except Exception:  # pylint: disable=broad-except
+            # let the failure be reported by build_binary_packages()
+            return
+        self.prebuilt_builds['rpm'] = self._build_binary_package(builder, 'old', *args)
+
     def build_source_packages(self):
         try:
             builder = srpm_build_helper.get_tool(self.conf.srpm_buildtool)
@@ -549,25 +732,70 @@ class Application(object):
             raise RebaseHelperError('{}. Supported SRPM build tools are {}'.format(
                 six.text_type(e), srpm_build_helper.get_supported_tools()))
 
-        for version in ['old', 'new']:
-            koji_build_id = None
-            results_dir = '{}-build'.format(os.path.join(self.results_dir, version))
-            spec = self.spec_file if version == 'old' else self.rebase_spec_file
-            package_name = spec.get_package_name()
-            package_version = spec.get_version()
-            package_full_version = spec.get_full_version()
-            logger.info('Building source package for %s version %s', package_name, package_full_version)
+        versions = self._get_versions_to_build()
+        prebuilt = self._pop_prebuilt_builds('srpm', versions)
+        remaining = [v for v in versions if v not in prebuilt]
+        if builder.PARALLEL_SAFE and not self.conf.serial_srpm_builds and len(remaining) > 1:
+            logger.info('Building old and new source packages concurrently')
+            built = iter(ParallelHelper.run(self._build_source_package, [(builder, v) for v in remaining]))
+        else:
+            # lazy evaluation ensures the new version is not built if building the old one fails
+            built = (self._build_source_package(builder, v) for v in remaining)
 
-            if version == 'old' and self.conf.get_old_build_from_koji:
-                koji_build_id, package_version, package_full_version = KojiHelper.get_old_build_info(package_name,
-                                                                                                     package_version)
+        # results are always processed in the same order, the first failure is reported
+        for version in versions:
+            build_dict, error = prebuilt[version] if version in prebuilt else next(built)
+            self._store_source_package(builder, version, build_dict, error)
 
-            build_dict = dict(
-                name=package_name,
-                version=package_version,
-                srpm_buildtool=self.conf.srpm_buildtool,
-                srpm_builder_options=self.conf.srpm_builder_options)
+    def _pop_prebuilt_builds(self, kind, versions):
+        """Takes outcomes of builds run in advance by prebuild_old_version().
+
+        Args:
+            kind (str): Kind of the builds, 'srpm' or 'rpm'.
+            versions (list): Versions that are going to be built.
+
+        Returns:
+            dict: Outcomes of builds of the specified versions that were run in advance.
+
+        """
+        outcome = self.prebuilt_builds.pop(kind, None)
+        if outcome is None or 'old' not in versions:
+            return {}
+        logger.verbose('Using %s build of the old version run in advance', kind.upper())
+        return {'old': outcome}
+
+    def _build_source_package(self, builder, version):
+        """Builds source package of the specified version.
+
+        Args:
+            builder (rebasehelper.build_helper.SRPMBuildToolBase): SRPM build tool to use.
+            version (str): Version to build, 'old' or 'new'.
+
+        Returns:
+            tuple: Build data and an exception raised during the build or None if the build succeeded.
+
+        """
+        with TimingHelper.measure('builds', 'srpm', version=version) as record:
+            build_dict = {}
             try:
+                koji_build_id = None
+                results_dir = '{}-build'.format(os.path.join(self.results_dir, version))
+                spec = self.spec_file if version == 'old' else self.rebase_spec_file
+                package_name = spec.get_package_name()
+                package_version = spec.get_version()
+                package_full_version = spec.get_full_version()
+                logger.info('Building source package for %s version %s', package_name, package_full_version)
+
+                if version == 'old' and self.conf.get_old_build_from_koji:
+                    koji_build_id, package_version, package_full_version = KojiHelper.get_old_build_info(
+                                                                               package_name,
+                                                                               package_version)
+
+                build_dict = dict(
+                    name=package_name,
+                    version=package_version,
+                    srpm_buildtool=self.conf.srpm_buildtool,
+                    srpm_builder_options=self.conf.srpm_builder_options)
                 if koji_build_id:
                     session = KojiHelper.create_session()
                     build_dict['srpm'], build_dict['logs'] = KojiHelper.download_build(session,
@@ -579,25 +807,85 @@ class Application(object):
                                                                                        arches=['src'])
 
                 else:
-                    build_dict.update(builder.build(spec, results_dir, **build_dict))
-                build_dict = self._sanitize_build_dict(build_dict)
-                results_store.set_build_data(version, build_dict)
-            except RebaseHelperError:  # pylint: disable=try-except-raise
-                raise
-            except SourcePackageBuildError as e:
-                build_dict.update(builder.get_logs())
-                build_dict['source_package_build_error'] = six.text_type(e)
-                build_dict = self._sanitize_build_dict(build_dict)
-                results_store.set_build_data(version, build_dict)
-                if e.logfile:
-                    msg = 'Building {} SRPM packages failed; see {} for more information'.format(version, e.logfile)
-                else:
-                    msg = 'Building {} SRPM packages failed; see logs in {} for more information'.format(
-                        version, os.path.join(results_dir, 'SRPM'))
-                raise RebaseHelperError(msg, logfiles=builder.get_logs().get('logs'))
-            except Exception:
-                raise RebaseHelperError('Building package failed with unknown reason. '
-                                        'Check all available log files.')
+                    cache_key = self._get_build_cache_key(version, spec, 'SRPM',
+                                                          self.conf.srpm_buildtool,
+                                                          self.conf.srpm_builder_options,
+                                                          builder.get_build_environment(
+                                                              srpm_builder_options=self.conf.srpm_builder_options))
+                    cached = BuildCacheHelper.lookup(cache_key, results_dir) if cache_key else None
+                    if cached:
+                        build_dict.update(cached)
+                        record['cached'] = True
+                    else:
+                        with LimitHelper.limit('builds'):
+                            build_dict.update(builder.build(spec, results_dir, **build_dict))
+                        if cache_key:
+                            BuildCacheHelper.store(cache_key, build_dict, ['srpm', 'logs'], 'SRPM',
+                                                   self._get_build_cache_size())
+            except Exception as e:  # pylint: disable=broad-except
+                record['failed'] = True
+                return build_dict, e
+            return build_dict, None
+
+    def _get_build_cache_key(self, version, spec, *args):
+        """Gets a build cache key if a build of the specified version can be cached.
+
+        Only builds of the old version are cached, because the new one changes between runs.
+
+        Args:
+            version (str): Version to build, 'old' or 'new'.
+            spec (rebasehelper.specfile.SpecFile): SPEC file to be built.
+            *args: Build parameters affecting the result.
+
+        Returns:
+            str: Cache key or None if the build should not be cached.
+
+        """
+        if version != 'old' or self.conf.no_build_cache:
+            return None
+        return BuildCacheHelper.get_key(spec, *args)
+
+    def _get_build_cache_size(self):
+        return int(self.conf.build_cache_size) * 1024 * 1024
+
+    def _get_source_cache_size(self):
+        if self.conf.no_source_cache:
+            return None
+        return int(self.conf.source_cache_size) * 1024 * 1024
+
+    def _store_source_package(self, builder, version, build_dict, error):
+        """Stores results of a source package build and reports a failure.
+
+        Args:
+            builder (rebasehelper.build_helper.SRPMBuildToolBase): SRPM build tool used.
+            version (str): Version that was built, 'old' or 'new'.
+            build_dict (dict): Build data.
+            error (Exception): Exception raised during the build or None if the build succeeded.
+
+        Raises:
+            RebaseHelperError: If the build failed.
+
+        """
+        if error is None:
+            build_dict = self._sanitize_build_dict(build_dict)
+            results_store.set_build_data(version, build_dict)
+        elif isinstance(error, RebaseHelperError):
+            raise error
+        elif isinstance(error, SourcePackageBuildError):
+            logs = error.logs if error.logs is not None else builder.get_logs().get('logs')
+            build_dict['logs'] = logs
+            build_dict['source_package_build_error'] = six.text_type(error)
+            build_dict = self._sanitize_build_dict(build_dict)
+            results_store.set_build_data(version, build_dict)
+            if error.logfile:
+                msg = 'Building {} SRPM packages failed; see {} for more information'.format(version, error.logfile)
+            else:
+                msg = 'Building {} SRPM packages failed; see logs in {} for more information'.format(
+                    version, os.path.join('{}-build'.format(os.path.join(self.results_dir, version)), 'SRPM'))
+            raise RebaseHelperError(msg, logfiles=logs)
+        else:
+            raise RebaseHelperError('Building package failed with unknown reason. '
+                                    'Check all available log files.')
 
     def build_binary_packages(self):
         """Function calls build class for building packages"""
@@ -607,40 +895,115 @@ class Application(object):
             raise RebaseHelperError('{}. Supported build tools are {}'.format(
                 six.text_type(e), build_helper.get_supported_tools()))
 
-        for version in ['old', 'new']:
-            results_dir = '{}-build'.format(os.path.join(self.results_dir, version))
-            spec = None
-            task_id = None
-            koji_build_id = None
-            build_dict = {}
+        versions = self._get_versions_to_build()
+        prebuilt = self._pop_prebuilt_builds('rpm', versions)
+        remaining = [v for v in versions if v not in prebuilt]
+        if self.conf.parallel_builds and len(remaining) > 1:
+            logger.info('Building old and new binary packages concurrently')
+            # preparation is not thread-safe, do it in advance for both versions
+            args_list = []
+            for version, cpus in zip(remaining, self._get_build_cpu_split()):
+                build_dict, koji_build_id, task_id = self._prepare_binary_package_build(builder, version)
+                build_dict.update(concurrent_build_id=version, cpus=cpus)
+                args_list.append((builder, version, build_dict, koji_build_id, task_id))
+            built = iter(ParallelHelper.run(self._build_binary_package, args_list))
+        else:
+            # lazy evaluation ensures the new version is not built if building the old one fails
+            built = (self._build_binary_package(builder, v, *self._prepare_binary_package_build(builder, v))
+                     for v in remaining)
 
-            if self.conf.build_tasks is None:
-                spec = self.spec_file if version == 'old' else self.rebase_spec_file
-                package_name = spec.get_package_name()
-                package_version = spec.get_version()
-                package_full_version = spec.get_full_version()
+        # results are always processed in the same order, the first failure is reported
+        for version in versions:
+            build_dict, error = prebuilt[version] if version in prebuilt else next(built)
+            self._store_binary_package(builder, version, build_dict, error)
 
-                if version == 'old' and self.conf.get_old_build_from_koji:
-                    koji_build_id, package_version, package_full_version = KojiHelper.get_old_build_info(
-                                                                               package_name,
-                                                                               package_version)
+        if self.conf.builds_nowait and not self.conf.build_tasks:
+            if builder.CREATES_TASKS:
+                self.print_task_info(builder)
 
-                build_dict = dict(
-                    name=package_name,
-                    version=package_version,
-                    builds_nowait=self.conf.builds_nowait,
-                    build_tasks=self.conf.build_tasks,
-                    builder_options=self.conf.builder_options,
-                    srpm=results_store.get_build(version).get('srpm'),
-                    srpm_logs=results_store.get_build(version).get('logs'))
+    def _get_build_cpu_split(self):
+        """Gets numbers of CPUs to use for concurrent old and new binary package builds.
+
+        Returns:
+            list: Number of CPUs for old and new build.
 
-                # prepare for building
-                builder.prepare(spec, self.conf)
+        Raises:
+            ValueError: If --build-cpu-split contains something else than numbers.
 
-                logger.info('Building binary packages for %s version %s', package_name, package_full_version)
-            else:
-                task_id = self.conf.build_tasks[0] if version == 'old' else self.conf.build_tasks[1]
+        """
+        if self.conf.build_cpu_split:
+            return [int(c) for c in self.conf.build_cpu_split]
+        cpus = multiprocessing.cpu_count()
+        return [max(cpus // 2, 1), max(cpus - cpus // 2, 1)]
+
+    def _prepare_binary_package_build(self, builder, version, source_build=None):
+        """Prepares build of binary packages of the specified version.
+
+        Args:
+            builder (rebasehelper.build_helper.BuildToolBase): Build tool to use.
+            version (str): Version to build, 'old' or 'new'.
+            source_build (dict): Data of the source package build, taken from results_store if None.
+
+        Returns:
+            tuple: Build data, Koji build ID of the old version and remote task ID.
+
+        """
+        task_id = None
+        koji_build_id = None
+        build_dict = {}
+
+        if self.conf.build_tasks is None:
+            if source_build is None:
+                source_build = results_store.get_build(version)
+            spec = self.spec_file if version == 'old' else self.rebase_spec_file
+            package_name = spec.get_package_name()
+            package_version = spec.get_version()
+            package_full_version = spec.get_full_version()
+
+            if version == 'old' and self.conf.get_old_build_from_koji:
+                koji_build_id, package_version, package_full_version = KojiHelper.get_old_build_info(
+                                                                           package_name,
+                                                                           package_version)
+
+            build_dict = dict(
+                name=package_name,
+                version=package_version,
+                builds_nowait=self.conf.builds_nowait,
+                build_tasks=self.conf.build_tasks,
+                builder_options=self.conf.builder_options,
+                srpm=source_build.get('srpm'),
+                srpm_logs=source_build.get('logs'))
+
+            if version == 'new' and self.conf.incremental_rebuilds:
+                build_dict.update(build_tree_dir=os.path.join(self.workspace_dir, 'new-build-tree'),
+                                  incremental_build=self.incremental_build)
 
+            # prepare for building
+            builder.prepare(spec, self.conf)
+
+            logger.info('Building binary packages for %s version %s', package_name, package_full_version)
+        else:
+            task_id = self.conf.build_tasks[0] if version == 'old' else self.conf.build_tasks[1]
+
+        return build_dict, koji_build_id, task_id
+
+    def _build_binary_package(self, builder, version, build_dict, koji_build_id, task_id):
+        """Builds binary packages of the specified version.
+
+        Args:
+            builder (rebasehelper.build_helper.BuildToolBase): Build tool to use.
+            version (str): Version to build, 'old' or 'new'.
+            build_dict (dict): Build data returned by _prepare_binary_package_build().
+            koji_build_id (int): Koji build ID of the old version to download instead of building it.
+            task_id (str): ID of an existing remote build task.
+
+        Returns:
+            tuple: Build data and an exception raised during the build or None if the build succeeded.
+
+        """
+        with TimingHelper.measure('builds', 'rpm', version=version) as record:
+            results_dir = '{}-build'.format(os.path.join(self.results_dir, version))
+            spec = self.spec_file if version == 'old' else self.rebase_spec_file
             try:
                 if self.conf.build_tasks is None:
                     if koji_build_id:
@@ -653,7 +1016,25 @@ class Application(object):
                                                                                           ),
                                                                                           arches=['noarch', 'x86_64'])
                     else:
-                        build_dict.update(builder.build(spec, results_dir, **build_dict))
+                        cache_key = None
+                        if not builder.CREATES_TASKS:
+                            cache_key = self._get_build_cache_key(version, spec, 'RPM',
+                                                                  self.conf.srpm_buildtool,
+                                                                  self.conf.srpm_builder_options,
+                                                                  self.conf.buildtool,
+                                                                  self.conf.builder_options,
+                                                                  builder.get_build_environment(
+                                                                      builder_options=self.conf.builder_options))
+                        cached = BuildCacheHelper.lookup(cache_key, results_dir) if cache_key else None
+                        if cached:
+                            build_dict.update(cached)
+                            record['cached'] = True
+                        else:
+                            with LimitHelper.limit('builds'):
+                                build_dict.update(builder.build(spec, results_dir, **build_dict))
+                            if cache_key:
+                                BuildCacheHelper.store(cache_key, build_dict, ['rpm', 'logs'], 'RPM',
+                                                       self._get_build_cache_size())
                 if builder.CREATES_TASKS and task_id and not koji_build_id:
                     if not self.conf.builds_nowait:
                         build_dict['rpm'], build_dict['logs'] = builder.wait_for_task(build_dict,
@@ -661,33 +1042,50 @@ class Application(object):
                                                                                       results_dir)
                     elif self.conf.build_tasks:
                         build_dict['rpm'], build_dict['logs'] = builder.get_detached_task(task_id, results_dir)
-                build_dict = self._sanitize_build_dict(build_dict)
-                results_store.set_build_data(version, build_dict)
-            except RebaseHelperError:  # pylint: disable=try-except-raise
-                # Proper RebaseHelperError instance was created already. Re-raise it.
-                raise
-            except BinaryPackageBuildError as e:
-                build_dict.update(builder.get_logs())
-                build_dict['binary_package_build_error'] = six.text_type(e)
-                build_dict = self._sanitize_build_dict(build_dict)
-                results_store.set_build_data(version, build_dict)
-
-                if e.logfile is None:
-                    msg = 'Building {} RPM packages failed; see logs in {} for more information'.format(
-                        version, os.path.join(results_dir, 'RPM')
-                    )
-                else:
-                    msg = 'Building {} RPM packages failed; see {} for more information'.format(version, e.logfile)
+            except Exception as e:  # pylint: disable=broad-except
+                record['failed'] = True
+                return build_dict, e
+            return build_dict, None
 
-                logger.info(msg)
-                raise RebaseHelperError(msg, logfiles=builder.get_logs().get('logs'))
-            except Exception:
-                raise RebaseHelperError('Building package failed with unknown reason. '
-                                        'Check all available log files.')
+    def _store_binary_package(self, builder, version, build_dict, error):
+        """Stores results of a binary package build and reports a failure.
 
-        if self.conf.builds_nowait and not self.conf.build_tasks:
-            if builder.CREATES_TASKS:
-                self.print_task_info(builder)
+        Args:
+            builder (rebasehelper.build_helper.BuildToolBase): Build tool used.
+            version (str): Version that was built, 'old' or 'new'.
+            build_dict (dict): Build data.
+            error (Exception): Exception raised during the build or None if the build succeeded.
+
+        Raises:
+            RebaseHelperError: If the build failed.
+
+        """
+        if error is None:
+            build_dict = self._sanitize_build_dict(build_dict)
+            results_store.set_build_data(version, build_dict)
+        elif isinstance(error, RebaseHelperError):
+            # Proper RebaseHelperError instance was created already. Re-raise it.
+            raise error
+        elif isinstance(error, BinaryPackageBuildError):
+            logs = error.logs if error.logs is not None else builder.get_logs().get('logs')
+            build_dict['logs'] = logs
+            build_dict['binary_package_build_error'] = six.text_type(error)
+            build_dict = self._sanitize_build_dict(build_dict)
+            results_store.set_build_data(version, build_dict)
+
+            if error.logfile is None:
+                results_dir = '{}-build'.format(os.path.join(self.results_dir, version))
+                msg = 'Building {} RPM packages failed; see logs in {} for more information'.format(
+                    version, os.path.join(results_dir, 'RPM')
+                )
+            else:
+                msg = 'Building {} RPM packages failed; see {} for more information'.format(version, error.logfile)
+
+            logger.info(msg)
+            raise RebaseHelperError(msg, logfiles=logs)
+        else:
+            raise RebaseHelperError('Building package failed with unknown reason. '
+                                    'Check all available log files.')
 
     def run_package_checkers(self, results_dir, **kwargs):
         """
@@ -699,20 +1097,20 @@ class Application(object):
         :type category: str
         :return: None
         """
-        results = dict()
-
-        for checker_name in self.conf.pkgcomparetool:
-            try:
-                data = checkers_runner.run_checker(os.path.join(results_dir, 'checkers'),
-                                                   checker_name,
-                                                   **kwargs)
-                if data:
-                    results[checker_name] = data
-            except CheckerNotFoundError:
-                logger.error("Rebase-helper did not find checker '%s'.", checker_name)
-
-        for diff_name, result in six.iteritems(results):
-            results_store.set_checker_output(diff_name, result)
+        results = checkers_runner.run_checkers(os.path.join(results_dir, 'checkers'),
+                                               self.conf.pkgcomparetool,
+                                               workers=self.conf.checker_workers,
+                                               checker_jobs=self.conf.checker_jobs,
+                                               **kwargs)
+
+        # incrementally rebuilt packages require rpmlib(ShortCircuited), mark results
+        # of checkers comparing them, so that the dependency is not mistaken for a real change
+        new_build = results_store.get_new_build() or {}
+        incremental = kwargs.get('category') == 'RPM' and new_build.get('incremental', False)
+        for checker_name, result in results:
+            if incremental:
+                result = dict(result, incremental=True)
+            results_store.set_checker_output(checker_name, result)
 
     def get_all_log_files(self):
         """
@@ -786,6 +1184,10 @@ class Application(object):
             self.rebase_spec_file.update_paths_to_patches()
             self.generate_patch()
 
+        results_store.add_timing('caches', dict(name='macro_expansion', **MacroHelper.get_cache_stats()))
+        results_store.add_timing('caches', dict(name='macro_snapshot', **MacroHelper.get_snapshot_stats()))
+        results_store.add_timing('caches', dict(name='spec_parse', **SpecCacheHelper.get_stats()))
+        results_store.add_timing('caches', dict(name='sources', **SourceCacheHelper.get_stats()))
         output_tools_runner.run_output_tool(self.conf.outputtool, logs, self)
 
     def print_task_info(self, builder):
@@ -815,7 +1217,26 @@ class Application(object):
             logger.warning('changes.patch was not applied properly. Please review changes manually.'
                            '\nThe error message is: %s', six.text_type(e))
 
+    @classmethod
+    def _build_failed_in_files(cls, results_dir):
+        """Checks whether the new version build failed because of its %files sections.
+
+        Args:
+            results_dir (str): Path to the directory with results.
+
+        Returns:
+            bool: True if the build log reports missing or unpackaged files.
+
+        """
+        log = os.path.join(results_dir, 'new-build', 'RPM', 'build.log')
+        try:
+            with open(log, 'r') as f:
+                return bool(cls.FILES_ERROR_RE.search(f.read()))
+        except IOError:
+            return False
+
     def prepare_next_run(self, results_dir):
+        sections = self._get_rebase_spec_sections()
         changes_made = build_log_hook_runner.run(self.spec_file, self.rebase_spec_file, **self.kwargs)
         # Save current rebase spec file content
         self.rebase_spec_file.save()
@@ -832,8 +1253,24 @@ class Application(object):
         # Update rebase spec file content after potential manual modifications
         self.rebase_spec_file._read_spec_content()  # pylint: disable=protected-access
         self.rebase_spec_file._update_data()  # pylint: disable=protected-access
+        if self.conf.incremental_rebuilds:
+            # if the build failed in packaging and only %files sections changed,
+            # it can be finished without rebuilding from scratch
+            new_build = results_store.get_new_build()
+            new_sections = self._get_rebase_spec_sections()
+            changed_sections = [k for k in set(sections) | set(new_sections) if sections.get(k) != new_sections.get(k)]
+            self.incremental_build = bool(new_build and 'binary_package_build_error' in new_build and
+                                          self._build_failed_in_files(results_dir) and
+                                          all(k.startswith('%files') for k in changed_sections))
+            if self.incremental_build:
+                logger.info('Only %%files sections changed, the new version will be rebuilt incrementally')
+        # the old version is not affected by the changes, reuse its results if it was built successfully
+        old_build = results_store.get_old_build()
+        self.reuse_old_build = bool(old_build and old_build.get('rpm'))
+        if self.reuse_old_build:
+            logger.info('Reusing results of the old version build, only the new version will be rebuilt')
         # clear current version output directories
-        if os.path.exists(os.path.join(results_dir, 'old-build')):
+        if not self.reuse_old_build and os.path.exists(os.path.join(results_dir, 'old-build')):
             shutil.rmtree(os.path.join(results_dir, 'old-build'))
         if os.path.exists(os.path.join(results_dir, 'new-build')):
             shutil.rmtree(os.path.join(results_dir, 'new-build'))
@@ -867,29 +1304,85 @@ class Application(object):
                                         " and ".join(options_used),
                                         ", ".join(tools_accepting_options)))
 
+        tools_incremental = [k for k, v in six.iteritems(build_helper.build_tools) if v and v.INCREMENTAL_BUILDS]
+        if self.conf.buildtool not in tools_incremental and self.conf.incremental_rebuilds is True:
+            raise RebaseHelperError("{} can be used only with the following build tools: {}".format(
+                                    '--incremental-rebuilds',
+                                    ", ".join(tools_incremental)))
+
+        tools_parallel_safe = [k for k, v in six.iteritems(build_helper.build_tools) if v and v.PARALLEL_SAFE]
+        if self.conf.buildtool not in tools_parallel_safe:
+            options_used = []
+            if self.conf.parallel_builds is True:
+                options_used.append('--parallel-builds')
+            if self.conf.build_cpu_split is not None:
+                options_used.append('--build-cpu-split')
+            if options_used:
+                raise RebaseHelperError("{} can be used only with the following build tools: {}".format(
+                                        " and ".join(options_used),
+                                        ", ".join(tools_parallel_safe)))
+        if self.conf.build_cpu_split is not None:
+            if not self.conf.parallel_builds:
+                raise RebaseHelperError("%s can be used only with: %s" % ('--build-cpu-split', '--parallel-builds'))
+            try:
+                cpu_split = self._get_build_cpu_split()
+            except ValueError:
+                cpu_split = []
+            if len(cpu_split) != 2 or min(cpu_split) < 1:
+                raise RebaseHelperError("%s requires two positive numbers" % '--build-cpu-split')
+
+        if self.conf.stage_workers is not None and self.conf.stage_workers < 1:
+            raise RebaseHelperError("%s requires a positive number" % '--stage-workers')
+        if self.conf.extraction_workers is not None and self.conf.extraction_workers < 1:
+            raise RebaseHelperError("%s requires a positive number" % '--extraction-workers')
+
         if self.conf.build_tasks is None:
-            old_sources, new_sources = self.prepare_sources()
-            self.run_package_checkers(self.results_dir, category='SOURCE', old_dir=old_sources, new_dir=new_sources)
+            sources = []
+            scheduler = StageScheduler(self._get_stage_workers())
+            scheduler.add_stage('prepare_sources', lambda: sources.extend(self.prepare_sources()))
+            if self._can_prebuild_old_version():
+                # preparing sources parses and modifies SPEC files, so don't build concurrently with it
+                scheduler.add_stage('old_build', self.prebuild_old_version, ['prepare_sources'])
+            # SOURCE checkers have to finish before patching, which modifies the sources
+            scheduler.add_stage('source_checkers',
+                                lambda: self.run_package_checkers(self.results_dir, category='SOURCE',
+                                                                  old_dir=sources[0], new_dir=sources[1]),
+                                ['prepare_sources'])
             if not self.conf.build_only and not self.conf.comparepkgs:
-                try:
-                    self.patch_sources([old_sources, new_sources])
-                except RebaseHelperError as e:
+                scheduler.add_stage('patch_sources', lambda: self.patch_sources(sources), ['source_checkers'])
+            if self.conf.extraction_workers != 1:
+                # worker processes extracting sources and parsing SPEC files have to be forked before any threads
+                ParallelHelper.start_process_pool(self.conf.extraction_workers)
+            try:
+                scheduler.run()
+            except RebaseHelperError as e:
+                if scheduler.failed_stage == 'patch_sources':
                     # Print summary and return error
                     self.print_summary(e)
-                    raise
+                raise
+            finally:
+                ParallelHelper.stop_process_pool()
 
         if not self.conf.patch_only:
             if not self.conf.comparepkgs:
+                nowait = self.conf.builds_nowait and not self.conf.build_tasks
                 # Build packages
                 while True:
+                    scheduler = StageScheduler(self._get_stage_workers())
+                    dependencies = []
+                    if self.conf.build_tasks is None:
+                        scheduler.add_stage('srpm_build', self.build_source_packages)
+                        dependencies = ['srpm_build']
+                    scheduler.add_stage('srpm_checkers',
+                                        lambda: self.run_package_checkers(self.results_dir, category='SRPM'),
+                                        dependencies)
+                    scheduler.add_stage('rpm_build', self.build_binary_packages, dependencies)
+                    if not nowait:
+                        scheduler.add_stage('rpm_checkers',
+                                            lambda: self.run_package_checkers(self.results_dir, category='RPM'),
+                                            ['rpm_build'])
                     try:
-                        if self.conf.build_tasks is None:
-                            self.build_source_packages()
-                        self.run_package_checkers(self.results_dir, category='SRPM')
-                        self.build_binary_packages()
-                        if self.conf.builds_nowait and not self.conf.build_tasks:
-                            return
-                        self.run_package_checkers(self.results_dir, category='RPM')
+                        scheduler.run()
                     # Print summary and return error
                     except RebaseHelperError as e:
                         if self.prepare_next_run(self.results_dir):
@@ -897,6 +1390,8 @@ class Application(object):
                         self.print_summary(e)
                         raise
                     else:
+                        if nowait:
+                            return
                         break
             else:
                 if self.get_rpm_packages(self.conf.comparepkgs):
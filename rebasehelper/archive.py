@@ -21,7 +21,9 @@
 #          Tomas Hozza <thozza@redhat.com>
 
 from __future__ import print_function
+import subprocess
 import tarfile
+import tempfile
 import zipfile
 import bz2
 import os
@@ -35,20 +37,59 @@ except ImportError:
     from backports import lzma
 
 from rebasehelper.logger import logger
+from rebasehelper.helpers.path_helper import PathHelper
 
 
 # supported archive types
 archive_types = {}
 
+# archive types used when the type can't be determined from extension, by format
+archive_formats = {}
+
+# engines used to extract archives, in order of preference
+extraction_engines = []
+
+# magic numbers of archive and compression formats
+MAGIC_NUMBERS = {
+    b"\xfd7zXZ\x00": "xz",
+    b"\x1f\x8b": "gzip",
+    b"BZh": "bzip2",
+    b"\x28\xb5\x2f\xfd": "zstd",
+    b"LZIP": "lzip",
+    b"7z\xbc\xaf\x27\x1c": "7z",
+    b"PK\x03\x04": "zip",
+    b"PK\x05\x06": "zip",
+}
+MAGIC_LENGTHS = sorted(set(len(m) for m in MAGIC_NUMBERS), reverse=True)
+
+# magic number of tar archives and its offset
+TAR_MAGIC = b"ustar"
+TAR_MAGIC_OFFSET = 257
+
 
 def register_archive_type(archive):
     archive_types[archive.EXTENSION] = archive
+    # prefer tar archives, then types registered first
+    current = archive_formats.get(archive.FORMAT)
+    if archive.FORMAT and (current is None or current.TAR_COMPRESSION is None and archive.TAR_COMPRESSION is not None):
+        archive_formats[archive.FORMAT] = archive
     return archive
 
 
+def register_extraction_engine(engine):
+    extraction_engines.append(engine)
+    return engine
+
+
 class ArchiveTypeBase(object):
     """ Base class for various archive types """
     EXTENSION = ""
+    # format recognized by magic number of the archive, see MAGIC_NUMBERS
+    FORMAT = None
+    # compression of tar archives, None for other archive types
+    TAR_COMPRESSION = None
+    # whether the archive can be extracted using Python standard library
+    PYTHON_SUPPORT = True
 
     @classmethod
     def match(cls, filename=None):
@@ -86,6 +127,8 @@ class TarXzArchiveType(ArchiveTypeBase):
     """ .tar.xz archive type """
 
     EXTENSION = ".tar.xz"
+    FORMAT = "xz"
+    TAR_COMPRESSION = "xz"
 
     @classmethod
     def open(cls, filename=None):
@@ -108,13 +151,14 @@ class Bz2ArchiveType(ArchiveTypeBase):
     """ .bz2 archive type """
 
     EXTENSION = ".bz2"
+    FORMAT = "bzip2"
 
     @classmethod
     def open(cls, filename=None):
         if filename is None:
             raise TypeError("Expected argument 'filename' (pos 1) is missing")
 
-        if filename.endswith('.tar.bz2'):
+        if cls.TAR_COMPRESSION is not None:
             return tarfile.TarFile.open(filename)
         else:
             return bz2.BZ2File(filename)
@@ -123,14 +167,13 @@ class Bz2ArchiveType(ArchiveTypeBase):
     def extract(cls, archive=None, filename=None, path=None):
         if archive is None:
             raise TypeError("Expected argument 'archive' (pos 1) is missing")
-        if filename.endswith('tar.bz2'):
+        if cls.TAR_COMPRESSION is not None:
             archive.extractall(path)
         else:
-            data = archive.read()
             if not os.path.exists(path):
                 os.mkdir(path)
-            with open(os.path.join(path, filename[:-4]), 'wb') as f:
-                f.write(data)
+            with open(os.path.join(path, os.path.basename(filename)[:-4]), 'wb') as f:
+                shutil.copyfileobj(archive, f)
 
 
 @register_archive_type
@@ -139,6 +182,7 @@ class TarBz2ArchiveType(Bz2ArchiveType):
     """ .tar.bz2 archive type """
 
     EXTENSION = ".tar.bz2"
+    TAR_COMPRESSION = "bzip2"
 
 
 @register_archive_type
@@ -147,6 +191,8 @@ class TarGzArchiveType(TarBz2ArchiveType):
     """ .tar.gz archive type """
 
     EXTENSION = ".tar.gz"
+    FORMAT = "gzip"
+    TAR_COMPRESSION = "gzip"
 
     @classmethod
     def open(cls, filename=None):
@@ -172,19 +218,33 @@ class TgzArchiveType(TarGzArchiveType):
 class TarArchiveType(TarGzArchiveType):
     """ .tar archive type """
     EXTENSION = ".tar"
+    FORMAT = "tar"
+    TAR_COMPRESSION = ""
+
+
+@register_archive_type
+class TarZstArchiveType(TarGzArchiveType):
+    """ .tar.zst archive type """
+    EXTENSION = ".tar.zst"
+    FORMAT = "zstd"
+    TAR_COMPRESSION = "zstd"
+    PYTHON_SUPPORT = False
+
+
+@register_archive_type
+class TarLzArchiveType(TarGzArchiveType):
+    """ .tar.lz archive type """
+    EXTENSION = ".tar.lz"
+    FORMAT = "lzip"
+    TAR_COMPRESSION = "lzip"
+    PYTHON_SUPPORT = False
 
 
 @register_archive_type
 class ZipArchiveType(ArchiveTypeBase):
     """ .zip archive type """
     EXTENSION = ".zip"
-
-    @classmethod
-    def match(cls, filename=None):
-        if filename is not None and zipfile.is_zipfile(filename):
-            return True
-        else:
-            return False
+    FORMAT = "zip"
 
     @classmethod
     def open(cls, filename=None):
@@ -200,10 +260,20 @@ class ZipArchiveType(ArchiveTypeBase):
         archive.extractall(path)
 
 
+@register_archive_type
+class SevenZipArchiveType(ArchiveTypeBase):
+    """ .7z archive type """
+    EXTENSION = ".7z"
+    FORMAT = "7z"
+    PYTHON_SUPPORT = False
+
+
 @register_archive_type
 class GemPseudoArchiveType(ArchiveTypeBase):
     """ .gem files are not archives - this is a pseudo type """
     EXTENSION = ".gem"
+    # gems are tar archives
+    FORMAT = "tar"
 
     @classmethod
     def open(cls, filename=None):
@@ -218,53 +288,394 @@ class GemPseudoArchiveType(ArchiveTypeBase):
         shutil.copy(filename, final_dir)
 
 
-class Archive(object):
+class ExtractionStream(object):
 
-    """ Class representing an archive with sources """
+    """
+    Writable stream feeding a pipeline of processes extracting an archive.
+    Writes block while the pipeline is busy, so memory usage stays bounded.
+    """
 
-    def __init__(self, filename=None):
-        if filename is None:
-            raise TypeError("Expected argument 'filename' (pos 1) is missing")
-        self._filename = filename
-        self._archive_type = None
+    def __init__(self, processes, errors, path):
+        self._processes = processes
+        self._stdin = processes[0].stdin
+        self._errors = errors
+        self._path = path
+        self._broken = False
+
+    def write(self, data):
+        if self._broken:
+            return
+        try:
+            self._stdin.write(data)
+        except (IOError, OSError):
+            # the pipeline has already exited, the failure is reported by close()
+            self._broken = True
 
-        for archive_type in archive_types.values():
-            if archive_type.match(self._filename):
-                self._archive_type = archive_type
+    def close(self):
+        """
+        Waits for the extraction to finish
 
-        if self._archive_type is None:
-            raise NotImplementedError("Unsupported archive type")
+        :raises IOError: If the extraction failed.
+        """
+        try:
+            self._stdin.close()
+        except (IOError, OSError):
+            self._broken = True
+        failed = [p for p in self._processes if p.wait() != 0]
+        try:
+            if failed or self._broken:
+                self._errors.seek(0)
+                raise IOError(self._errors.read().decode("utf-8", "replace").strip() or
+                              "Failed to extract archive into '{}'".format(self._path))
+        finally:
+            self._errors.close()
+
+    def abort(self):
+        """Terminates the extraction"""
+        for p in self._processes:
+            if p.poll() is None:
+                p.kill()
+        try:
+            self._stdin.close()
+        except (IOError, OSError):
+            pass
+        for p in self._processes:
+            p.wait()
+        self._errors.close()
 
-    def extract_archive(self, path=None):
+
+class ExtractionEngineBase(object):
+    """ Base class for engines extracting archives """
+    NAME = ""
+
+    @classmethod
+    def is_available(cls):
+        """Checks if the engine can be used on this system."""
+        return True
+
+    @classmethod
+    def supports(cls, archive_type):
+        """Checks if the engine can extract archives of the given type."""
+        raise NotImplementedError()
+
+    @classmethod
+    def extract(cls, archive_type, filename, path):
         """
         Extracts the archive into the given path
 
+        :param archive_type: Type of the archive.
+        :param filename: Path to the archive.
         :param path: Path where to extract the archive to.
-        :return:
+        :raises IOError: If the archive is damaged.
         """
-        if path is None:
-            TypeError("Expected argument 'path' (pos 1) is missing")
+        raise NotImplementedError()
 
-        logger.verbose("Extracting '%s' into '%s'", self._filename, path)
+    @classmethod
+    def supports_stream(cls, archive_type):
+        """Checks if the engine can extract archives of the given type while they are being written."""
+        return False
+
+    @classmethod
+    def open_stream(cls, archive_type, path):
+        """
+        Starts extraction of an archive that will be written to the returned stream
+
+        :param archive_type: Type of the archive.
+        :param path: Path where to extract the archive to.
+        :return: ExtractionStream object.
+        """
+        raise NotImplementedError()
+
+
+@register_extraction_engine
+class TarPipeExtractionEngine(ExtractionEngineBase):
+
+    """
+    Extracts tar archives with GNU tar, reading data decompressed by an external
+    decompressor from a pipe. Multithreaded decompressors are preferred.
+    """
+
+    NAME = "tar"
+
+    # decompressors writing to stdout, in order of preference
+    DECOMPRESSORS = {
+        "xz": [["xz", "-d", "-c", "-T0"]],
+        "gzip": [["pigz", "-d", "-c"], ["gzip", "-d", "-c"]],
+        "bzip2": [["lbzip2", "-d", "-c"], ["pbzip2", "-d", "-c"], ["bzip2", "-d", "-c"]],
+        "zstd": [["zstd", "-d", "-c", "-q"]],
+        "lzip": [["plzip", "-d", "-c"], ["lzip", "-d", "-c"]],
+    }
+
+    _available = None
+    _decompressors = {}
+
+    @classmethod
+    def is_available(cls):
+        if cls._available is None:
+            cls._available = False
+            if PathHelper.find_executable("tar"):
+                try:
+                    output = subprocess.check_output(["tar", "--version"])
+                except (OSError, subprocess.CalledProcessError):
+                    pass
+                else:
+                    cls._available = b"GNU tar" in output
+        return cls._available
+
+    @classmethod
+    def get_decompressor(cls, compression):
+        """Gets command of the preferred available decompressor or None."""
+        if compression not in cls._decompressors:
+            cls._decompressors[compression] = None
+            for cmd in cls.DECOMPRESSORS.get(compression, []):
+                if PathHelper.find_executable(cmd[0]):
+                    cls._decompressors[compression] = cmd
+                    break
+        return cls._decompressors[compression]
+
+    @classmethod
+    def supports(cls, archive_type):
+        if archive_type.TAR_COMPRESSION is None:
+            return False
+        return archive_type.TAR_COMPRESSION == "" or cls.get_decompressor(archive_type.TAR_COMPRESSION) is not None
+
+    @classmethod
+    def supports_stream(cls, archive_type):
+        return cls.supports(archive_type)
+
+    @classmethod
+    def _start(cls, archive_type, path, source, errors):
+        """Starts processes extracting tar archive read from source, returns them, the first one reads the source."""
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        # preserve permissions like tarfile does
+        cmd = ["tar", "-x", "-p", "-C", path, "-f", "-"]
+        decompressor = cls.get_decompressor(archive_type.TAR_COMPRESSION) if archive_type.TAR_COMPRESSION else None
+        if decompressor is None:
+            return [subprocess.Popen(cmd, stdin=source, stderr=errors)]
+        dp = subprocess.Popen(decompressor, stdin=source, stdout=subprocess.PIPE, stderr=errors)
+        tp = subprocess.Popen(cmd, stdin=dp.stdout, stderr=errors)
+        # let the decompressor receive SIGPIPE if tar exits
+        dp.stdout.close()
+        return [dp, tp]
 
+    @classmethod
+    def extract(cls, archive_type, filename, path):
+        with tempfile.TemporaryFile() as errors:
+            with open(filename, "rb") as f:
+                processes = cls._start(archive_type, path, f, errors)
+            failed = [p for p in processes if p.wait() != 0]
+            if failed:
+                errors.seek(0)
+                raise IOError(errors.read().decode("utf-8", "replace").strip() or
+                              "Failed to extract '{}'".format(filename))
+
+    @classmethod
+    def open_stream(cls, archive_type, path):
+        errors = tempfile.TemporaryFile()
+        try:
+            processes = cls._start(archive_type, path, subprocess.PIPE, errors)
+        except (IOError, OSError):
+            errors.close()
+            raise
+        return ExtractionStream(processes, errors, path)
+
+
+@register_extraction_engine
+class BsdtarExtractionEngine(ExtractionEngineBase):
+
+    """
+    Extracts tar and 7z archives with bsdtar, which detects and decompresses
+    all supported compressions itself. 7z archives can't be extracted from a stream.
+    """
+
+    NAME = "bsdtar"
+
+    _available = None
+
+    @classmethod
+    def is_available(cls):
+        if cls._available is None:
+            cls._available = bool(PathHelper.find_executable("bsdtar"))
+        return cls._available
+
+    @classmethod
+    def supports(cls, archive_type):
+        return archive_type.TAR_COMPRESSION is not None or archive_type.FORMAT == "7z"
+
+    @classmethod
+    def supports_stream(cls, archive_type):
+        return archive_type.TAR_COMPRESSION is not None
+
+    @classmethod
+    def _start(cls, path, source, errors):
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        # preserve permissions like tarfile does
+        return [subprocess.Popen(["bsdtar", "-x", "-p", "-C", path, "-f", source],
+                                 stdin=subprocess.PIPE if source == "-" else None, stderr=errors)]
+
+    @classmethod
+    def extract(cls, archive_type, filename, path):
+        with tempfile.TemporaryFile() as errors:
+            # 7z archives need to be seekable, let bsdtar open the file itself
+            if cls._start(path, os.path.abspath(filename), errors)[0].wait() != 0:
+                errors.seek(0)
+                raise IOError(errors.read().decode("utf-8", "replace").strip() or
+                              "Failed to extract '{}'".format(filename))
+
+    @classmethod
+    def open_stream(cls, archive_type, path):
+        errors = tempfile.TemporaryFile()
+        try:
+            processes = cls._start(path, "-", errors)
+        except (IOError, OSError):
+            errors.close()
+            raise
+        return ExtractionStream(processes, errors, path)
+
+
+@register_extraction_engine
+class PythonExtractionEngine(ExtractionEngineBase):
+
+    """ Extracts archives using Python standard library """
+
+    NAME = "python"
+
+    @classmethod
+    def supports(cls, archive_type):
+        return archive_type.PYTHON_SUPPORT
+
+    @classmethod
+    def extract(cls, archive_type, filename, path):
         try:
             LZMAError = lzma.LZMAError
         except AttributeError:
             LZMAError = lzma.error
 
         try:
-            archive = self._archive_type.open(self._filename)
+            archive = archive_type.open(filename)
         except (tarfile.ReadError, LZMAError) as e:
             raise IOError(six.text_type(e))
 
-        self._archive_type.extract(archive, self._filename, path)
+        archive_type.extract(archive, filename, path)
         try:
             archive.close()
         except AttributeError:
             # pseudo archive types don't return real file-like object
             pass
 
+
+class Archive(object):
+
+    """ Class representing an archive with sources """
+
+    def __init__(self, filename=None):
+        if filename is None:
+            raise TypeError("Expected argument 'filename' (pos 1) is missing")
+        self._filename = filename
+        self._archive_type = self.get_archive_type(filename)
+
+        if self._archive_type is None:
+            raise NotImplementedError("Unsupported archive type")
+
+    @staticmethod
+    def detect_format(filename):
+        """
+        Detects format of an archive from its magic number
+
+        :param filename: Path to the archive.
+        :return: Name of the format, see MAGIC_NUMBERS, or None if not recognized.
+        """
+        try:
+            with open(filename, "rb") as f:
+                header = f.read(TAR_MAGIC_OFFSET + len(TAR_MAGIC))
+        except (IOError, OSError):
+            return None
+        for length in MAGIC_LENGTHS:
+            fmt = MAGIC_NUMBERS.get(header[:length])
+            if fmt is not None:
+                return fmt
+        if header[TAR_MAGIC_OFFSET:] == TAR_MAGIC:
+            return "tar"
+        return None
+
+    @classmethod
+    def get_archive_type(cls, filename):
+        """
+        Determines type of an archive from its content and extension. If the format
+        detected from content doesn't match the extension, the content wins. Files that
+        don't exist yet, e.g. archives to be downloaded, are recognized by extension.
+
+        :param filename: Path to the archive.
+        :return: Archive type or None if the archive is not supported.
+        """
+        # the longest matching extension
+        name = os.path.basename(filename)
+        archive_type = None
+        index = name.find(".")
+        while index >= 0 and archive_type is None:
+            archive_type = archive_types.get(name[index:])
+            index = name.find(".", index + 1)
+        fmt = cls.detect_format(filename)
+        if fmt is None or archive_type is not None and archive_type.FORMAT == fmt:
+            return archive_type
+        if archive_type is not None:
+            logger.verbose("Content of '%s' doesn't match its extension, it's a %s archive", filename, fmt)
+        return archive_formats.get(fmt)
+
+    def get_extraction_engine(self):
+        """Gets the preferred available engine able to extract the archive."""
+        for engine in extraction_engines:
+            if engine.is_available() and engine.supports(self._archive_type):
+                return engine
+        return None
+
+    def extract_archive(self, path=None, engine=None):
+        """
+        Extracts the archive into the given path
+
+        :param path: Path where to extract the archive to.
+        :param engine: Name of the extraction engine to use, the preferred one if None.
+        :return:
+        """
+        if path is None:
+            TypeError("Expected argument 'path' (pos 1) is missing")
+
+        if engine is None:
+            extraction_engine = self.get_extraction_engine()
+        else:
+            extraction_engine = self.get_extraction_engines().get(engine)
+            if extraction_engine is None or not extraction_engine.supports(self._archive_type):
+                raise ValueError("Extraction engine '{}' is not available for '{}'".format(engine, self._filename))
+
+        logger.verbose("Extracting '%s' into '%s' using %s engine", self._filename, path, extraction_engine.NAME)
+        extraction_engine.extract(self._archive_type, self._filename, path)
+
+    def open_stream(self, path=None):
+        """
+        Starts extraction of the archive into the given path from a stream the content
+        of the archive is written to, e.g. while the archive is being downloaded
+
+        :param path: Path where to extract the archive to.
+        :return: ExtractionStream object or None if no available engine can extract the archive from a stream.
+        """
+        if path is None:
+            raise TypeError("Expected argument 'path' (pos 1) is missing")
+
+        for engine in extraction_engines:
+            if engine.is_available() and engine.supports_stream(self._archive_type):
+                logger.verbose("Extracting '%s' into '%s' from a stream using %s engine",
+                               self._filename, path, engine.NAME)
+                return engine.open_stream(self._archive_type, path)
+        return None
+
     @classmethod
     def get_supported_archives(cls):
         """Return list of supported archive types"""
         return archive_types.keys()
+
+    @classmethod
+    def get_extraction_engines(cls):
+        """Return available extraction engines, by name"""
+        return {e.NAME: e for e in extraction_engines if e.is_available()}
@@ -23,6 +23,8 @@
 import argparse
 import sys
 
+from six.moves import collections_abc
+
 from rebasehelper.exceptions import RebaseHelperError, ParseError
 
 
@@ -32,14 +34,56 @@ class SilentArgumentParser(argparse.ArgumentParser):
         raise ParseError(message)
 
 
+class LazyChoices(collections_abc.Sequence):
+
+    """Choices of an argument obtained by calling a function once they are needed.
+
+    Determining available plugins requires importing them, so it is deferred until
+    a value of the argument is checked. Help shows names of all choices instead,
+    without determining which of them are available.
+    """
+
+    def __init__(self, func, names=None):
+        self._func = func
+        self._choices = None
+        self.names = names
+
+    def _get_choices(self):
+        if self._choices is None:
+            self._choices = list(self._func())
+        return self._choices
+
+    def __getitem__(self, index):
+        return self._get_choices()[index]
+
+    def __len__(self):
+        return len(self._get_choices())
+
+
 class CustomHelpFormatter(argparse.HelpFormatter):
 
+    @staticmethod
+    def _with_choice_names(method, action, *args):
+        # avoid resolving lazy choices, argparse iterates over them when formatting help
+        choices = action.choices
+        if isinstance(choices, LazyChoices) and choices.names is not None:
+            action.choices = choices.names
+        try:
+            return method(action, *args)
+        finally:
+            action.choices = choices
+
+    def _metavar_formatter(self, action, default_metavar):
+        method = super(CustomHelpFormatter, self)._metavar_formatter
+        return self._with_choice_names(method, action, default_metavar)
+
     def _expand_help(self, action):
-        action.default = getattr(action, 'actual_default', None)
+        action.default = getattr(action, 'help_default', None)
         if isinstance(action.default, list):
             default_str = ','.join([str(c) for c in action.default])
             action.default = default_str
-        return super(CustomHelpFormatter, self)._expand_help(action)
+        method = super(CustomHelpFormatter, self)._expand_help
+        return self._with_choice_names(method, action)
 
 
 class CustomAction(argparse.Action):
@@ -47,6 +91,7 @@ class CustomAction(argparse.Action):
                  switch=False,
                  counter=False,
                  actual_default=None,
+                 help_default=None,
                  dest=None,
                  default=None,
                  nargs=None,
@@ -69,7 +114,22 @@ class CustomAction(argparse.Action):
         self.switch = switch
         self.counter = counter
         self.nargs = 0 if self.switch or self.counter else nargs
-        self.actual_default = actual_default
+        self._actual_default = actual_default
+        self._help_default = help_default
+
+    @property
+    def actual_default(self):
+        # default value can be a callable, see LazyChoices
+        if callable(self._actual_default):
+            self._actual_default = self._actual_default()
+        return self._actual_default
+
+    @property
+    def help_default(self):
+        # default value shown in help, a callable default is resolved only if there is no replacement
+        if callable(self._actual_default) and self._help_default is not None:
+            return self._help_default() if callable(self._help_default) else self._help_default
+        return self.actual_default
 
     def __call__(self, parser, namespace, values, option_string=None):
         if self.counter:
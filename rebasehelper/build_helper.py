@@ -24,8 +24,6 @@ import shlex
 import shutil
 import os
 
-import six
-
 from rebasehelper.plugins import Plugin, PluginLoader
 from rebasehelper.helpers.path_helper import PathHelper
 from rebasehelper.temporary_environment import TemporaryEnvironment
@@ -41,10 +39,12 @@ class SourcePackageBuildError(RuntimeError):
         Constructor of SourcePackageBuildError
         :param args: tuple of arguments stored in the exception instance
         :param kwargs: dictionary containing path to the logfile that contains main errors
+                       and list of all logs of the failed build
         """
         super(SourcePackageBuildError, self).__init__()
         self.args = args
         self.logfile = kwargs.get('logfile')
+        self.logs = kwargs.get('logs')
 
 
 class BinaryPackageBuildError(RuntimeError):
@@ -56,12 +56,14 @@ class BinaryPackageBuildError(RuntimeError):
         Constructor of BinaryPackageBuildError
         :param args: tuple of arguments stored in the exception instance
         :param kwargs: dictionary containing path to the logfile that contains main errors
+                       and list of all logs of the failed build
         """
         super(BinaryPackageBuildError, self).__init__()
         self.args = args
         # Return code obtained from koji only at this time
         self.return_code = kwargs.get('return_code')
         self.logfile = kwargs.get('logfile')
+        self.logs = kwargs.get('logs')
 
 
 class BuildTemporaryEnvironment(TemporaryEnvironment):
@@ -178,12 +180,21 @@ class BuildToolBase(Plugin):
         ACCEPTS_OPTIONS(bool): If True, the build tool accepts additional
             options passed via --builder-options.
         CREATES_TASKS(bool): If True, the build tool creates remote tasks.
+        PARALLEL_SAFE(bool): If True, the build tool can run old and new builds
+            at the same time, each of them isolated according to the concurrent_build_id
+            keyword argument and limited to the number of CPUs specified by the cpus
+            keyword argument.
+        INCREMENTAL_BUILDS(bool): If True, the build tool keeps build tree in the directory
+            specified by the build_tree_dir keyword argument and is able to reuse it to rerun only
+            %install and packaging stages if the incremental_build keyword argument is True.
 
     """
 
     DEFAULT = False
     ACCEPTS_OPTIONS = False
     CREATES_TASKS = False
+    PARALLEL_SAFE = False
+    INCREMENTAL_BUILDS = False
 
     @classmethod
     def prepare(cls, spec, conf):
@@ -260,6 +271,17 @@ class BuildToolBase(Plugin):
         """
         raise NotImplementedError()
 
+    @classmethod
+    def get_build_environment(cls, **kwargs):
+        """Gets properties of the environment the build runs in that affect its results.
+
+        Returns:
+            dict: Properties of the environment, None if the build runs in the host environment,
+            which is always taken into account.
+
+        """
+        return None
+
     @staticmethod
     def get_builder_options(**kwargs):
         builder_options = kwargs.get('builder_options')
@@ -267,16 +289,43 @@ class BuildToolBase(Plugin):
             return shlex.split(builder_options)
         return None
 
+    @staticmethod
+    def get_smp_mflags_options(**kwargs):
+        """Gets options limiting number of CPUs used by a concurrent build.
+
+        Returns:
+            list: Options redefining %_smp_mflags macro or None if there is no limit.
+
+        """
+        cpus = kwargs.get('cpus')
+        if cpus:
+            return ['--define', '_smp_mflags -j{}'.format(cpus)]
+        return None
+
 
 class SRPMBuildToolBase(Plugin):
     """SRPM build tool base class.
 
     Attributes:
         DEFAULT(bool): If True, the build tool is default tool.
+        PARALLEL_SAFE(bool): If True, the build tool can build multiple SRPMs
+            at the same time.
 
     """
 
     DEFAULT = False
+    PARALLEL_SAFE = False
+
+    @classmethod
+    def get_build_environment(cls, **kwargs):
+        """Gets properties of the environment the build runs in that affect its results.
+
+        Returns:
+            dict: Properties of the environment, None if the build runs in the host environment,
+            which is always taken into account.
+
+        """
+        return None
 
     @staticmethod
     def get_srpm_builder_options(**kwargs):
@@ -315,10 +364,14 @@ class SRPMBuildHelper(object):
         return list(self.srpm_build_tools)
 
     def get_supported_tools(self):
-        return [k for k, v in six.iteritems(self.srpm_build_tools) if v]
+        return self.srpm_build_tools.get_available()
 
     def get_default_tool(self):
-        default = [k for k, v in six.iteritems(self.srpm_build_tools) if v and v.DEFAULT]
+        default = self.srpm_build_tools.get_default()
+        return default[0] if default else None
+
+    def get_declared_default_tool(self):
+        default = self.srpm_build_tools.get_declared_default()
         return default[0] if default else None
 
     def get_tool(self, tool):
@@ -336,10 +389,14 @@ class BuildHelper(object):
         return list(self.build_tools)
 
     def get_supported_tools(self):
-        return [k for k, v in six.iteritems(self.build_tools) if v]
+        return self.build_tools.get_available()
 
     def get_default_tool(self):
-        default = [k for k, v in six.iteritems(self.build_tools) if v and v.DEFAULT]
+        default = self.build_tools.get_default()
+        return default[0] if default else None
+
+    def get_declared_default_tool(self):
+        default = self.build_tools.get_declared_default()
         return default[0] if default else None
 
     def get_tool(self, tool):
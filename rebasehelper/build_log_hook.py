@@ -25,6 +25,7 @@ import six
 from rebasehelper.plugins import Plugin, PluginLoader
 from rebasehelper.logger import logger
 from rebasehelper.results_store import results_store
+from rebasehelper.helpers.timing_helper import TimingHelper
 
 
 class BaseBuildLogHook(Plugin):
@@ -67,7 +68,7 @@ class BuildLogHookRunner(object):
         return list(self.build_log_hooks)
 
     def get_supported_tools(self):
-        return [k for k, v in six.iteritems(self.build_log_hooks) if v]
+        return self.build_log_hooks.get_available()
 
     def run(self, spec_file, rebase_spec_file, non_interactive, force_build_log_hooks, **kwargs):
         """Runs all non-blacklisted build log hooks.
@@ -90,7 +91,8 @@ class BuildLogHookRunner(object):
                 categories = build_log_hook.CATEGORIES
                 if not categories or spec_file.category in categories:
                     logger.info('Running %s build log hook.', name)
-                    result, rerun = build_log_hook.run(spec_file, rebase_spec_file, **kwargs)
+                    with TimingHelper.measure('hooks', name, type='build_log'):
+                        result, rerun = build_log_hook.run(spec_file, rebase_spec_file, **kwargs)
                     result = build_log_hook.merge_two_results(results_store.get_build_log_hooks().get(name, {}), result)
                     results_store.set_build_log_hooks_result(name, result)
                     if rerun:
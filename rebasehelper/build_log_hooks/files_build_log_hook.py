@@ -189,7 +189,8 @@ class FilesBuildLogHook(BaseBuildLogHook):
         with the closest matching path.
 
         """
-        macros = [m for m in rebase_spec_file.macros if m['name'] in MacroHelper.MACROS_WHITELIST]
+        macros = [m for n in MacroHelper.MACROS_WHITELIST
+                  for m in MacroHelper.filter(rebase_spec_file.macros, name=n)]
         macros = MacroHelper.expand_macros(macros)
         # ensure maximal greediness
         macros.sort(key=lambda k: len(k['value']), reverse=True)
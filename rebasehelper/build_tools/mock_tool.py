@@ -25,6 +25,7 @@ import os
 from rebasehelper.helpers.process_helper import ProcessHelper
 from rebasehelper.logger import logger
 from rebasehelper.helpers.path_helper import PathHelper
+from rebasehelper.helpers.build_cache_helper import BuildCacheHelper
 from rebasehelper.build_helper import BuildToolBase
 from rebasehelper.build_helper import BinaryPackageBuildError
 from rebasehelper.build_helper import MockTemporaryEnvironment
@@ -37,12 +38,34 @@ class MockBuildTool(BuildToolBase):  # pylint: disable=abstract-method
 
     DEFAULT = True
     ACCEPTS_OPTIONS = True
+    # concurrent builds use separate chroots, see --uniqueext
+    PARALLEL_SAFE = True
 
     CMD = "mock"
     logs = []
 
     @classmethod
-    def _build_rpm(cls, srpm, results_dir, rpm_results_dir, root=None, arch=None, builder_options=None):
+    def get_build_environment(cls, **kwargs):
+        return BuildCacheHelper.get_mock_config(cls.get_builder_options(**kwargs))
+
+    @staticmethod
+    def _get_uniqueext(concurrent_build_id):
+        """
+        Gets unique chroot extension of a concurrent build.
+
+        The extension contains PID of the current process, so that concurrent builds
+        of separate rebase-helper processes don't share their chroots.
+
+        :param concurrent_build_id: identifier of a concurrent build or None
+        :return: unique chroot extension or None if the build is not concurrent.
+        """
+        if not concurrent_build_id:
+            return None
+        return 'rebase-helper-{}-{}'.format(os.getpid(), concurrent_build_id)
+
+    @classmethod
+    def _build_rpm(cls, srpm, results_dir, rpm_results_dir, root=None, arch=None, builder_options=None,
+                   uniqueext=None, smp_mflags_options=None):
         """
         Build RPM using mock.
 
@@ -52,6 +75,8 @@ class MockBuildTool(BuildToolBase):  # pylint: disable=abstract-method
         :param root: path to where chroot should be built.
         :param arch: target architectures for the build.
         :param builder_options: builder_options for mock.
+        :param uniqueext: unique chroot extension allowing concurrent builds.
+        :param smp_mflags_options: options limiting number of CPUs used by the build.
         :return abs paths to RPMs.
         """
         logger.info("Building RPMs")
@@ -60,8 +85,12 @@ class MockBuildTool(BuildToolBase):  # pylint: disable=abstract-method
         cmd = [cls.CMD, '--old-chroot', '--rebuild', srpm, '--resultdir', results_dir]
         if root is not None:
             cmd.extend(['--root', root])
+        if uniqueext is not None:
+            cmd.extend(['--uniqueext', uniqueext])
         if arch is not None:
             cmd.extend(['--arch', arch])
+        if smp_mflags_options is not None:
+            cmd.extend(smp_mflags_options)
         if builder_options is not None:
             cmd.extend(builder_options)
 
@@ -72,8 +101,9 @@ class MockBuildTool(BuildToolBase):  # pylint: disable=abstract-method
         else:
             logfile = MockBuildTool.get_mock_logfile_path(ret, rpm_results_dir, tmp_path=results_dir)
         logs = [l for l in PathHelper.find_all_files(results_dir, '*.log')]
-        cls.logs.extend([os.path.join(rpm_results_dir, os.path.basename(l)) for l in logs])
-        raise BinaryPackageBuildError("Building RPMs failed!", rpm_results_dir, logfile=logfile)
+        logs = [os.path.join(rpm_results_dir, os.path.basename(l)) for l in logs]
+        cls.logs = logs
+        raise BinaryPackageBuildError("Building RPMs failed!", rpm_results_dir, logfile=logfile, logs=logs)
 
     @staticmethod
     def get_mock_logfile_path(ret, results_dir, tmp_path=None):
@@ -117,19 +147,23 @@ class MockBuildTool(BuildToolBase):  # pylint: disable=abstract-method
         :param srpm: absolute path to SRPM
         :param root: mock root used for building
         :param arch: architecture to build the RPM for
+        :param concurrent_build_id: identifier of a concurrent build, used to isolate its chroot
+        :param cpus: number of CPUs the build can use
         :return: dict with:
                  'rpm' -> list with absolute paths to RPMs
                  'logs' -> list with absolute paths to logs
         """
-        cls.logs = []
         rpm_results_dir = os.path.join(results_dir, "RPM")
         sources = spec.get_sources()
         patches = [p.get_path() for p in spec.get_patches()]
         with MockTemporaryEnvironment(sources, patches, spec.get_path(), rpm_results_dir) as tmp_env:
             env = tmp_env.env()
             tmp_results_dir = env.get(MockTemporaryEnvironment.TEMPDIR_RESULTS)
+            concurrent_build_id = kwargs.get('concurrent_build_id')
             rpms = cls._build_rpm(srpm, tmp_results_dir, rpm_results_dir,
-                                  builder_options=cls.get_builder_options(**kwargs))
+                                  builder_options=cls.get_builder_options(**kwargs),
+                                  uniqueext=cls._get_uniqueext(concurrent_build_id),
+                                  smp_mflags_options=cls.get_smp_mflags_options(**kwargs))
             # remove SRPM - side product of building RPM
             tmp_srpm = PathHelper.find_first_file(tmp_results_dir, "*.src.rpm")
             if tmp_srpm is not None:
@@ -141,7 +175,7 @@ class MockBuildTool(BuildToolBase):  # pylint: disable=abstract-method
         logger.verbose("Successfully built RPMs: '%s'", str(rpms))
 
         # gather logs
-        cls.logs.extend([l for l in PathHelper.find_all_files(rpm_results_dir, '*.log')])
-        logger.verbose("logs: '%s'", str(cls.logs))
+        logs = [l for l in PathHelper.find_all_files(rpm_results_dir, '*.log')]
+        logger.verbose("logs: '%s'", str(logs))
 
-        return dict(rpm=rpms, logs=cls.logs)
+        return dict(rpm=rpms, logs=logs)
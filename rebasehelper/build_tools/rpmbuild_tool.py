@@ -21,6 +21,7 @@
 #          Tomas Hozza <thozza@redhat.com>
 
 import os
+import shutil
 
 from rebasehelper.helpers.process_helper import ProcessHelper
 from rebasehelper.helpers.input_helper import InputHelper
@@ -39,12 +40,16 @@ class RpmbuildBuildTool(BuildToolBase):  # pylint: disable=abstract-method
     """
 
     ACCEPTS_OPTIONS = True
+    # every build runs in its own temporary rpmbuild tree
+    PARALLEL_SAFE = True
+    INCREMENTAL_BUILDS = True
 
     CMD = "rpmbuild"
     logs = []
 
     @classmethod
-    def _build_rpm(cls, srpm, workdir, results_dir, rpm_results_dir, builder_options=None):
+    def _build_rpm(cls, srpm, workdir, results_dir, rpm_results_dir, builder_options=None,
+                   smp_mflags_options=None, build_tree_dir=None):
         """
         Build RPM using rpmbuild.
 
@@ -53,27 +58,77 @@ class RpmbuildBuildTool(BuildToolBase):  # pylint: disable=abstract-method
                         structure, which will be used as HOME dir.
         :param results_dir: abs path to dir where the log should be placed.
         :param rpm_results_dir: path directory to where RPMs will be placed.
+        :param smp_mflags_options: options limiting number of CPUs used by the build.
+        :param build_tree_dir: abs path to dir where build and buildroot trees should be kept.
         :return: abs paths to built RPMs.
         """
         logger.info("Building RPMs")
         output = os.path.join(results_dir, "build.log")
 
         cmd = [cls.CMD, '--rebuild', srpm]
+        cmd.extend(cls._get_build_tree_options(build_tree_dir))
+        if smp_mflags_options is not None:
+            cmd.extend(smp_mflags_options)
         if builder_options is not None:
             cmd.extend(builder_options)
         ret = ProcessHelper.run_subprocess_cwd_env(cmd,
                                                    env={'HOME': workdir},
                                                    output_file=output)
 
-        build_log_path = os.path.join(rpm_results_dir, 'build.log')
-
         if ret == 0:
             return [f for f in PathHelper.find_all_files(workdir, '*.rpm') if not f.endswith('.src.rpm')]
-        # An error occurred, raise an exception
-        logfile = build_log_path
+        raise cls._get_build_error(results_dir, rpm_results_dir, 'build.log')
+
+    @classmethod
+    def _build_rpm_incremental(cls, spec, workdir, results_dir, rpm_results_dir, build_tree_dir,
+                               builder_options=None, smp_mflags_options=None):
+        """
+        Rebuild RPM using rpmbuild, reusing build tree of the previous build.
+
+        Only %install and packaging stages are run.
+
+        :param spec: abs path to SPEC file inside the rpmbuild/SPECS in workdir.
+        :param workdir: abs path to working directory with rpmbuild directory
+                        structure, which will be used as HOME dir.
+        :param results_dir: abs path to dir where the log should be placed.
+        :param rpm_results_dir: path directory to where RPMs will be placed.
+        :param build_tree_dir: abs path to dir with build and buildroot trees of the previous build.
+        :param smp_mflags_options: options limiting number of CPUs used by the build.
+        :return: abs paths to built RPMs.
+        """
+        logger.info("Rebuilding RPMs incrementally")
+        spec_loc, spec_name = os.path.split(spec)
+        # %check has already passed in the previous build
+        for stage, log, stage_options in [('-bi', 'install.log', ['--nocheck']), ('-bb', 'build.log', [])]:
+            cmd = [cls.CMD, stage, '--short-circuit', spec_name] + stage_options
+            cmd.extend(cls._get_build_tree_options(build_tree_dir))
+            if smp_mflags_options is not None:
+                cmd.extend(smp_mflags_options)
+            if builder_options is not None:
+                cmd.extend(builder_options)
+            ret = ProcessHelper.run_subprocess_cwd_env(cmd,
+                                                       cwd=spec_loc,
+                                                       env={'HOME': workdir},
+                                                       output_file=os.path.join(results_dir, log))
+            if ret != 0:
+                raise cls._get_build_error(results_dir, rpm_results_dir, log)
+
+        return [f for f in PathHelper.find_all_files(workdir, '*.rpm') if not f.endswith('.src.rpm')]
+
+    @classmethod
+    def _get_build_error(cls, results_dir, rpm_results_dir, log):
+        logfile = os.path.join(rpm_results_dir, log)
         logs = [l for l in PathHelper.find_all_files(results_dir, '*.log')]
-        cls.logs.extend([os.path.join(rpm_results_dir, os.path.basename(l)) for l in logs])
-        raise BinaryPackageBuildError("Building RPMs failed!", results_dir, logfile=logfile)
+        logs = [os.path.join(rpm_results_dir, os.path.basename(l)) for l in logs]
+        cls.logs = logs
+        return BinaryPackageBuildError("Building RPMs failed!", results_dir, logfile=logfile, logs=logs)
+
+    @staticmethod
+    def _get_build_tree_options(build_tree_dir):
+        if build_tree_dir is None:
+            return []
+        return ['--define', '_builddir {}'.format(os.path.join(build_tree_dir, 'BUILD')),
+                '--define', '_buildrootdir {}'.format(os.path.join(build_tree_dir, 'BUILDROOT'))]
 
     @classmethod
     def prepare(cls, spec, conf):
@@ -98,20 +153,36 @@ class RpmbuildBuildTool(BuildToolBase):  # pylint: disable=abstract-method
         :param spec: SpecFile object
         :param results_dir: absolute path to DIR where results should be stored
         :param srpm: absolute path to SRPM
+        :param cpus: number of CPUs the build can use
+        :param build_tree_dir: absolute path to DIR where build tree should be kept for incremental rebuilds
+        :param incremental_build: whether to reuse build tree of the previous build
         :return: dict with:
                  'rpm' -> list with absolute paths to RPMs
                  'logs' -> list with absolute paths to build_logs
+                 'incremental' -> True if RPMs were rebuilt incrementally
         """
-        cls.logs = []
         rpm_results_dir = os.path.join(results_dir, "RPM")
         sources = spec.get_sources()
         patches = [p.get_path() for p in spec.get_patches()]
+        build_tree_dir = kwargs.get('build_tree_dir')
+        incremental = bool(kwargs.get('incremental_build') and build_tree_dir and os.path.isdir(build_tree_dir))
+        if build_tree_dir and not incremental and os.path.exists(build_tree_dir):
+            # remove build tree of the previous build
+            shutil.rmtree(build_tree_dir)
         with RpmbuildTemporaryEnvironment(sources, patches, spec.get_path(), rpm_results_dir) as tmp_env:
             env = tmp_env.env()
             tmp_dir = tmp_env.path()
             tmp_results_dir = env.get(RpmbuildTemporaryEnvironment.TEMPDIR_RESULTS)
-            rpms = cls._build_rpm(srpm, tmp_dir, tmp_results_dir, rpm_results_dir,
-                                  builder_options=cls.get_builder_options(**kwargs))
+            if incremental:
+                rpms = cls._build_rpm_incremental(env.get(RpmbuildTemporaryEnvironment.TEMPDIR_SPEC), tmp_dir,
+                                                  tmp_results_dir, rpm_results_dir, build_tree_dir,
+                                                  builder_options=cls.get_builder_options(**kwargs),
+                                                  smp_mflags_options=cls.get_smp_mflags_options(**kwargs))
+            else:
+                rpms = cls._build_rpm(srpm, tmp_dir, tmp_results_dir, rpm_results_dir,
+                                      builder_options=cls.get_builder_options(**kwargs),
+                                      smp_mflags_options=cls.get_smp_mflags_options(**kwargs),
+                                      build_tree_dir=build_tree_dir)
 
         logger.info("Building RPMs finished successfully")
 
@@ -120,7 +191,10 @@ class RpmbuildBuildTool(BuildToolBase):  # pylint: disable=abstract-method
         logger.verbose("Successfully built RPMs: '%s'", str(rpms))
 
         # gather logs
-        cls.logs.extend([l for l in PathHelper.find_all_files(rpm_results_dir, '*.log')])
-        logger.verbose("logs: '%s'", str(cls.logs))
+        logs = [l for l in PathHelper.find_all_files(rpm_results_dir, '*.log')]
+        logger.verbose("logs: '%s'", str(logs))
 
-        return dict(rpm=rpms, logs=cls.logs)
+        result = dict(rpm=rpms, logs=logs)
+        if incremental:
+            result['incremental'] = True
+        return result
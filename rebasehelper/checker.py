@@ -20,13 +20,18 @@
 # Authors: Petr Hracek <phracek@redhat.com>
 #          Tomas Hozza <thozza@redhat.com>
 
+import functools
+import multiprocessing
 import os
 
-import six
-
 from rebasehelper.plugins import Plugin, PluginLoader
 from rebasehelper.logger import logger
 from rebasehelper.constants import RESULTS_DIR
+from rebasehelper.exceptions import CheckerNotFoundError
+from rebasehelper.helpers.parallel_helper import ParallelHelper
+from rebasehelper.helpers.process_helper import ProcessHelper
+from rebasehelper.helpers.limit_helper import LimitHelper
+from rebasehelper.helpers.timing_helper import TimingHelper
 
 
 class BaseChecker(Plugin):
@@ -35,11 +40,14 @@ class BaseChecker(Plugin):
     Attributes:
         DEFAULT(bool): If True, the checker is run by default.
         CATEGORY(str): Category which determines when the checker is run. Valid options: SRPM/RPM/SOURCE.
+        PARALLEL_SAFE(bool): If True, the checker can run concurrently with other checkers. Checkers
+            keeping their state in attributes of a shared class or using shared resources must not set this.
         results_dir(str): Path where the results are stored.
     """
 
     DEFAULT = False
     CATEGORY = None
+    PARALLEL_SAFE = False
     results_dir = None
 
     @classmethod
@@ -56,6 +64,30 @@ class BaseChecker(Plugin):
         """Perform the check itself and return results."""
         raise NotImplementedError()
 
+    @classmethod
+    def run_commands(cls, commands, output_files, jobs=None):
+        """Runs checker commands concurrently.
+
+        Args:
+            commands (list): Commands to run.
+            output_files (list): Files or file-like objects to write the output of the respective commands to.
+            jobs (int): Maximum number of commands running at the same time, defaults to number of CPUs.
+
+        Returns:
+            list: Exit codes of the commands.
+
+        Raises:
+            CheckerNotFoundError: If the checker executable was not found.
+
+        """
+        def run(cmd, output_file):
+            return ProcessHelper.run_subprocess(cmd, output_file=output_file)
+
+        try:
+            return ParallelHelper.run(run, list(zip(commands, output_files)), jobs or multiprocessing.cpu_count())
+        except OSError:
+            raise CheckerNotFoundError("Checker '{}' was not found or installed.".format(cls.name))
+
     @classmethod
     def format(cls, data):
         """Formats checker output to a readable text form."""
@@ -95,10 +127,13 @@ class CheckersRunner(object):
         return list(self.checkers)
 
     def get_supported_tools(self):
-        return [k for k, v in six.iteritems(self.checkers) if v]
+        return self.checkers.get_available()
 
     def get_default_tools(self):
-        return [k for k, v in six.iteritems(self.checkers) if v and v.DEFAULT]
+        return self.checkers.get_default()
+
+    def get_declared_default_tools(self):
+        return self.checkers.get_declared_default()
 
     def run_checker(self, results_dir, checker_name, **kwargs):
         """
@@ -119,7 +154,42 @@ class CheckersRunner(object):
             return None
 
         logger.info("Running checks on packages using '%s'", checker_name)
-        return checker.run_check(results_dir, **kwargs)
+        with LimitHelper.limit('checkers'):
+            with TimingHelper.measure('checkers', checker_name, type=checker.CATEGORY):
+                return checker.run_check(results_dir, **kwargs)
+
+    def run_checkers(self, results_dir, checker_names, workers=None, **kwargs):
+        """Runs the specified checkers, parallel-safe ones concurrently.
+
+        Parallel-safe checkers are run first, the remaining ones are run one after another afterwards.
+
+        Args:
+            results_dir (str): Path to a directory in which the checkers should store the results.
+            checker_names (list): Names of checkers to run.
+            workers (int): Maximum number of checkers running at the same time, defaults to
+                number of parallel-safe checkers.
+            **kwargs: Keyword arguments passed to the checkers.
+
+        Returns:
+            list: Tuples of checker name and its results in order of checker_names, checkers
+            that were not run or that returned no results are omitted.
+
+        """
+        parallel = [n for n in checker_names if self.checkers.get(n) and self.checkers[n].PARALLEL_SAFE and
+                    self.checkers[n].CATEGORY == kwargs.get('category')]
+        serial = [n for n in checker_names if n not in parallel]
+        func = functools.partial(self._run_checker, **kwargs)
+        results = dict(zip(parallel, ParallelHelper.run(func, [(results_dir, n) for n in parallel], workers)))
+        for checker_name in serial:
+            results[checker_name] = func(results_dir, checker_name)
+        return [(n, results[n]) for n in checker_names if results.get(n)]
+
+    def _run_checker(self, results_dir, checker_name, **kwargs):
+        try:
+            return self.run_checker(results_dir, checker_name, **kwargs)
+        except CheckerNotFoundError:
+            logger.error("Rebase-helper did not find checker '%s'.", checker_name)
+            return None
 
 
 # Global instance of CheckersRunner. It is enough to load it once per application run.
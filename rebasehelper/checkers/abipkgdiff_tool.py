@@ -28,7 +28,7 @@ import rpm
 import six
 
 from rebasehelper.logger import logger
-from rebasehelper.exceptions import RebaseHelperError, CheckerNotFoundError
+from rebasehelper.exceptions import RebaseHelperError
 from rebasehelper.results_store import results_store
 from rebasehelper.checker import BaseChecker
 from rebasehelper.helpers.process_helper import ProcessHelper
@@ -36,20 +36,15 @@ from rebasehelper.helpers.rpm_helper import RpmHelper
 
 
 class AbiCheckerTool(BaseChecker):
-    """abipkgdiff compare tool
-
-    Attributes:
-        abi_changes(bool): True if ABI changes were detected.
-    """
+    """abipkgdiff compare tool"""
 
     DEFAULT = True
     CATEGORY = 'RPM'
-    results_dir = ''
+    PARALLEL_SAFE = True
 
     CMD = 'abipkgdiff'
     ABIDIFF_ERROR = 1
     ABIDIFF_USAGE_ERROR = 2
-    abi_changes = None
 
     @classmethod
     def is_available(cls):
@@ -90,14 +85,14 @@ class AbiCheckerTool(BaseChecker):
     @classmethod
     def run_check(cls, results_dir, **kwargs):
         """Compares old and new RPMs using abipkgdiff"""
-        # Check if ABI changes occured
-        cls.abi_changes = None
-        cls.results_dir = os.path.join(results_dir, cls.name)
-        os.makedirs(cls.results_dir)
+        # keep no state in class attributes, the checker is run concurrently
+        results_dir = os.path.join(results_dir, cls.name)
+        os.makedirs(results_dir)
         debug_old, rest_pkgs_old = cls._get_packages_for_abipkgdiff(results_store.get_build('old'))
         debug_new, rest_pkgs_new = cls._get_packages_for_abipkgdiff(results_store.get_build('new'))
         cmd = [cls.CMD]
-        reports = {}
+        names = []
+        commands = []
         for pkg in rest_pkgs_old:
             command = list(cmd)
             debug = cls._find_debuginfo(debug_old, pkg)
@@ -117,27 +112,28 @@ class AbiCheckerTool(BaseChecker):
             command.append(pkg)
             command.append(new_pkg)
             logger.verbose('Package name for ABI comparison %s', old_name)
-            output = os.path.join(cls.results_dir, old_name + '.txt')
-            try:
-                ret_code = ProcessHelper.run_subprocess(command, output_file=output)
-            except OSError:
-                raise CheckerNotFoundError("Checker '{}' was not found or installed.".format(cls.name))
-
+            names.append(old_name)
+            commands.append(command)
+        outputs = [os.path.join(results_dir, name + '.txt') for name in names]
+        ret_codes = cls.run_commands(commands, outputs, kwargs.get('checker_jobs'))
+        reports = {}
+        for name, ret_code in zip(names, ret_codes):
             if int(ret_code) & cls.ABIDIFF_ERROR and int(ret_code) & cls.ABIDIFF_USAGE_ERROR:
                 raise RebaseHelperError('Execution of {} failed.\nCommand line is: {}'.format(cls.CMD, cmd))
-            reports[old_name] = int(ret_code)
-        return dict(packages=cls.parse_abi_logs(reports),
-                    abi_changes=cls.abi_changes,
+            reports[name] = int(ret_code)
+        # Check if ABI changes occured
+        abi_changes = True if any(six.itervalues(reports)) else None
+        return dict(packages=cls.parse_abi_logs(reports, results_dir),
+                    abi_changes=abi_changes,
                     path=cls.get_checker_output_dir_short())
 
     @classmethod
-    def parse_abi_logs(cls, reports):
+    def parse_abi_logs(cls, reports, results_dir):
         """Parses summary information from abipkgdiff logs.
 
-        Sets abi_changes attribute if there are any ABI changes found.
-
         Args:
             reports(dict): Dictionary mapping package names to abipkgdiff return codes.
+            results_dir(str): Path to a directory containing the logs.
 
         Returns:
             dict: Dictionary mapping package names to a dict of summary information for each shared object.
@@ -197,8 +193,7 @@ class AbiCheckerTool(BaseChecker):
         for pkg, ret_code in six.iteritems(reports):
             # If no abi changes for the package, store empty dictionary
             if ret_code:
-                with open(os.path.join(cls.results_dir, pkg + '.txt'), 'r') as f:
-                    cls.abi_changes = True
+                with open(os.path.join(results_dir, pkg + '.txt'), 'r') as f:
                     pkgs[pkg] = parse_changes(f.readlines())
         return pkgs
 
@@ -27,7 +27,7 @@ import re
 from six import StringIO
 
 from rebasehelper.logger import logger
-from rebasehelper.exceptions import RebaseHelperError, CheckerNotFoundError
+from rebasehelper.exceptions import RebaseHelperError
 from rebasehelper.results_store import results_store
 from rebasehelper.checker import BaseChecker
 from rebasehelper.helpers.process_helper import ProcessHelper
@@ -39,6 +39,7 @@ class RpmDiffTool(BaseChecker):
 
     DEFAULT = True
     CATEGORY = 'RPM'
+    PARALLEL_SAFE = True
 
     CMD = 'rpmdiff'
     CHECKER_TAGS = ['added', 'removed', 'changed', 'moved', 'renamed']
@@ -107,13 +108,15 @@ class RpmDiffTool(BaseChecker):
         for tag in cls.CHECKER_TAGS:
             results_dict[tag] = []
 
-        cls.results_dir = os.path.join(results_dir, cls.name)
-        os.makedirs(cls.results_dir)
+        # keep no state in class attributes, the checker is run concurrently
+        results_dir = os.path.join(results_dir, cls.name)
+        os.makedirs(results_dir)
 
         # Only S (size), M(mode) and 5 (checksum) are now important
         not_catched_flags = ['T', 'F', 'G', 'U', 'V', 'L', 'D', 'N']
         old_pkgs = cls._get_rpms(results_store.get_old_build().get('rpm', None))
         new_pkgs = cls._get_rpms(results_store.get_new_build().get('rpm', None))
+        commands = []
         for key, value in six.iteritems(old_pkgs):
             if 'debuginfo' in key or 'debugsource' in key:
                 # skip debug{info,source} packages
@@ -129,14 +132,12 @@ class RpmDiffTool(BaseChecker):
             except KeyError:
                 logger.warning('New version of package %s was not found!', key)
                 continue
-            output = StringIO()
-            try:
-                ProcessHelper.run_subprocess(cmd, output_file=output)
-            except OSError:
-                raise CheckerNotFoundError("Checker '{}' was not found or installed.".format(cls.name))
+            commands.append(cmd)
+        outputs = [StringIO() for _ in commands]
+        cls.run_commands(commands, outputs, kwargs.get('checker_jobs'))
+        for output in outputs:
             results_dict = cls._analyze_logs(output, results_dict)
         results_dict = cls.update_added_removed(results_dict)
-        cls.results_dict = {k: v for k, v in six.iteritems(results_dict) if v}
         lines = []
         for key, val in six.iteritems(results_dict):
             if val:
@@ -145,7 +146,7 @@ class RpmDiffTool(BaseChecker):
                 lines.append('Following files were {}:'.format(key))
                 lines.extend(val)
 
-        rpmdiff_report = os.path.join(cls.results_dir, 'report.txt')
+        rpmdiff_report = os.path.join(results_dir, 'report.txt')
 
         counts = {k: len(v) for k, v in six.iteritems(results_dict)}
 
@@ -21,21 +21,32 @@
 #          Tomas Hozza <thozza@redhat.com>
 
 import argparse
+import json
 import logging
+import multiprocessing
 import os
+import shlex
 import sys
+import time
+import traceback
 
 import six
 
 from rebasehelper.options import OPTIONS, traverse_options
-from rebasehelper.constants import PROGRAM_DESCRIPTION, NEW_ISSUE_LINK, LOGS_DIR, TRACEBACK_LOG
+from rebasehelper.constants import PROGRAM_DESCRIPTION, NEW_ISSUE_LINK, LOGS_DIR, TRACEBACK_LOG, OUTPUT_LOG
+from rebasehelper.constants import BATCH_SUMMARY
 from rebasehelper.version import VERSION
 from rebasehelper.application import Application
-from rebasehelper.logger import logger, logger_traceback, main_handler, output_tool_handler, CustomLogger, LoggerHelper
+from rebasehelper.logger import logger, logger_output, logger_traceback, main_handler, output_tool_handler
+from rebasehelper.logger import CustomLogger, LoggerHelper
 from rebasehelper.exceptions import RebaseHelperError
+from rebasehelper.results_store import results_store
 from rebasehelper.helpers.console_helper import ConsoleHelper
+from rebasehelper.helpers.build_cache_helper import BuildCacheHelper
+from rebasehelper.helpers.source_cache_helper import SourceCacheHelper
+from rebasehelper.helpers.limit_helper import LimitHelper
 from rebasehelper.config import Config
-from rebasehelper.argument_parser import CustomArgumentParser, CustomHelpFormatter, CustomAction
+from rebasehelper.argument_parser import CustomArgumentParser, CustomHelpFormatter, CustomAction, LazyChoices
 
 
 class CLI(object):
@@ -49,9 +60,16 @@ class CLI(object):
         group = parser.add_mutually_exclusive_group()
         current_group = 0
         for option in traverse_options(OPTIONS):
+            option = dict(option)
             available_choices = option.pop("available_choices", option.get("choices"))
+            lazy_choices = None
             if available_choices_only:
-                option["choices"] = available_choices
+                if callable(available_choices):
+                    # argparse iterates over choices when adding an argument, set them afterwards
+                    lazy_choices = LazyChoices(available_choices, option.get("choices"))
+                    option["choices"] = None
+                else:
+                    option["choices"] = available_choices
 
             option_kwargs = dict(option)
             for key in ("group", "default", "name"):
@@ -69,8 +87,10 @@ class CLI(object):
             # default is set to SUPPRESS to prevent arguments which were not specified on command line from being
             # added to namespace. This allows rebase-helper to determine which arguments are used with their
             # default value. This is later used for merging CLI arguments with config.
-            actions_container.add_argument(*option["name"], action=CustomAction, default=argparse.SUPPRESS,
-                                           actual_default=option.get("default"), **option_kwargs)
+            action = actions_container.add_argument(*option["name"], action=CustomAction, default=argparse.SUPPRESS,
+                                                    actual_default=option.get("default"), **option_kwargs)
+            if lazy_choices is not None:
+                action.choices = lazy_choices
 
         return parser
 
@@ -95,16 +115,205 @@ class CLI(object):
             return object.__getattribute__(self, name)
 
 
+class BatchCLI(object):
+    """ Class for processing data from commandline in batch mode """
+
+    @staticmethod
+    def build_parser():
+        parser = argparse.ArgumentParser(prog='rebase-helper batch',
+                                         description='Rebase multiple packages concurrently',
+                                         epilog='Arguments following "--" are passed to each rebase-helper run.')
+        parser.add_argument('packages', nargs='*', metavar='PACKAGE_DIR',
+                            help='directory containing a package to rebase')
+        parser.add_argument('--packages-file', metavar='FILE',
+                            help='file listing directories of packages to rebase, one per line, optionally '
+                                 'followed by rebase-helper arguments specific to the package')
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+                            help='maximum number of packages rebased at the same time, '
+                                 'defaults to the number of CPUs')
+        for kind in LimitHelper.KINDS:
+            parser.add_argument('--max-{}'.format(kind), type=int, metavar='N',
+                                help='maximum number of {} running at the same time across all packages, '
+                                     'unlimited by default'.format(kind))
+        parser.add_argument('--summary', default=BATCH_SUMMARY, metavar='FILE',
+                            help='path to aggregated JSON summary of all runs, '
+                                 'defaults to {}'.format(BATCH_SUMMARY))
+        return parser
+
+    def __init__(self, args):
+        try:
+            i = args.index('--')
+        except ValueError:
+            self.common_args = []
+        else:
+            args, self.common_args = args[:i], args[i + 1:]
+        self.args = BatchCLI.build_parser().parse_args(args)
+
+    def __getattr__(self, name):
+        try:
+            return getattr(self.args, name)
+        except AttributeError:
+            return object.__getattribute__(self, name)
+
+    def get_packages(self):
+        """Gets packages to rebase.
+
+        Returns:
+            list: Tuples of absolute path to a package directory and rebase-helper arguments.
+
+        """
+        packages = [(p, []) for p in self.args.packages]
+        if self.args.packages_file:
+            with open(self.args.packages_file) as f:
+                for line in f:
+                    line = shlex.split(line, comments=True)
+                    if line:
+                        packages.append((line[0], line[1:]))
+        # batch runs can't interact with the user
+        return [(os.path.abspath(d), self.common_args + args + ['--non-interactive']) for d, args in packages]
+
+
+def _rebase_package(item):
+    # multiprocessing needs a module level function
+    index, (directory, args) = item
+    return index, CliHelper.rebase_package(directory, args)
+
+
 class CliHelper(object):
 
+    @staticmethod
+    def list_build_cache():
+        entries = BuildCacheHelper.get_entries()
+        if not entries:
+            logger.info('Build cache in %s is empty', BuildCacheHelper.get_cache_dir())
+            return
+        logger.info('Builds cached in %s:', BuildCacheHelper.get_cache_dir())
+        for entry in entries:
+            logger.info('%s %s-%s %s %.1f MiB, last used %s', entry['key'][:12], entry['name'], entry['version'],
+                        entry['subdir'], entry['size'] / (1024.0 * 1024.0),
+                        time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['last_used'])))
+        logger.info('Total size: %.1f MiB', sum(e['size'] for e in entries) / (1024.0 * 1024.0))
+
+    @staticmethod
+    def show_source_cache_stats():
+        entries = SourceCacheHelper.get_entries()
+        if not entries:
+            logger.info('Source cache in %s is empty', SourceCacheHelper.get_cache_dir())
+            return
+        logger.info('Source archives cached in %s:', SourceCacheHelper.get_cache_dir())
+        for entry in entries:
+            logger.info('%s %s %d files %.1f MiB, last used %s', entry['key'][:12], entry['name'], entry['files'],
+                        entry['size'] / (1024.0 * 1024.0),
+                        time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['last_used'])))
+        logger.info('Total: %d archives, %d files, %.1f MiB', len(entries), sum(e['files'] for e in entries),
+                    sum(e['size'] for e in entries) / (1024.0 * 1024.0))
+
+    @staticmethod
+    def rebase_package(directory, args):
+        """Rebases a package in batch mode.
+
+        Meant to be run in a dedicated worker process, which makes global state like
+        results_store, loaded plugins or logger handlers private to the run.
+
+        Args:
+            directory (str): Path to the package directory.
+            args (list): rebase-helper arguments.
+
+        Returns:
+            dict: Summary of the run.
+
+        """
+        summary = dict(directory=directory, arguments=args)
+        start = time.time()
+        # keep the console clean, everything is logged to files in the results directory
+        logger.removeHandler(main_handler)
+        logger_output.removeHandler(output_tool_handler)
+        try:
+            os.chdir(directory)
+            cli = CLI(list(args))
+            config = Config(getattr(cli, 'config-file', None))
+            config.merge(cli)
+            execution_dir, results_dir, debug_log_file = Application.setup(config)
+            summary['results_dir'] = results_dir
+            # redirect output of the process, e.g. download progress, to a file as well
+            fd = os.open(os.path.join(results_dir, LOGS_DIR, OUTPUT_LOG), os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(fd, sys.stdout.fileno())
+            os.dup2(fd, sys.stderr.fileno())
+            os.close(fd)
+            app = Application(config, execution_dir, results_dir, debug_log_file)
+            app.run()
+        except RebaseHelperError as e:
+            summary.update(result='fail', message=e.msg or six.text_type(e))
+        except (Exception, SystemExit):  # pylint: disable=broad-except
+            summary.update(result='error', message=traceback.format_exc())
+        else:
+            summary.update(result='success')
+        summary.update(wall_time=time.time() - start, results=results_store.get_all())
+        return summary
+
+    @staticmethod
+    def run_batch(args):
+        """Rebases multiple packages concurrently, each in a separate process.
+
+        Args:
+            args (list): Command line arguments of batch mode.
+
+        Returns:
+            bool: Whether all packages were rebased successfully.
+
+        """
+        cli = BatchCLI(args)
+        packages = cli.get_packages()
+        if not packages:
+            raise RebaseHelperError('No packages specified')
+        semaphores = LimitHelper.create_semaphores(**{k: getattr(cli, 'max_{}'.format(k)) for k in LimitHelper.KINDS})
+        # fork to share already loaded plugins and modules, each package gets a fresh process
+        context = multiprocessing.get_context('fork') if hasattr(multiprocessing, 'get_context') else multiprocessing
+        pool = context.Pool(min(cli.workers, len(packages)), LimitHelper.set_semaphores, (semaphores,),
+                            maxtasksperchild=1)
+        summaries = [None] * len(packages)
+        try:
+            for index, summary in pool.imap_unordered(_rebase_package, enumerate(packages)):
+                logger.info('%s: %s (%.0f s)', summary['directory'], summary['result'], summary['wall_time'])
+                summaries[index] = summary
+            pool.close()
+        except KeyboardInterrupt:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+        succeeded = len([s for s in summaries if s['result'] == 'success'])
+        with open(cli.summary, 'w') as f:
+            json.dump(dict(packages=summaries, succeeded=succeeded, failed=len(summaries) - succeeded),
+                      f, indent=4, sort_keys=True)
+        logger.info('%d of %d packages rebased successfully, summary is stored in %s',
+                    succeeded, len(summaries), cli.summary)
+        return succeeded == len(summaries)
+
     @staticmethod
     def run():
         debug_log_file = None
         try:
+            if sys.argv[1:2] == ['batch']:
+                sys.exit(0 if CliHelper.run_batch(sys.argv[2:]) else 1)
             cli = CLI()
             if hasattr(cli, 'version'):
                 logger.info(VERSION)
                 sys.exit(0)
+            if hasattr(cli, 'build_cache_list'):
+                CliHelper.list_build_cache()
+                sys.exit(0)
+            if hasattr(cli, 'build_cache_prune'):
+                logger.info('Removed %d cached builds', BuildCacheHelper.prune())
+                sys.exit(0)
+            if hasattr(cli, 'source_cache_stats'):
+                CliHelper.show_source_cache_stats()
+                sys.exit(0)
+            if hasattr(cli, 'source_cache_prune'):
+                logger.info('Removed %d cached source archives', SourceCacheHelper.prune())
+                sys.exit(0)
 
             config = Config(getattr(cli, 'config-file', None))
             config.merge(cli)
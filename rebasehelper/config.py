@@ -64,4 +64,5 @@ class Config(object):
                 dest = args[0]
 
             if dest and dest not in self.config:
-                self.config[dest] = option.get('default')
+                default = option.get('default')
+                self.config[dest] = default() if callable(default) else default
@@ -40,7 +40,9 @@ DEBUG_LOG = 'debug.log'
 TRACEBACK_LOG = 'traceback.log'
 VERBOSE_LOG = 'verbose.log'
 INFO_LOG = 'info.log'
+OUTPUT_LOG = 'output.log'
 REPORT = 'report'
+BATCH_SUMMARY = 'rebase-helper-batch.json'
 
 OLD_SOURCES_DIR = 'old_sources'
 NEW_SOURCES_DIR = 'new_sources'
@@ -50,6 +52,11 @@ GIT_CONFIG = '.gitconfig'
 CONFIG_PATH = '$XDG_CONFIG_HOME'
 CONFIG_FILENAME = 'rebase-helper.cfg'
 
+BUILD_CACHE_DIR = 'rebase-helper-builds'
+SPEC_CACHE_DIR = 'rebase-helper-specs'
+SOURCE_CACHE_DIR = 'rebase-helper-sources'
+PLUGIN_INDEX = 'rebase-helper-plugins.json'
+
 PACKAGE_CATEGORIES = {
     'python': re.compile(r'^python[23]?-'),
     'perl': re.compile(r'^perl-'),
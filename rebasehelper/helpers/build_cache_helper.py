@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+#
+# This tool helps you to rebase package to the latest version
+# Copyright (C) 2013-2014 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Authors: Petr Hracek <phracek@redhat.com>
+#          Tomas Hozza <thozza@redhat.com>
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import rpm
+import six
+
+from rebasehelper.constants import BUILD_CACHE_DIR
+from rebasehelper.helpers.path_helper import PathHelper
+from rebasehelper.logger import logger
+from rebasehelper.helpers.macro_helper import MacroHelper
+
+
+class BuildCacheHelper(object):
+
+    """Class for caching builds of packages.
+
+    Each cache entry is a directory named by a content hash of all inputs of a build,
+    including the build environment, containing the resulting files and metadata.
+    Entries are evicted in least recently used order when the total size of the cache
+    exceeds the limit.
+    """
+
+    METADATA_FILE = 'metadata.json'
+    FILES_DIR = 'files'
+    MOCK_CONFIG_DIR = '/etc/mock'
+
+    @staticmethod
+    def get_cache_dir():
+        """Gets path to the directory the cache is stored in."""
+        return PathHelper.get_cache_path(BUILD_CACHE_DIR)
+
+    @staticmethod
+    def _hash_file(path):
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    @staticmethod
+    def get_environment():
+        """Gets properties of the host environment affecting results of a build.
+
+        Returns:
+            dict: Version of rpm and expansions of %dist and %_arch macros.
+
+        """
+        return dict(rpm=rpm.__version__, dist=MacroHelper.expand('%{?dist}', ''),
+                    arch=MacroHelper.expand('%{_arch}', ''))
+
+    @classmethod
+    def get_mock_config(cls, options=None):
+        """Gets the mock configuration a build with the specified options would use.
+
+        Only the main configuration file is taken into account, files it includes are not.
+
+        Args:
+            options (list): Options passed to mock.
+
+        Returns:
+            dict: Name of the chroot and hash of content of its configuration file,
+            None if the file can't be read.
+
+        """
+        root = 'default'
+        options = options or []
+        for i, option in enumerate(options):
+            if option in ('-r', '--root') and i + 1 < len(options):
+                root = options[i + 1]
+            elif option.startswith('--root='):
+                root = option.split('=', 1)[1]
+            elif option.startswith('-r') and not option.startswith('--'):
+                root = option[2:]
+        # mock treats roots ending with .cfg as paths to configuration files
+        path = root if root.endswith('.cfg') else os.path.join(cls.MOCK_CONFIG_DIR, root + '.cfg')
+        try:
+            config = cls._hash_file(path)
+        except (IOError, OSError):
+            config = None
+        return dict(root=root, config=config)
+
+    @classmethod
+    def get_key(cls, spec, *args):
+        """Computes a cache key of a build of the specified SPEC file.
+
+        Args:
+            spec (rebasehelper.specfile.SpecFile): SPEC file to be built.
+            *args: Additional build parameters, e.g. build tool, its options and environment.
+
+        Returns:
+            str: Cache key or None if some of the build inputs are not available.
+
+        """
+        files = [spec.get_path()] + spec.get_sources() + [p.get_path() for p in spec.get_patches()]
+        h = hashlib.sha256()
+        for path in files:
+            if not os.path.isfile(path):
+                return None
+            h.update('{} {}\n'.format(os.path.basename(path), cls._hash_file(path)).encode('utf-8'))
+        h.update(json.dumps([cls.get_environment()] + list(args), sort_keys=True).encode('utf-8'))
+        return h.hexdigest()
+
+    @classmethod
+    def _read_metadata(cls, entry_dir):
+        try:
+            with open(os.path.join(entry_dir, cls.METADATA_FILE), 'r') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    @classmethod
+    def lookup(cls, key, results_dir):
+        """Restores a cached build.
+
+        Args:
+            key (str): Cache key of the build.
+            results_dir (str): Path to directory the cached files should be copied to.
+
+        Returns:
+            dict: Build data with paths to the restored files or None if the build is not cached.
+
+        """
+        entry_dir = os.path.join(cls.get_cache_dir(), key)
+        metadata = cls._read_metadata(entry_dir)
+        if metadata is None:
+            return None
+        files_dir = os.path.join(entry_dir, cls.FILES_DIR)
+        target_dir = os.path.join(results_dir, metadata['subdir'])
+        if not os.path.isdir(target_dir):
+            os.makedirs(target_dir)
+
+        def restore(filename):
+            shutil.copy2(os.path.join(files_dir, filename), target_dir)
+            return os.path.join(target_dir, filename)
+
+        build_dict = {}
+        try:
+            for k, v in six.iteritems(metadata['files']):
+                build_dict[k] = [restore(f) for f in v] if isinstance(v, list) else restore(v)
+        except (IOError, OSError):
+            logger.warning('Cached build %s is damaged, removing it', key)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+        # update last access time
+        os.utime(os.path.join(entry_dir, cls.METADATA_FILE), None)
+        logger.info('Using cached build from %s', entry_dir)
+        return build_dict
+
+    @classmethod
+    def store(cls, key, build_dict, file_keys, subdir, max_size=None):
+        """Stores a build in the cache.
+
+        Args:
+            key (str): Cache key of the build.
+            build_dict (dict): Build data.
+            file_keys (list): Keys of build data holding paths to files that should be cached.
+            subdir (str): Name of a subdirectory of results directory the files belong to.
+            max_size (int): Maximal size of the cache in bytes, unlimited if None.
+
+        """
+        cache_dir = cls.get_cache_dir()
+        entry_dir = os.path.join(cache_dir, key)
+        if os.path.isdir(entry_dir):
+            return
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        # populate a temporary directory first so that incomplete entries are never visible
+        tmp_dir = tempfile.mkdtemp(prefix='.tmp-', dir=cache_dir)
+        files_dir = os.path.join(tmp_dir, cls.FILES_DIR)
+        os.makedirs(files_dir)
+
+        def save(path):
+            shutil.copy2(path, files_dir)
+            return os.path.basename(path)
+
+        files = {}
+        try:
+            for k in file_keys:
+                v = build_dict.get(k)
+                if v:
+                    files[k] = [save(p) for p in v] if isinstance(v, list) else save(v)
+            size = sum(os.path.getsize(os.path.join(files_dir, f)) for f in os.listdir(files_dir))
+            metadata = dict(name=build_dict.get('name'), version=build_dict.get('version'), subdir=subdir,
+                            files=files, size=size, created=time.time())
+            with open(os.path.join(tmp_dir, cls.METADATA_FILE), 'w') as f:
+                json.dump(metadata, f)
+            os.rename(tmp_dir, entry_dir)
+        except (IOError, OSError) as e:
+            logger.warning('Failed to store build in cache: %s', six.text_type(e))
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+        logger.verbose('Stored build in cache %s', entry_dir)
+        if max_size is not None:
+            cls.evict(max_size)
+
+    @classmethod
+    def get_entries(cls):
+        """Gets information about cached builds.
+
+        Returns:
+            list: Dictionaries describing the cached builds, most recently used first.
+
+        """
+        cache_dir = cls.get_cache_dir()
+        if not os.path.isdir(cache_dir):
+            return []
+        entries = []
+        for key in os.listdir(cache_dir):
+            entry_dir = os.path.join(cache_dir, key)
+            metadata = cls._read_metadata(entry_dir)
+            if metadata is None:
+                continue
+            metadata.update(key=key, path=entry_dir,
+                            last_used=os.path.getmtime(os.path.join(entry_dir, cls.METADATA_FILE)))
+            entries.append(metadata)
+        return sorted(entries, key=lambda e: e['last_used'], reverse=True)
+
+    @classmethod
+    def evict(cls, max_size):
+        """Removes least recently used builds until the size of the cache fits the limit.
+
+        Args:
+            max_size (int): Maximal size of the cache in bytes.
+
+        Returns:
+            int: Number of removed builds.
+
+        """
+        entries = cls.get_entries()
+        total = sum(e['size'] for e in entries)
+        removed = 0
+        while entries and total > max_size:
+            entry = entries.pop()
+            logger.verbose('Evicting cached build %s', entry['path'])
+            shutil.rmtree(entry['path'], ignore_errors=True)
+            total -= entry['size']
+            removed += 1
+        return removed
+
+    @classmethod
+    def prune(cls):
+        """Removes all cached builds.
+
+        Returns:
+            int: Number of removed builds.
+
+        """
+        return cls.evict(0)
@@ -28,6 +28,7 @@ import re
 import sys
 import tempfile
 import termios
+import threading
 import tty
 
 import colors
@@ -42,6 +43,10 @@ class ConsoleHelper(object):
 
     use_colors = False
 
+    # held while standard output or error is redirected by Capturer, so that console
+    # output of other threads waits until it's restored instead of being captured
+    lock = threading.RLock()
+
     @classmethod
     def should_use_colors(cls, conf):
         """Determines whether ANSI colors should be used for CLI output.
@@ -185,7 +190,11 @@ class ConsoleHelper(object):
                 fcntl.fcntl(sys.stdin.fileno(), fcntl.F_SETFL, flags)
 
     class Capturer(object):
-        """ContextManager for capturing stdout/stderr"""
+        """ContextManager for capturing stdout/stderr
+
+        File descriptors are redirected for the whole process, ConsoleHelper.lock
+        is held until they are restored.
+        """
 
         def __init__(self, stdout=False, stderr=False):
             self.capture_stdout = stdout
@@ -208,6 +217,7 @@ class ConsoleHelper(object):
             self._stdout_copy = os.fdopen(os.dup(self._stdout_fileno), 'wb') if self.capture_stdout else None
             self._stderr_copy = os.fdopen(os.dup(self._stderr_fileno), 'wb') if self.capture_stderr else None
 
+            ConsoleHelper.lock.acquire()
             if self._stdout_tmp:
                 sys.stdout.flush()
                 os.dup2(self._stdout_tmp.fileno(), self._stdout_fileno)
@@ -218,12 +228,15 @@ class ConsoleHelper(object):
             return self
 
         def __exit__(self, *args):
-            if self._stdout_copy:
-                sys.stdout.flush()
-                os.dup2(self._stdout_copy.fileno(), self._stdout_fileno)
-            if self._stderr_copy:
-                sys.stderr.flush()
-                os.dup2(self._stderr_copy.fileno(), self._stderr_fileno)
+            try:
+                if self._stdout_copy:
+                    sys.stdout.flush()
+                    os.dup2(self._stdout_copy.fileno(), self._stdout_fileno)
+                if self._stderr_copy:
+                    sys.stderr.flush()
+                    os.dup2(self._stderr_copy.fileno(), self._stderr_fileno)
+            finally:
+                ConsoleHelper.lock.release()
 
             if self._stdout_tmp:
                 self._stdout_tmp.flush()
@@ -32,6 +32,8 @@ from six.moves import urllib
 
 from rebasehelper.exceptions import DownloadError
 from rebasehelper.logger import logger
+from rebasehelper.results_store import results_store
+from rebasehelper.helpers.limit_helper import LimitHelper
 
 
 class DownloadHelper(object):
@@ -130,53 +132,71 @@ class DownloadHelper(object):
             return None
 
     @staticmethod
-    def download_file(url, destination_path, blocksize=8192):
+    def download_file(url, destination_path, blocksize=8192, consumer=None):
         """Downloads a file from HTTP, HTTPS or FTP URL.
 
         Args:
             url (str): URL to be downloaded.
             destination_path (str): Path to where the downloaded file will be stored.
             blocksize (int): Block size in bytes.
+            consumer: File-like object the downloaded data are written to as well, e.g.
+                rebasehelper.archive.ExtractionStream. If the download is skipped because
+                the destination file already exists, content of the file is written to it instead.
 
         """
-        r = DownloadHelper.request(url, stream=True)
-        if r is None:
-            raise DownloadError("An unexpected error occurred during the download.")
-
-        if not 200 <= r.status_code < 300:
-            raise DownloadError(r.reason)
-
-        file_size = int(r.headers.get('content-length', -1))
-
-        # file exists, check the size
-        if os.path.exists(destination_path):
-            if file_size < 0 or file_size != os.path.getsize(destination_path):
-                logger.verbose("The destination file '%s' exists, but sizes don't match! Removing it.",
-                               destination_path)
-                os.remove(destination_path)
-            else:
-                logger.verbose("The destination file '%s' exists, and the size is correct! Skipping download.",
-                               destination_path)
-                return
-        try:
-            with open(destination_path, 'wb') as local_file:
-                logger.info('Downloading file from URL %s', url)
-                download_start = time.time()
-                downloaded = 0
-
-                # report progress
-                DownloadHelper.progress(file_size, downloaded, download_start)
-
-                # do the actual download
-                for chunk in r.iter_content(chunk_size=blocksize):
-                    downloaded += len(chunk)
-                    local_file.write(chunk)
+        with LimitHelper.limit('downloads'):
+            r = DownloadHelper.request(url, stream=True)
+            if r is None:
+                raise DownloadError("An unexpected error occurred during the download.")
+
+            if not 200 <= r.status_code < 300:
+                raise DownloadError(r.reason)
+
+            file_size = int(r.headers.get('content-length', -1))
+
+            # file exists, check the size
+            if os.path.exists(destination_path):
+                if file_size < 0 or file_size != os.path.getsize(destination_path):
+                    logger.verbose("The destination file '%s' exists, but sizes don't match! Removing it.",
+                                   destination_path)
+                    os.remove(destination_path)
+                else:
+                    logger.verbose("The destination file '%s' exists, and the size is correct! Skipping download.",
+                                   destination_path)
+                    if consumer is not None:
+                        with open(destination_path, 'rb') as f:
+                            for chunk in iter(lambda: f.read(blocksize), b''):
+                                consumer.write(chunk)
+                    return
+            try:
+                with open(destination_path, 'wb') as local_file:
+                    logger.info('Downloading file from URL %s', url)
+                    download_start = time.time()
+                    downloaded = 0
 
                     # report progress
                     DownloadHelper.progress(file_size, downloaded, download_start)
 
-                sys.stdout.write('\n')
-                sys.stdout.flush()
-        except KeyboardInterrupt as e:
-            os.remove(destination_path)
-            raise e
+                    # do the actual download
+                    for chunk in r.iter_content(chunk_size=blocksize):
+                        downloaded += len(chunk)
+                        local_file.write(chunk)
+                        if consumer is not None:
+                            consumer.write(chunk)
+
+                        # report progress
+                        DownloadHelper.progress(file_size, downloaded, download_start)
+
+                    sys.stdout.write('\n')
+                    sys.stdout.flush()
+
+                    duration = time.time() - download_start
+                    results_store.add_timing('downloads', dict(
+                        url=url,
+                        bytes=downloaded,
+                        start=download_start,
+                        wall_time=duration,
+                        throughput=downloaded / duration if duration > 0 else None))
+            except KeyboardInterrupt as e:
+                os.remove(destination_path)
+                raise e
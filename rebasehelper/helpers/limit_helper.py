@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+#
+# This tool helps you to rebase package to the latest version
+# Copyright (C) 2013-2014 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Authors: Petr Hracek <phracek@redhat.com>
+#          Tomas Hozza <thozza@redhat.com>
+
+import contextlib
+import multiprocessing
+
+
+class LimitHelper(object):
+
+    """Class for limiting the number of concurrently running actions of a kind.
+
+    The limits are enforced by semaphores shared by all processes created after
+    the limits were set, so they apply globally, e.g. to all packages rebased
+    in batch mode.
+    """
+
+    # kinds of actions that can be limited
+    KINDS = ['builds', 'downloads', 'checkers']
+
+    semaphores = {}
+
+    @classmethod
+    def create_semaphores(cls, **limits):
+        """Creates semaphores for the specified limits.
+
+        Args:
+            **limits: Maximal number of concurrently running actions for each kind,
+                no limit is enforced if the value is None.
+
+        Returns:
+            dict: Created semaphores, to be passed to set_semaphores() in worker processes.
+
+        Raises:
+            ValueError: If an unknown kind of action is specified.
+
+        """
+        semaphores = {}
+        for kind, limit in limits.items():
+            if kind not in cls.KINDS:
+                raise ValueError("Unknown kind of action '{}'".format(kind))
+            if limit is not None:
+                semaphores[kind] = multiprocessing.BoundedSemaphore(limit)
+        return semaphores
+
+    @classmethod
+    def set_semaphores(cls, semaphores):
+        """Sets semaphores enforcing the limits in the current process.
+
+        Args:
+            semaphores (dict): Semaphores created by create_semaphores().
+
+        """
+        cls.semaphores = semaphores
+
+    @classmethod
+    @contextlib.contextmanager
+    def limit(cls, kind):
+        """Waits until an action of the specified kind can be run and runs it.
+
+        Args:
+            kind (str): Kind of the action, one of KINDS.
+
+        """
+        semaphore = cls.semaphores.get(kind)
+        if semaphore is None:
+            yield
+            return
+        with semaphore:
+            yield
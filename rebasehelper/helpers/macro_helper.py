@@ -20,7 +20,10 @@
 # Authors: Petr Hracek <phracek@redhat.com>
 #          Tomas Hozza <thozza@redhat.com>
 
+import collections
+import hashlib
 import re
+import threading
 
 import rpm
 import six
@@ -30,6 +33,100 @@ from pkg_resources import parse_version
 from rebasehelper.helpers.console_helper import ConsoleHelper
 
 
+class MacroSnapshot(object):
+
+    """Immutable list of macros defined in global macro context, indexed by name and level.
+
+    Macros are represented as dicts with name, value, options, level and used keys
+    and must not be modified, a snapshot is shared by all its users.
+    """
+
+    INDEXED_KEYS = ('name', 'level')
+
+    def __init__(self, macros):
+        self._macros = tuple(macros)
+        self._fingerprint = None
+        self._index = collections.defaultdict(list)
+        for macro in self._macros:
+            self._index[('name', macro['name'])].append(macro)
+            self._index[('level', macro['level'])].append(macro)
+            self._index[('name', macro['name'], 'level', macro['level'])].append(macro)
+
+    def __iter__(self):
+        return iter(self._macros)
+
+    def __len__(self):
+        return len(self._macros)
+
+    def __getitem__(self, index):
+        return self._macros[index]
+
+    @property
+    def fingerprint(self):
+        """str: Hash of definitions of all macros, regardless of whether they were used."""
+        if self._fingerprint is None:
+            h = hashlib.sha256()
+            for m in self._macros:
+                h.update('{}\0{}\0{}\0{}\n'.format(m['name'], m['level'], m['options'] or '',
+                                                    m['value']).encode('utf-8'))
+            self._fingerprint = h.hexdigest()
+        return self._fingerprint
+
+    @staticmethod
+    def matches(macro, conditions):
+        """Checks if a macro satisfies conditions, see MacroHelper.filter()."""
+        return all(macro.get(k[4:]) >= v if k.startswith('min_') else
+                   macro.get(k[4:]) <= v if k.startswith('max_') else
+                   macro.get(k) == v for k, v in six.iteritems(conditions))
+
+    def filter(self, **kwargs):
+        """Finds all macros satisfying certain conditions.
+
+        Exact matches of name and level are looked up in the index,
+        remaining conditions are tested only on the found macros.
+
+        Args:
+            **kwargs: Filters to be used, see MacroHelper.filter().
+
+        Returns:
+            list: Macros satisfying the conditions.
+
+        """
+        key = ()
+        for k in self.INDEXED_KEYS:
+            if k in kwargs:
+                key += (k, kwargs[k])
+        candidates = self._index.get(key, []) if key else self._macros
+        conditions = {k: v for k, v in six.iteritems(kwargs) if k not in self.INDEXED_KEYS}
+        return [m for m in candidates if self.matches(m, conditions)]
+
+    def find_referencing(self, pattern):
+        """Finds macros whose expansion involves a construct matching a pattern.
+
+        A macro is found if any of its definitions matches the pattern or references
+        another found macro, so the result is a superset of macros that actually
+        involve the construct when expanded.
+
+        Args:
+            pattern: Compiled regular expression to be searched for in macro values.
+
+        Returns:
+            set: Names of the found macros.
+
+        """
+        found = set(m['name'] for m in self._macros if pattern.search(m['value']))
+        references = [(m['name'], set(MacroHelper.REFERENCE_RE.findall(m['value'])))
+                      for m in self._macros if m['name'] not in found]
+        changed = True
+        while changed:
+            changed = False
+            for name, names in references:
+                if name not in found and not names.isdisjoint(found):
+                    found.add(name)
+                    changed = True
+        return found
+
+
 class MacroHelper(object):
 
     """Class for working with RPM macros"""
@@ -51,12 +148,149 @@ class MacroHelper(object):
         'python3_sitelib',
     ]
 
-    @staticmethod
-    def expand(s, default=None):
+    # constructs whose expansion has side effects or is not repeatable
+    UNCACHEABLE_RE = re.compile(r'%\(|%\{?lua:|%\{?(define|global|undefine)\b')
+    # constructs whose expansion can change macro context
+    DEFINING_RE = re.compile(r'%\{?lua:|%\{?(define|global|undefine)\b')
+    # names of macros referenced in a string
+    REFERENCE_RE = re.compile(r'%\{?[!?]*(\w+)')
+
+    # serializes access to global macro context of librpm, which is not thread-safe,
+    # hold it to make a sequence of operations atomic, e.g. parsing a SPEC file
+    # and expanding macros it defined
+    lock = threading.RLock()
+
+    # results of expansions, keyed by generation of macro context and expanded string
+    _cache = {}
+    _generation = 0
+    _cache_hits = 0
+    _cache_misses = 0
+
+    # snapshot of macro context and generation it was taken in
+    _snapshot = None
+    _snapshot_generation = None
+    _snapshot_hits = 0
+    _snapshot_misses = 0
+
+    # names of macros whose expansion is uncacheable or can change macro context,
+    # found in a snapshot and kept up to date by add_macro(), None if not found yet
+    _uncacheable_macros = None
+    _defining_macros = None
+
+    @classmethod
+    def invalidate(cls):
+        """Marks cached expansions as outdated.
+
+        Needs to be called whenever global macro context is changed by other means
+        than add_macro() and del_macro(), e.g. by parsing a SPEC file.
+        """
+        cls._next_generation()
+        cls._uncacheable_macros = None
+        cls._defining_macros = None
+
+    @classmethod
+    def _next_generation(cls):
+        cls._generation += 1
+        cls._cache = {}
+
+    @classmethod
+    def add_macro(cls, name, value):
+        """Defines a macro in global macro context."""
+        with cls.lock:
+            rpm.addMacro(name, value)
+            cls._next_generation()
+            if cls._uncacheable_macros is None:
+                return
+            if (name not in cls._uncacheable_macros and cls._is_uncacheable(value) or
+                    name not in cls._defining_macros and cls._is_defining(value)):
+                # macros referencing this one have to be found again
+                cls._uncacheable_macros = None
+                cls._defining_macros = None
+
+    @classmethod
+    def del_macro(cls, name):
+        """Removes the topmost definition of a macro from global macro context."""
+        with cls.lock:
+            rpm.delMacro(name)
+            # names found in remaining definitions are still valid, others only make the check stricter
+            cls._next_generation()
+
+    @classmethod
+    def _find_side_effect_macros(cls):
+        if cls._uncacheable_macros is None:
+            snapshot = cls.dump()
+            cls._uncacheable_macros = snapshot.find_referencing(cls.UNCACHEABLE_RE)
+            cls._defining_macros = snapshot.find_referencing(cls.DEFINING_RE)
+
+    @classmethod
+    def _is_uncacheable(cls, s):
+        """Checks if expansion of a string has side effects or is not repeatable.
+
+        Besides the string itself, values of macros it references are taken into account,
+        e.g. a user macro defined as %(date) makes expansion of %{name} uncacheable as well.
+        """
+        cls._find_side_effect_macros()
+        return bool(cls.UNCACHEABLE_RE.search(s) or
+                    not cls._uncacheable_macros.isdisjoint(cls.REFERENCE_RE.findall(s)))
+
+    @classmethod
+    def _is_defining(cls, s):
+        """Checks if expansion of a string, or of macros it references, can change macro context."""
+        cls._find_side_effect_macros()
+        return bool(cls.DEFINING_RE.search(s) or
+                    not cls._defining_macros.isdisjoint(cls.REFERENCE_RE.findall(s)))
+
+    @classmethod
+    def get_cache_stats(cls):
+        """Gets statistics of the expansion cache.
+
+        Returns:
+            dict: Number of cache hits and misses and current generation of macro context.
+
+        """
+        return dict(hits=cls._cache_hits, misses=cls._cache_misses, generation=cls._generation)
+
+    @classmethod
+    def get_snapshot_stats(cls):
+        """Gets statistics of reuse of macro snapshots.
+
+        Returns:
+            dict: Number of reused and taken snapshots and current generation of macro context.
+
+        """
+        return dict(hits=cls._snapshot_hits, misses=cls._snapshot_misses, generation=cls._generation)
+
+    @classmethod
+    def expand(cls, s, default=None):
+        with cls.lock:
+            return cls._expand(s, default)
+
+    @classmethod
+    def _expand(cls, s, default):
+        key = (cls._generation, s)
         try:
-            return rpm.expandMacro(s)
-        except rpm.error:
-            return default
+            # only cacheable expansions are stored and the generation changes with macro context
+            result = cls._cache[key]
+        except KeyError:
+            if cls._is_uncacheable(s):
+                try:
+                    return rpm.expandMacro(s)
+                except rpm.error:
+                    return default
+                finally:
+                    if cls._is_defining(s):
+                        # the expansion could have changed macro context
+                        cls.invalidate()
+            cls._cache_misses += 1
+            try:
+                result = rpm.expandMacro(s)
+            except rpm.error:
+                result = None
+            # the key holds the generation the expansion was done in, stale results are never hit
+            cls._cache[key] = result
+        else:
+            cls._cache_hits += 1
+        return default if result is None else result
 
     @staticmethod
     def expand_macros(macros):
@@ -70,9 +304,7 @@ class MacroHelper(object):
             list: List of macros with expanded values.
 
         """
-        for macro in macros:
-            macro['value'] = MacroHelper.expand(macro['value'])
-        return macros
+        return [dict(m, value=MacroHelper.expand(m['value'])) for m in macros]
 
     @staticmethod
     def substitute_path_with_macros(path, macros):
@@ -92,14 +324,28 @@ class MacroHelper(object):
 
         return path
 
-    @staticmethod
-    def dump():
-        """Gets list of all defined macros.
+    @classmethod
+    def dump(cls):
+        """Gets all defined macros.
+
+        The snapshot is taken only once per generation of macro context.
 
         Returns:
-            list: All defined macros.
+            MacroSnapshot: All defined macros.
 
         """
+        with cls.lock:
+            generation = cls._generation
+            if cls._snapshot is None or cls._snapshot_generation != generation:
+                cls._snapshot = MacroSnapshot(cls._dump())
+                cls._snapshot_generation = generation
+                cls._snapshot_misses += 1
+            else:
+                cls._snapshot_hits += 1
+            return cls._snapshot
+
+    @staticmethod
+    def _dump():
         macro_re = re.compile(
             r'''
             ^\s*
@@ -159,9 +405,6 @@ class MacroHelper(object):
             list: Macros satisfying the conditions.
 
         """
-        def _test(macro):
-            return all(macro.get(k[4:]) >= v if k.startswith('min_') else
-                       macro.get(k[4:]) <= v if k.startswith('max_') else
-                       macro.get(k) == v for k, v in six.iteritems(kwargs))
-
-        return [m for m in macros if _test(m)]
+        if isinstance(macros, MacroSnapshot):
+            return macros.filter(**kwargs)
+        return [m for m in macros if MacroSnapshot.matches(m, kwargs)]
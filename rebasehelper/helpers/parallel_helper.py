@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+#
+# This tool helps you to rebase package to the latest version
+# Copyright (C) 2013-2014 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Authors: Petr Hracek <phracek@redhat.com>
+#          Tomas Hozza <thozza@redhat.com>
+
+import multiprocessing
+
+from multiprocessing.pool import ThreadPool
+
+from rebasehelper.results_store import results_store
+
+
+class ParallelHelper(object):
+
+    """Class for running independent tasks concurrently."""
+
+    # pool of worker processes, see start_process_pool()
+    _process_pool = None
+
+    @staticmethod
+    def run(func, args_list, workers=None):
+        """Runs a function with each of the given arguments in a pool of threads.
+
+        Args:
+            func (callable): Function to be run.
+            args_list (list): List of argument tuples, one for each call of the function.
+            workers (int): Maximal number of concurrently running calls, defaults to
+                the number of calls.
+
+        If writes to results store are deferred in the calling thread, writes made
+        by the calls are deferred to the same list.
+
+        Returns:
+            list: Results of the calls in the same order as args_list.
+
+        Raises:
+            Exception: The exception raised by the first (in order of args_list) failed call.
+                All calls are always finished before the exception is propagated.
+
+        """
+        if not args_list:
+            return []
+        writes = results_store.get_deferred_writes()
+
+        def call(*args):
+            if writes is None:
+                return func(*args)
+            with results_store.deferred_writes(writes):
+                return func(*args)
+
+        pool = ThreadPool(min(workers or len(args_list), len(args_list)))
+        try:
+            async_results = [pool.apply_async(call, args) for args in args_list]
+            return [r.get() for r in async_results]
+        finally:
+            pool.close()
+            pool.join()
+
+    @classmethod
+    def start_process_pool(cls, processes=None):
+        """Starts a pool of worker processes used by call_in_process().
+
+        The workers are forked right away, so the pool has to be started before
+        any threads are. A lock held by another thread at the time of fork would
+        stay locked in the worker forever.
+
+        Daemonic processes, e.g. workers of batch mode, are not allowed to have children,
+        so the pool is not started in them and callers of call_in_process() have to check
+        has_process_pool() and run the function in the calling thread instead.
+
+        Args:
+            processes (int): Number of worker processes, defaults to the number of CPUs.
+
+        """
+        if multiprocessing.current_process().daemon:
+            return
+        if cls._process_pool is None:
+            if hasattr(multiprocessing, 'get_context'):
+                context = multiprocessing.get_context('fork')
+            else:
+                context = multiprocessing
+            cls._process_pool = context.Pool(processes)
+
+    @classmethod
+    def stop_process_pool(cls):
+        """Stops the pool of worker processes, terminating calls that are still running."""
+        pool, cls._process_pool = cls._process_pool, None
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    @classmethod
+    def has_process_pool(cls):
+        """Checks whether the pool of worker processes is running."""
+        return cls._process_pool is not None
+
+    @classmethod
+    def call_in_process(cls, func, *args, **kwargs):
+        """Calls a function in a worker process of the pool started by start_process_pool().
+
+        Changes of the state made by the function, e.g. to global macro context of librpm,
+        don't affect the current process. Calls from multiple threads run concurrently,
+        up to the number of worker processes.
+
+        Args:
+            func (callable): Function to be called, it, its arguments and its result must be picklable.
+            *args: Arguments of the function.
+            timeout (float): Maximal time in seconds to wait for the result, unlimited if None.
+
+        Returns:
+            Result of the function.
+
+        Raises:
+            Exception: The exception raised by the function.
+            RuntimeError: If the pool is not running or the function didn't return in time,
+                e.g. because the worker process terminated.
+
+        """
+        timeout = kwargs.pop('timeout', None)
+        pool = cls._process_pool
+        if pool is None:
+            raise RuntimeError('Process pool is not running')
+        try:
+            return pool.apply_async(func, args).get(timeout)
+        except multiprocessing.TimeoutError:
+            raise RuntimeError('Call in worker process did not finish in {} seconds'.format(timeout))
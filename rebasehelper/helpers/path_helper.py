@@ -120,6 +120,22 @@ class PathHelper(object):
         """
         return tempfile.mkdtemp(prefix='rebase-helper-')
 
+    @staticmethod
+    def get_cache_path(name):
+        """Gets path to a file or directory in the user cache directory.
+
+        The environment is not modified, ~/.cache is used if XDG_CACHE_HOME is not set.
+
+        Args:
+            name (str): Name of the file or directory.
+
+        Returns:
+            str: Path to the file or directory.
+
+        """
+        cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        return os.path.join(cache_home, name)
+
     @staticmethod
     def file_available(filename):
         """Checks if the given file exists.
@@ -135,3 +151,20 @@ class PathHelper(object):
             return True
         else:
             return False
+
+    @staticmethod
+    def find_executable(name):
+        """Finds an executable in directories listed in PATH.
+
+        Args:
+            name (str): Name of the executable.
+
+        Returns:
+            str: Path to the executable or None if it was not found.
+
+        """
+        for directory in os.environ.get('PATH', os.defpath).split(os.pathsep):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path) and os.access(path, os.X_OK):
+                return path
+        return None
@@ -20,14 +20,17 @@
 # Authors: Petr Hracek <phracek@redhat.com>
 #          Tomas Hozza <thozza@redhat.com>
 
+import errno
 import os
 import subprocess
 import tempfile
+import time
 
 import six
 
 from rebasehelper.constants import DEFENC
 from rebasehelper.logger import logger
+from rebasehelper.results_store import results_store
 
 
 class ProcessHelper(object):
@@ -175,6 +178,7 @@ class ProcessHelper(object):
         else:
             stdout = None
 
+        start = time.time()
         with open(os.devnull, 'wb') as devnull:
             sp = subprocess.Popen(cmd,
                                   stdin=in_file,
@@ -208,8 +212,37 @@ class ProcessHelper(object):
         if close_in_file:
             in_file.close()
 
-        sp.wait()
+        ProcessHelper._wait(sp, cmd, start)
 
         logger.debug("subprocess exited with return code %s", six.text_type(sp.returncode))
 
         return sp.returncode
+
+    @staticmethod
+    def _wait(sp, cmd, start):
+        """Waits for a subprocess to finish and records its duration and resource usage.
+
+        Args:
+            sp (subprocess.Popen): Running subprocess.
+            cmd (iterable, str): Command the subprocess was started with.
+            start (float): Time when the subprocess was started in seconds since epoch.
+
+        """
+        # reap the subprocess ourselves to get resource usage of this particular child,
+        # resource.getrusage(RUSAGE_CHILDREN) would mix concurrently running ones
+        while True:
+            try:
+                _, status, usage = os.wait4(sp.pid, 0)
+                break
+            except OSError as e:
+                # Python 2 doesn't retry system calls interrupted by a signal
+                if e.errno != errno.EINTR:
+                    raise
+        sp.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+        results_store.add_timing('processes', dict(
+            command=cmd if isinstance(cmd, six.string_types) else ' '.join(cmd),
+            returncode=sp.returncode,
+            start=start,
+            wall_time=time.time() - start,
+            cpu_time=usage.ru_utime + usage.ru_stime,
+            max_rss=usage.ru_maxrss * 1024))
@@ -132,9 +132,9 @@ class RpmHelper(object):
         """Gets list of all known architectures"""
         arches = ['aarch64', 'noarch', 'ppc', 'riscv64', 's390', 's390x', 'src', 'x86_64']
         macros = MacroHelper.dump()
-        macros = [m for m in macros if m['name'] in ('ix86', 'arm', 'mips', 'sparc', 'alpha', 'power64')]
-        for m in macros:
-            arches.extend(MacroHelper.expand(m['value'], '').split())
+        for name in ('ix86', 'arm', 'mips', 'sparc', 'alpha', 'power64'):
+            for m in MacroHelper.filter(macros, name=name):
+                arches.extend(MacroHelper.expand(m['value'], '').split())
         return arches
 
     @classmethod
@@ -172,8 +172,12 @@ class RpmHelper(object):
                 # remove BuildArch to workaround rpm bug
                 tmp.write(b''.join([l for l in orig.readlines() if not l.startswith(b'BuildArch')]))
                 tmp.flush()
-                with ConsoleHelper.Capturer(stderr=True) as capturer:
-                    result = rpm.spec(tmp.name, flags) if flags is not None else rpm.spec(tmp.name)
+                with MacroHelper.lock, ConsoleHelper.Capturer(stderr=True) as capturer:
+                    try:
+                        result = rpm.spec(tmp.name, flags) if flags is not None else rpm.spec(tmp.name)
+                    finally:
+                        # parsing defines macros in global context
+                        MacroHelper.invalidate()
                 for line in capturer.stderr.split('\n'):
                     if line:
                         logger.verbose('rpm: %s', line)
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+#
+# This tool helps you to rebase package to the latest version
+# Copyright (C) 2013-2014 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Authors: Petr Hracek <phracek@redhat.com>
+#          Tomas Hozza <thozza@redhat.com>
+
+import errno
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+import six
+
+from rebasehelper.constants import SOURCE_CACHE_DIR
+from rebasehelper.logger import logger
+from rebasehelper.helpers.path_helper import PathHelper
+
+
+class SourceCacheHelper(object):
+
+    """Class for caching extracted source archives.
+
+    Each cache entry is a directory named by a content hash of an archive, containing
+    the extracted tree and metadata. Cached trees are materialized by reflinking their
+    files if the filesystem supports it, so that no data are copied, and by copying them
+    otherwise. Hardlinking cached files instead of copying them can be enabled, but
+    in-place modifications of hardlinked files modify the cache as well. Such modifications
+    are detected by comparing sizes and modification times of files of entries that have
+    ever been hardlinked and damaged entries are removed. Entries are evicted in least
+    recently used order when the total size of the cache exceeds the limit.
+    """
+
+    METADATA_FILE = 'metadata.json'
+    TREE_DIR = 'tree'
+
+    _hits = 0
+    _misses = 0
+    _lock = threading.Lock()
+
+    # support of reflinks, keyed by source and destination devices
+    _reflinks = {}
+
+    @staticmethod
+    def get_cache_dir():
+        """Gets path to the directory the cache is stored in."""
+        return PathHelper.get_cache_path(SOURCE_CACHE_DIR)
+
+    @staticmethod
+    def get_key(archive_path):
+        """Computes a cache key of an archive.
+
+        Args:
+            archive_path (str): Path to the archive.
+
+        Returns:
+            str: Cache key.
+
+        """
+        h = hashlib.sha256()
+        with open(archive_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    @staticmethod
+    def _scan(tree_dir):
+        """Computes size, number of files and fingerprint of a tree."""
+        h = hashlib.sha256()
+        size = 0
+        files = 0
+        for root, dirs, filenames in os.walk(tree_dir):
+            dirs.sort()
+            for name in sorted(filenames):
+                path = os.path.join(root, name)
+                st = os.lstat(path)
+                h.update('{}\0{}\0{}\0{}\n'.format(os.path.relpath(path, tree_dir), st.st_mode, st.st_size,
+                                                   st.st_mtime).encode('utf-8'))
+                size += st.st_size
+                files += 1
+        return size, files, h.hexdigest()
+
+    @classmethod
+    def _read_metadata(cls, entry_dir):
+        try:
+            with open(os.path.join(entry_dir, cls.METADATA_FILE), 'r') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    @classmethod
+    def _write_metadata(cls, entry_dir, metadata):
+        # write to a temporary file first so that incomplete metadata are never visible
+        fd, tmp = tempfile.mkstemp(prefix='.tmp-', dir=entry_dir)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(metadata, f)
+        os.rename(tmp, os.path.join(entry_dir, cls.METADATA_FILE))
+
+    @staticmethod
+    def _cp(*args):
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.call(['cp'] + list(args), stdout=devnull, stderr=devnull) == 0
+
+    @classmethod
+    def _reflink(cls, entry_dir, destination):
+        devices = (os.stat(entry_dir).st_dev, os.stat(destination).st_dev)
+        if devices not in cls._reflinks:
+            # try to clone a single file first, cloning whole tree fails file by file
+            probe = os.path.join(destination, '.reflink-probe')
+            cls._reflinks[devices] = bool(PathHelper.find_executable('cp')) and \
+                cls._cp('--reflink=always', os.path.join(entry_dir, cls.METADATA_FILE), probe)
+            if os.path.lexists(probe):
+                os.remove(probe)
+        if not cls._reflinks[devices]:
+            return False
+        # GNU cp is able to clone whole trees, preserving all attributes
+        return cls._cp('-a', '--reflink=always', os.path.join(entry_dir, cls.TREE_DIR, '.'), destination)
+
+    @staticmethod
+    def _materialize(source, destination, hardlink=False):
+        dirs = []
+        for root, dirnames, filenames in os.walk(source):
+            target = os.path.join(destination, os.path.relpath(root, source))
+            if not os.path.isdir(target):
+                os.makedirs(target)
+            dirs.append((root, target))
+            for name in filenames + [d for d in dirnames if os.path.islink(os.path.join(root, d))]:
+                src = os.path.join(root, name)
+                dst = os.path.join(target, name)
+                if os.path.lexists(dst):
+                    os.remove(dst)
+                if os.path.islink(src):
+                    os.symlink(os.readlink(src), dst)
+                    continue
+                if hardlink:
+                    try:
+                        os.link(src, dst)
+                        continue
+                    except OSError as e:
+                        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                            raise
+                shutil.copy2(src, dst)
+        # creating entries changes modification times of directories
+        for src, dst in reversed(dirs):
+            shutil.copystat(src, dst)
+
+    @classmethod
+    def lookup(cls, key, destination, hardlink=False):
+        """Materializes a cached tree.
+
+        Args:
+            key (str): Cache key of the archive.
+            destination (str): Path to directory the cached tree should be materialized in.
+            hardlink (bool): Whether to hardlink cached files if they can't be reflinked,
+                instead of copying them.
+
+        Returns:
+            bool: Whether the tree was materialized, False if the archive is not cached.
+
+        """
+        entry_dir = os.path.join(cls.get_cache_dir(), key)
+        metadata = cls._read_metadata(entry_dir)
+        tree_dir = os.path.join(entry_dir, cls.TREE_DIR)
+        # only hardlinked files can be modified in place, scanning the tree is not needed otherwise
+        if metadata is not None and metadata.get('hardlinked') and cls._scan(tree_dir)[2] != metadata['fingerprint']:
+            logger.warning('Cached sources %s are damaged, removing them', key)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            metadata = None
+        if metadata is None:
+            with cls._lock:
+                cls._misses += 1
+            return False
+        if hardlink and not metadata.get('hardlinked'):
+            metadata['hardlinked'] = True
+            cls._write_metadata(entry_dir, metadata)
+        if not os.path.isdir(destination):
+            os.makedirs(destination)
+        if not cls._reflink(entry_dir, destination):
+            cls._materialize(tree_dir, destination, hardlink)
+        # update last access time
+        os.utime(os.path.join(entry_dir, cls.METADATA_FILE), None)
+        with cls._lock:
+            cls._hits += 1
+        logger.verbose("Materialized sources cached in '%s' in '%s'", entry_dir, destination)
+        return True
+
+    @classmethod
+    def store(cls, key, name, extract):
+        """Extracts an archive into the cache.
+
+        Args:
+            key (str): Cache key of the archive.
+            name (str): Name of the archive.
+            extract (callable): Function extracting the archive into the directory
+                passed as its only argument.
+
+        Returns:
+            bool: Whether the archive is now cached, False if the cache could not be written to.
+
+        """
+        cache_dir = cls.get_cache_dir()
+        entry_dir = os.path.join(cache_dir, key)
+        if os.path.isdir(entry_dir):
+            return True
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            # populate a temporary directory first so that incomplete entries are never visible
+            tmp_dir = tempfile.mkdtemp(prefix='.tmp-', dir=cache_dir)
+        except (IOError, OSError) as e:
+            logger.warning('Failed to store sources in cache: %s', six.text_type(e))
+            return False
+        try:
+            tree_dir = os.path.join(tmp_dir, cls.TREE_DIR)
+            extract(tree_dir)
+            size, files, fingerprint = cls._scan(tree_dir)
+            metadata = dict(name=name, size=size, files=files, fingerprint=fingerprint, created=time.time())
+            with open(os.path.join(tmp_dir, cls.METADATA_FILE), 'w') as f:
+                json.dump(metadata, f)
+            os.rename(tmp_dir, entry_dir)
+        except (IOError, OSError) as e:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            # the same archive could have been stored concurrently
+            if os.path.isdir(entry_dir):
+                return True
+            logger.warning('Failed to store sources in cache: %s', six.text_type(e))
+            return False
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        logger.verbose("Stored sources in cache '%s'", entry_dir)
+        return True
+
+    @classmethod
+    def get_entries(cls):
+        """Gets information about cached archives.
+
+        Returns:
+            list: Dictionaries describing the cached archives, most recently used first.
+
+        """
+        cache_dir = cls.get_cache_dir()
+        if not os.path.isdir(cache_dir):
+            return []
+        entries = []
+        for key in os.listdir(cache_dir):
+            entry_dir = os.path.join(cache_dir, key)
+            metadata = cls._read_metadata(entry_dir)
+            if metadata is None:
+                continue
+            metadata.update(key=key, path=entry_dir,
+                            last_used=os.path.getmtime(os.path.join(entry_dir, cls.METADATA_FILE)))
+            entries.append(metadata)
+        return sorted(entries, key=lambda e: e['last_used'], reverse=True)
+
+    @classmethod
+    def evict(cls, max_size):
+        """Removes least recently used archives until the size of the cache fits the limit.
+
+        Args:
+            max_size (int): Maximal size of the cache in bytes.
+
+        Returns:
+            int: Number of removed archives.
+
+        """
+        entries = cls.get_entries()
+        total = sum(e['size'] for e in entries)
+        removed = 0
+        while entries and total > max_size:
+            entry = entries.pop()
+            logger.verbose("Evicting cached sources '%s'", entry['path'])
+            shutil.rmtree(entry['path'], ignore_errors=True)
+            total -= entry['size']
+            removed += 1
+        return removed
+
+    @classmethod
+    def prune(cls):
+        """Removes all cached archives.
+
+        Returns:
+            int: Number of removed archives.
+
+        """
+        return cls.evict(0)
+
+    @classmethod
+    def get_stats(cls):
+        """Gets statistics of the cache.
+
+        Returns:
+            dict: Number of cache hits and misses in this run.
+
+        """
+        return dict(hits=cls._hits, misses=cls._misses)
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+#
+# This tool helps you to rebase package to the latest version
+# Copyright (C) 2013-2014 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Authors: Petr Hracek <phracek@redhat.com>
+#          Tomas Hozza <thozza@redhat.com>
+
+import hashlib
+import json
+import os
+import tempfile
+
+from rebasehelper.constants import SPEC_CACHE_DIR
+from rebasehelper.helpers.path_helper import PathHelper
+
+
+class SpecCacheHelper(object):
+
+    """Class for caching data obtained by parsing SPEC files.
+
+    An entry holds the data and macros defined after parsing the SPEC file.
+    It is keyed by content of the SPEC file and a context, consisting of version
+    of RPM, location of sources and macros coming from configuration and command
+    line, see SpecFile._get_cache_context(). The context doesn't depend on macros
+    defined by previously parsed SPEC files, so entries can be shared by subsequent
+    runs. When an entry is used, the cached macros are defined in global macro context,
+    as if the SPEC file was parsed. Parsing also depends on files referenced by the SPEC file,
+    such as sources, so an entry holds their states as well and it is used only if they
+    haven't changed, see SpecFile._get_file_states().
+
+    Entries are kept in memory and, if enabled, also stored on disk so that they
+    can be shared by subsequent runs.
+    """
+
+    # version of the format of cached data, part of the key
+    DATA_VERSION = 4
+
+    persistent = False
+
+    _entries = {}
+    _hits = 0
+    _misses = 0
+
+    @staticmethod
+    def get_cache_dir():
+        """Gets path to the directory the on-disk cache is stored in."""
+        return PathHelper.get_cache_path(SPEC_CACHE_DIR)
+
+    @classmethod
+    def get_key(cls, content, context):
+        """Computes a cache key.
+
+        Args:
+            content (bytes): Content of the SPEC file.
+            context (str): Everything else the result of parsing depends on.
+
+        Returns:
+            str: Cache key.
+
+        """
+        h = hashlib.sha256()
+        h.update('{}\0'.format(cls.DATA_VERSION).encode('utf-8'))
+        h.update(content)
+        h.update(b'\0')
+        h.update(context.encode('utf-8'))
+        return h.hexdigest()
+
+    @classmethod
+    def lookup(cls, key, validate=None):
+        """Gets cached data.
+
+        Args:
+            key (str): Cache key.
+            validate (callable): Function checking whether cached data are still valid,
+                invalid data are treated as if there was no such entry.
+
+        Returns:
+            dict: Cached data or None if there is no valid entry.
+
+        """
+        data = cls._entries.get(key)
+        if data is None and cls.persistent:
+            try:
+                with open(os.path.join(cls.get_cache_dir(), key + '.json'), 'r') as f:
+                    data = json.load(f)
+            except (IOError, OSError, ValueError):
+                data = None
+            if data is not None:
+                cls._entries[key] = data
+        if data is not None and validate is not None and not validate(data):
+            data = None
+        if data is None:
+            cls._misses += 1
+        else:
+            cls._hits += 1
+        return data
+
+    @classmethod
+    def store(cls, key, data):
+        """Stores data in the cache.
+
+        Args:
+            key (str): Cache key.
+            data (dict): Data to be cached, must be serializable to JSON.
+
+        """
+        cls._entries[key] = data
+        if not cls.persistent:
+            return
+        cache_dir = cls.get_cache_dir()
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            # write to a temporary file first so that incomplete entries are never visible
+            fd, tmp = tempfile.mkstemp(prefix='.tmp-', dir=cache_dir)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.rename(tmp, os.path.join(cache_dir, key + '.json'))
+        except (IOError, OSError):
+            # caching is only an optimization
+            pass
+
+    @classmethod
+    def get_stats(cls):
+        """Gets statistics of the cache.
+
+        Returns:
+            dict: Number of cache hits and misses.
+
+        """
+        return dict(hits=cls._hits, misses=cls._misses)
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+#
+# This tool helps you to rebase package to the latest version
+# Copyright (C) 2013-2014 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Authors: Petr Hracek <phracek@redhat.com>
+#          Tomas Hozza <thozza@redhat.com>
+
+import contextlib
+import time
+
+from rebasehelper.results_store import results_store
+
+
+class TimingHelper(object):
+
+    """Class for measuring how long rebase-helper actions take."""
+
+    @staticmethod
+    @contextlib.contextmanager
+    def measure(category, name, **kwargs):
+        """Measures wall time of a block of code and records it in results_store.
+
+        The record is stored even if the block raises an exception, in which case
+        it is marked as failed.
+
+        Args:
+            category (str): Category of the action, e.g. 'stages' or 'checkers'.
+            name (str): Name of the action.
+            **kwargs: Additional data to be recorded.
+
+        Yields:
+            dict: The record, the block can add further data to it.
+
+        """
+        record = dict(name=name, start=time.time(), **kwargs)
+        try:
+            yield record
+        except BaseException:
+            record['failed'] = True
+            raise
+        finally:
+            record['wall_time'] = time.time() - record['start']
+            results_store.add_timing(category, record)
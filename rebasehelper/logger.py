@@ -165,6 +165,11 @@ class ColorizingStreamHandler(logging.StreamHandler):
         else:
             self.terminal_background = background
 
+    def handle(self, record):
+        # don't let output of other threads be captured, see ConsoleHelper.Capturer
+        with ConsoleHelper.lock:
+            return super(ColorizingStreamHandler, self).handle(record)
+
     def emit(self, record):
         try:
             message = self.format(record)
@@ -93,40 +93,87 @@ OPTIONS = [
         "help": "continue previously interrupted rebase",
     },
     # tool selection
+    # available choices and defaults of plugin options are callables, so that plugins
+    # are imported only when the values are actually needed, help shows defaults
+    # declared by plugins instead
     {
         "name": ["--buildtool"],
         "choices": build_helper.get_all_tools(),
-        "available_choices": build_helper.get_supported_tools(),
-        "default": build_helper.get_default_tool(),
+        "available_choices": build_helper.get_supported_tools,
+        "default": build_helper.get_default_tool,
+        "help_default": build_helper.get_declared_default_tool,
         "help": "build tool to use, defaults to %(default)s",
     },
     {
         "name": ["--srpm-buildtool"],
         "choices": srpm_build_helper.get_all_tools(),
-        "available_choices": srpm_build_helper.get_supported_tools(),
-        "default": srpm_build_helper.get_default_tool(),
+        "available_choices": srpm_build_helper.get_supported_tools,
+        "default": srpm_build_helper.get_default_tool,
+        "help_default": srpm_build_helper.get_declared_default_tool,
         "help": "SRPM build tool to use, defaults to %(default)s",
     },
     {
         "name": ["--pkgcomparetool"],
         "choices": checkers_runner.get_all_tools(),
-        "available_choices": checkers_runner.get_supported_tools(),
-        "default": checkers_runner.get_default_tools(),
+        "available_choices": checkers_runner.get_supported_tools,
+        "default": checkers_runner.get_default_tools,
+        "help_default": checkers_runner.get_declared_default_tools,
         "type": lambda s: s.split(','),
         "help": "set of tools to use for package comparison, defaults to "
                 "%(default)s if available",
     },
+    {
+        "name": ["--stage-workers"],
+        "default": None,
+        "type": int,
+        "metavar": "WORKERS",
+        "help": "maximum number of independent rebase stages running at the same time, "
+                "defaults to running them sequentially in interactive mode and all at once otherwise",
+    },
+    {
+        "name": ["--checker-workers"],
+        "default": None,
+        "type": int,
+        "metavar": "WORKERS",
+        "help": "maximum number of package comparison tools running at the same time, "
+                "defaults to running all of them at once",
+    },
+    {
+        "name": ["--checker-jobs"],
+        "default": None,
+        "type": int,
+        "metavar": "JOBS",
+        "help": "maximum number of subpackages compared at the same time by a single "
+                "package comparison tool, defaults to number of CPUs",
+    },
+    {
+        "name": ["--extraction-workers"],
+        "default": None,
+        "type": int,
+        "metavar": "WORKERS",
+        "help": "maximum number of source archives extracted at the same time, each in a separate "
+                "process, defaults to extracting all of them at once, SPEC files are parsed "
+                "in the same processes unless set to 1",
+    },
+    {
+        "name": ["--no-streaming-extraction"],
+        "default": False,
+        "switch": True,
+        "help": "extract downloaded source archives after the download finishes instead of "
+                "while they are being downloaded",
+    },
     {
         "name": ["--outputtool"],
         "choices": output_tools_runner.get_all_tools(),
-        "available_choices": output_tools_runner.get_supported_tools(),
-        "default": output_tools_runner.get_default_tool(),
+        "available_choices": output_tools_runner.get_supported_tools,
+        "default": output_tools_runner.get_default_tool,
+        "help_default": output_tools_runner.get_declared_default_tool,
         "help": "tool to use for formatting rebase output, defaults to %(default)s",
     },
     {
         "name": ["--versioneer"],
         "choices": versioneers_runner.get_all_versioneers(),
-        "available_choices": versioneers_runner.get_available_versioneers(),
+        "available_choices": versioneers_runner.get_available_versioneers,
         "default": None,
         "help": "tool to use for determining latest upstream version",
     },
@@ -134,7 +181,7 @@ OPTIONS = [
     {
         "name": ["--versioneer-blacklist"],
         "choices": versioneers_runner.get_all_versioneers(),
-        "available_choices": versioneers_runner.get_available_versioneers(),
+        "available_choices": versioneers_runner.get_available_versioneers,
         "default": [],
         "type": lambda s: s.split(","),
         "help": "prevent specified versioneers from being run",
@@ -142,7 +189,7 @@ OPTIONS = [
     {
         "name": ["--spec-hook-blacklist"],
         "choices": spec_hooks_runner.get_all_spec_hooks(),
-        "available_choices": spec_hooks_runner.get_available_spec_hooks(),
+        "available_choices": spec_hooks_runner.get_available_spec_hooks,
         "default": [],
         "type": lambda s: s.split(","),
         "help": "prevent specified spec hooks from being run",
@@ -150,7 +197,7 @@ OPTIONS = [
     {
         "name": ["--build-log-hook-blacklist"],
         "choices": build_log_hook_runner.get_all_tools(),
-        "available_choices": build_log_hook_runner.get_supported_tools(),
+        "available_choices": build_log_hook_runner.get_supported_tools,
         "default": [],
         "type": lambda s: s.split(","),
         "help": "prevent specified build log hooks from being run"
@@ -254,6 +301,101 @@ OPTIONS = [
         "help": "enable arbitrary local srpm builder option(s), enclose %(metavar)s in quotes "
                 "to pass more than one",
     },
+    {
+        "name": ["--serial-srpm-builds"],
+        "default": False,
+        "switch": True,
+        "help": "build old and new SRPMs one after another even if the SRPM build tool "
+                "is able to build them concurrently",
+    },
+    {
+        "name": ["--no-build-cache"],
+        "default": False,
+        "switch": True,
+        "help": "do not use cached builds of the old version and do not store them in cache",
+    },
+    {
+        "name": ["--build-cache-size"],
+        "default": 4096,
+        "type": int,
+        "metavar": "MIB",
+        "help": "maximal size of the build cache in MiB, least recently used builds are removed "
+                "when exceeded, defaults to %(default)s",
+    },
+    {
+        "name": ["--build-cache-list"],
+        "default": False,
+        "switch": True,
+        "help": "list cached builds and exit",
+    },
+    {
+        "name": ["--build-cache-prune"],
+        "default": False,
+        "switch": True,
+        "help": "remove all cached builds and exit",
+    },
+    {
+        "name": ["--no-source-cache"],
+        "default": False,
+        "switch": True,
+        "help": "do not use cached extracted source archives and do not store them in cache",
+    },
+    {
+        "name": ["--source-cache-size"],
+        "default": 4096,
+        "type": int,
+        "metavar": "MIB",
+        "help": "maximal size of the cache of extracted source archives in MiB, least recently used "
+                "archives are removed when exceeded, defaults to %(default)s",
+    },
+    {
+        "name": ["--source-cache-hardlinks"],
+        "default": False,
+        "switch": True,
+        "help": "hardlink cached extracted source archives instead of copying them if the filesystem "
+                "doesn't support reflinks, modifying the materialized files in place damages the cache",
+    },
+    {
+        "name": ["--source-cache-stats"],
+        "default": False,
+        "switch": True,
+        "help": "show statistics of the cache of extracted source archives and exit",
+    },
+    {
+        "name": ["--source-cache-prune"],
+        "default": False,
+        "switch": True,
+        "help": "remove all cached extracted source archives and exit",
+    },
+    {
+        "name": ["--persistent-spec-cache"],
+        "default": False,
+        "switch": True,
+        "help": "store data obtained by parsing SPEC files also in an on-disk cache, so that they can be reused "
+                "by subsequent runs, e.g. in batch mode",
+    },
+    {
+        "name": ["--parallel-builds"],
+        "default": False,
+        "switch": True,
+        "help": "build old and new binary packages concurrently, each of them in an isolated "
+                "environment, if the build tool supports it",
+    },
+    {
+        "name": ["--build-cpu-split"],
+        "default": None,
+        "metavar": "OLD_CPUS,NEW_CPUS",
+        "type": lambda s: s.split(','),
+        "help": "number of CPUs to use for old and new binary package build when building "
+                "them concurrently, defaults to half of available CPUs for each",
+    },
+    {
+        "name": ["--incremental-rebuilds"],
+        "default": False,
+        "switch": True,
+        "help": "when only %%files sections of the SPEC file were changed after a failed build, "
+                "rerun only %%install and packaging stages of the new version build",
+    },
     # misc
     {
         "name": ["--changelog-entry"],
@@ -28,6 +28,7 @@ from rebasehelper.logger import logger, logger_output
 from rebasehelper.results_store import results_store
 from rebasehelper.checker import checkers_runner
 from rebasehelper.constants import RESULTS_DIR, REPORT
+from rebasehelper.helpers.timing_helper import TimingHelper
 
 
 class BaseOutputTool(Plugin):
@@ -39,6 +40,10 @@ class BaseOutputTool(Plugin):
     DEFAULT = False
     EXTENSION = ''
 
+    SHORT_CIRCUITED_MESSAGE = ("The new packages were built using --short-circuit, they require "
+                               "rpmlib(ShortCircuited) and can't be installed, checkers can report "
+                               "this dependency as a difference")
+
     @classmethod
     def get_report_path(cls, app):
         return os.path.join(app.results_dir, REPORT + '.' + cls.EXTENSION)
@@ -93,12 +98,14 @@ class BaseOutputTool(Plugin):
     def print_important_checkers_output(cls):
         """Iterates over all checkers output to highlight important checkers warning"""
         checkers_results = results_store.get_checkers()
-        for check_tool in six.itervalues(checkers_runner.checkers):
-            for check, data in sorted(six.iteritems(checkers_results)):
-                if check == check_tool.name:
-                    out = check_tool.get_important_changes(data)
-                    if out:
-                        logger_output.warning('\n'.join(out))
+        # load only checkers that produced results
+        for name in checkers_runner.checkers:
+            if name in checkers_results and checkers_runner.checkers[name]:
+                out = checkers_runner.checkers[name].get_important_changes(checkers_results[name])
+                if out:
+                    logger_output.warning('\n'.join(out))
+        if any(r.get('incremental') for r in six.itervalues(checkers_results) if r):
+            logger_output.warning(cls.SHORT_CIRCUITED_MESSAGE)
 
     @classmethod
     def print_report_file_path(cls):
@@ -152,10 +159,14 @@ class OutputToolRunner(object):
         return list(self.output_tools)
 
     def get_supported_tools(self):
-        return [k for k, v in six.iteritems(self.output_tools) if v]
+        return self.output_tools.get_available()
 
     def get_default_tool(self):
-        default = [k for k, v in six.iteritems(self.output_tools) if v and v.DEFAULT]
+        default = self.output_tools.get_default()
+        return default[0] if default else None
+
+    def get_declared_default_tool(self):
+        default = self.output_tools.get_declared_default()
         return default[0] if default else None
 
     def run_output_tool(self, tool, logs=None, app=None):
@@ -168,8 +179,9 @@ class OutputToolRunner(object):
         """
         output_tool = self.output_tools[tool]
         logger.info("Running '%s' output tool.", tool)
-        output_tool.run(logs, app=app)
-        output_tool.print_cli_summary(app)
+        with TimingHelper.measure('output_tools', tool):
+            output_tool.run(logs, app=app)
+            output_tool.print_cli_summary(app)
 
 
 # Global instance of OutputToolRunner. It is enough to load it once per application run.
@@ -15,6 +15,9 @@ class TextOutputTool(BaseOutputTool):
     DEFAULT = True
     EXTENSION = 'txt'
 
+    # number of the longest running commands to print
+    SLOWEST_PROCESSES = 5
+
     @classmethod
     def print_success_message(cls):
         """Print result message"""
@@ -80,6 +83,8 @@ class TextOutputTool(BaseOutputTool):
 
             if type_rpm == 'srpm':
                 message = "\nSource packages and logs are in directory %s:"
+            elif rpms.get('incremental'):
+                message = "\nIncrementally rebuilt binary packages and logs are in directory %s:"
             else:
                 message = "\nBinary packages and logs are in directory %s:"
 
@@ -99,6 +104,8 @@ class TextOutputTool(BaseOutputTool):
                     logger_report.info(" - %s", os.path.basename(pkg))
                 # Print RPMs logs
                 cls.print_build_logs(rpms, dirname)
+                if rpms.get('incremental'):
+                    logger_report.info(cls.SHORT_CIRCUITED_MESSAGE)
 
     @classmethod
     def print_build_logs(cls, rpms, dirpath):
@@ -140,13 +147,66 @@ class TextOutputTool(BaseOutputTool):
             if pkg_results:
                 cls.print_rpms_and_logs(pkg_results, pkg_version.capitalize())
 
+        if results.get_timings():
+            cls.print_timings(results.get_timings())
+
+    @classmethod
+    def print_timings(cls, timings):
+        """Prints a summary of how long individual actions took."""
+        def format_size(size):
+            return '{:.2f} MiB'.format(size / 1024.0 / 1024.0)
+
+        def format_record(record):
+            name = record['name']
+            if 'version' in record:
+                name = '{} {}'.format(record['version'], name)
+            flags = [f for f in ('cached', 'failed') if record.get(f)]
+            return ' - {0:40} {1:10.2f} s{2}'.format(name, record['wall_time'],
+                                                     ' ({})'.format(', '.join(flags)) if flags else '')
+
+        cls.print_message_and_separator("\nTimings")
+        sections = [
+            ('stages', 'Stages'),
+            ('builds', 'Builds'),
+            ('extractions', 'Extracted archives'),
+            ('checkers', 'Checkers'),
+            ('hooks', 'Hooks'),
+            ('output_tools', 'Output tools'),
+        ]
+        for category, title in sections:
+            if timings.get(category):
+                logger_report.info('\n%s:', title)
+                logger_report.info('\n'.join(format_record(r) for r in timings[category]))
+
+        if timings.get('downloads'):
+            logger_report.info('\nDownloads:')
+            for download in timings['downloads']:
+                logger_report.info(' - %s: %s in %.2f s (%s/s)', os.path.basename(download['url']),
+                                   format_size(download['bytes']), download['wall_time'],
+                                   format_size(download['throughput'] or 0))
+
+        if timings.get('caches'):
+            logger_report.info('\nCaches:')
+            for cache in timings['caches']:
+                logger_report.info(' - %s: %d hits, %d misses', cache['name'], cache['hits'], cache['misses'])
+
+        if timings.get('processes'):
+            processes = sorted(timings['processes'], key=lambda p: p['wall_time'], reverse=True)
+            logger_report.info('\nSlowest commands (%d in total, %.2f s of CPU time):', len(processes),
+                               sum(p['cpu_time'] for p in processes))
+            for process in processes[:cls.SLOWEST_PROCESSES]:
+                logger_report.info(' - %.2f s, CPU %.2f s, peak RSS %s: %s', process['wall_time'],
+                                   process['cpu_time'], format_size(process['max_rss']), process['command'][:80])
+
     @classmethod
     def print_checkers_text_output(cls, checkers_results):
         """Function prints text output for every checker"""
-        for check_tool in six.itervalues(checkers_runner.checkers):
-            for check, data in sorted(six.iteritems(checkers_results)):
-                if check == check_tool.name:
-                    logger_report.info('\n'.join(check_tool.format(data)))
+        # load only checkers that produced results
+        for name in checkers_runner.checkers:
+            if name in checkers_results and checkers_runner.checkers[name]:
+                logger_report.info('\n'.join(checkers_runner.checkers[name].format(checkers_results[name])))
+                if checkers_results[name] and checkers_results[name].get('incremental'):
+                    logger_report.info(cls.SHORT_CIRCUITED_MESSAGE)
 
     @classmethod
     def print_build_log_hooks_result(cls, build_log_hooks_result):
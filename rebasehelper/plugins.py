@@ -20,31 +20,354 @@
 # Authors: Petr Hracek <phracek@redhat.com>
 #          Tomas Hozza <thozza@redhat.com>
 
-import pkg_resources
+import ast
+import collections
+import hashlib
+import importlib
+import json
+import os
+import pkgutil
+import sys
+import tempfile
+
+import six
+
+from six.moves import collections_abc
+
+from rebasehelper.constants import PLUGIN_INDEX
+from rebasehelper.helpers.path_helper import PathHelper
+
+
+class PluginName(object):
+
+    """Descriptor providing name of a plugin class before the plugin is loaded."""
+
+    def __get__(self, instance, owner):
+        return PluginIndex.get_name(owner)
 
 
 class Plugin(object):
-    name = None
+    name = PluginName()
 
 
-class PluginLoader(object):
+class PluginIndex(object):
+
+    """Class for discovering plugins without importing them.
+
+    Entry points of installed distributions are read directly from their metadata
+    and stored in an index of plugin names and targets. The index is cached and rebuilt
+    only when the set of installed distributions changes. Plugins are never imported
+    by the index, whether a plugin can be loaded and whether it is a default one is
+    determined by importing it once it is needed, see PluginCollection.
+    """
+
+    GROUP_PREFIX = 'rebasehelper.'
+    METADATA_SUFFIXES = ('.dist-info', '.egg-info')
+
+    _index = None
+
+    @staticmethod
+    def get_index_path():
+        """Gets path to the file the index is cached in."""
+        return PathHelper.get_cache_path(PLUGIN_INDEX)
+
+    @staticmethod
+    def get_search_paths():
+        """Gets paths to look for installed distributions in.
+
+        Returns:
+            list: Parent directory of this package, to make its entry points accessible
+            in case it is not installed, followed by entries of sys.path.
+
+        """
+        parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        paths = []
+        for path in [parent_dir] + sys.path:
+            path = os.path.abspath(path or os.curdir)
+            if path not in paths:
+                paths.append(path)
+        return paths
+
     @classmethod
-    def load(cls, entrypoint):
-        result = {}
-        for ep in pkg_resources.iter_entry_points(entrypoint):
-            result[ep.name] = None
+    def find_metadata(cls):
+        """Finds metadata directories of installed distributions.
+
+        Returns:
+            list: Paths to the metadata directories.
+
+        """
+        result = []
+        for path in cls.get_search_paths():
+            if path.endswith('.egg') and os.path.isdir(os.path.join(path, 'EGG-INFO')):
+                result.append(os.path.join(path, 'EGG-INFO'))
+                continue
             try:
-                plugin = ep.load()
-            except ImportError:
-                # skip broken plugin
+                names = sorted(os.listdir(path))
+            except OSError:
                 continue
+            result.extend(os.path.join(path, n) for n in names if n.endswith(cls.METADATA_SUFFIXES))
+        return result
+
+    @staticmethod
+    def get_fingerprint(metadata):
+        """Computes a fingerprint of installed distributions.
+
+        Args:
+            metadata (list): Paths to metadata directories of installed distributions.
+
+        Returns:
+            str: Fingerprint that changes whenever a distribution is installed, removed
+            or its entry points are modified.
+
+        """
+        h = hashlib.sha256()
+        h.update('{}\n'.format(sys.version).encode('utf-8'))
+        for path in metadata:
             try:
-                if not issubclass(plugin, Plugin):
-                    raise TypeError
-            except TypeError:
-                # skip broken plugin
+                mtime = os.path.getmtime(os.path.join(path, 'entry_points.txt'))
+            except OSError:
+                mtime = None
+            h.update('{} {}\n'.format(path, mtime).encode('utf-8'))
+        return h.hexdigest()
+
+    @classmethod
+    def parse_entry_points(cls, path):
+        """Parses entry_points.txt file.
+
+        Args:
+            path (str): Path to the file.
+
+        Returns:
+            list: Tuples (group, name, target) of plugin entry points defined in the file.
+
+        """
+        result = []
+        group = None
+        try:
+            with open(path, 'r') as f:
+                lines = f.readlines()
+        except (IOError, OSError):
+            return result
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith(('#', ';')):
                 continue
+            if line.startswith('[') and line.endswith(']'):
+                group = line[1:-1].strip()
+                continue
+            if group is None or not group.startswith(cls.GROUP_PREFIX) or '=' not in line:
+                continue
+            name, target = line.split('=', 1)
+            # drop extras
+            target = target.split('[', 1)[0]
+            result.append((group, name.strip(), target.strip()))
+        return result
+
+    @staticmethod
+    def load_plugin(name, target):
+        """Imports a plugin.
+
+        Args:
+            name (str): Name of the plugin.
+            target (str): Object reference in the form module:attribute.
+
+        Returns:
+            type: Plugin class or None if the plugin is broken.
+
+        """
+        module, _, attrs = target.partition(':')
+        try:
+            plugin = importlib.import_module(module)
+            for attr in attrs.split('.') if attrs else []:
+                plugin = getattr(plugin, attr)
+        except (ImportError, AttributeError):
+            # skip broken plugin
+            return None
+        try:
+            if not issubclass(plugin, Plugin):
+                raise TypeError
+        except TypeError:
+            # skip broken plugin
+            return None
+        plugin.name = name
+        return plugin
+
+    @staticmethod
+    def get_declared_default(target):
+        """Gets value of DEFAULT attribute of a plugin class without importing the plugin.
+
+        The value is read from the class body in source of the plugin module,
+        so that defaults can be shown in help without importing plugins.
+
+        Args:
+            target (str): Object reference in the form module:attribute.
+
+        Returns:
+            bool: Value of the attribute or None if it can't be determined from the source,
+            e.g. because it is inherited or not a literal.
+
+        """
+        module, _, attrs = target.partition(':')
+        try:
+            loader = pkgutil.get_loader(module)
+            tree = ast.parse(loader.get_source(module))
+        except (ImportError, AttributeError, TypeError, ValueError, SyntaxError, IOError, OSError):
+            return None
+        for node in tree.body:
+            if not isinstance(node, ast.ClassDef) or node.name != attrs:
+                continue
+            for statement in node.body:
+                if not isinstance(statement, ast.Assign):
+                    continue
+                if any(isinstance(t, ast.Name) and t.id == 'DEFAULT' for t in statement.targets):
+                    try:
+                        return bool(ast.literal_eval(statement.value))
+                    except ValueError:
+                        return None
+        return None
+
+    @classmethod
+    def build(cls, metadata):
+        """Builds the index.
+
+        Args:
+            metadata (list): Paths to metadata directories of installed distributions.
+
+        Returns:
+            dict: Lists of entries describing plugins, by entry point group.
+
+        """
+        groups = collections.OrderedDict()
+        for path in metadata:
+            for group, name, target in cls.parse_entry_points(os.path.join(path, 'entry_points.txt')):
+                # the first distribution providing an entry point wins
+                groups.setdefault(group, collections.OrderedDict()).setdefault(name, target)
+        index = {}
+        for group, entry_points in six.iteritems(groups):
+            index[group] = [dict(name=name, target=target) for name, target in six.iteritems(entry_points)]
+        return index
+
+    @classmethod
+    def _read(cls, path, fingerprint):
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get('fingerprint') != fingerprint:
+            return None
+        return data.get('groups')
+
+    @classmethod
+    def _write(cls, path, fingerprint, index):
+        try:
+            cache_dir = os.path.dirname(path)
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            # write to a temporary file first so that incomplete index is never visible
+            fd, tmp = tempfile.mkstemp(prefix='.tmp-', dir=cache_dir)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(dict(fingerprint=fingerprint, groups=index), f)
+            os.rename(tmp, path)
+        except (IOError, OSError):
+            # caching is only an optimization
+            pass
+
+    @classmethod
+    def get_name(cls, plugin):
+        """Gets name a plugin class is registered under.
+
+        Args:
+            plugin (type): Plugin class.
+
+        Returns:
+            str: Name of the plugin or None if it is not registered.
+
+        """
+        target = '{}:{}'.format(plugin.__module__, plugin.__name__)
+        for entries in six.itervalues(cls.get_index()):
+            for entry in entries:
+                if entry['target'] == target:
+                    return entry['name']
+        return None
+
+    @classmethod
+    def get_index(cls):
+        """Gets the index, rebuilding it if installed distributions changed.
+
+        Returns:
+            dict: Lists of entries describing plugins, by entry point group.
+
+        """
+        if cls._index is None:
+            metadata = cls.find_metadata()
+            fingerprint = cls.get_fingerprint(metadata)
+            path = cls.get_index_path()
+            index = cls._read(path, fingerprint)
+            if index is None:
+                index = cls.build(metadata)
+                cls._write(path, fingerprint, index)
+            cls._index = index
+        return cls._index
+
+
+class PluginCollection(collections_abc.Mapping):
+
+    """Mapping of plugin names to plugin classes, importing plugins on first access.
+
+    A value is None if the plugin is broken.
+    """
+
+    def __init__(self, entries):
+        self._entries = collections.OrderedDict((e['name'], e) for e in entries)
+        self._plugins = {}
+
+    def __getitem__(self, name):
+        entry = self._entries[name]
+        if name not in self._plugins:
+            self._plugins[name] = PluginIndex.load_plugin(name, entry['target'])
+        return self._plugins[name]
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def is_available(self, name):
+        """Checks if a plugin can be loaded, importing it."""
+        return self[name] is not None
+
+    def is_default(self, name):
+        """Checks if a plugin is a default one, importing it."""
+        return bool(getattr(self[name], 'DEFAULT', False))
+
+    def get_available(self):
+        """Gets names of plugins that can be loaded."""
+        return [n for n in self if self.is_available(n)]
+
+    def get_default(self):
+        """Gets names of available default plugins."""
+        return [n for n in self.get_available() if self.is_default(n)]
+
+    def get_declared_default(self):
+        """Gets names of default plugins, importing only those already imported.
+
+        Availability of plugins is not checked and plugins not declaring DEFAULT
+        in their class body are considered non-default, see PluginIndex.get_declared_default().
+        """
+        result = []
+        for name, entry in six.iteritems(self._entries):
+            if name in self._plugins:
+                default = self.is_default(name)
             else:
-                plugin.name = ep.name
-            result[ep.name] = plugin
+                default = PluginIndex.get_declared_default(entry['target'])
+            if default:
+                result.append(name)
         return result
+
+
+class PluginLoader(object):
+    @classmethod
+    def load(cls, entrypoint):
+        return PluginCollection(PluginIndex.get_index().get(entrypoint, []))
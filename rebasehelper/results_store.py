@@ -20,7 +20,9 @@
 # Authors: Petr Hracek <phracek@redhat.com>
 #          Tomas Hozza <thozza@redhat.com>
 
+import contextlib
 import copy
+import threading
 
 
 class ResultsStore(object):
@@ -33,9 +35,12 @@ class ResultsStore(object):
     RESULTS_PATCHES = 'patches'
     RESULTS_CHANGES_PATCH = 'changes_patch'
     RESULTS_SUCCESS = 'result'
+    RESULTS_TIMINGS = 'timings'
 
     def __init__(self):
         self._data_store = dict()
+        self._local = threading.local()
+        self._lock = threading.RLock()
 
     def clear(self):
         self._data_store.clear()
@@ -52,12 +57,89 @@ class ResultsStore(object):
         ):
             raise ValueError('Trying to set unsupported type of results: %s!' % results_type)
 
+        writes = getattr(self._local, 'writes', None)
+        if writes is not None:
+            writes.append((results_type, data_dict))
+            return
+
+        with self._lock:
+            try:
+                dict_to_update = self._data_store[results_type]
+            except KeyError:
+                dict_to_update = dict()
+                self._data_store[results_type] = dict_to_update
+            dict_to_update.update(data_dict)
+
+    def _get_data_store(self):
+        writes = getattr(self._local, 'writes', None)
+        if not writes:
+            return self._data_store
+        # let the current thread see its own deferred writes
+        with self._lock:
+            data_store = {k: dict(v) for k, v in self._data_store.items()}
+        for results_type, data_dict in writes:
+            data_store.setdefault(results_type, dict()).update(data_dict)
+        return data_store
+
+    @contextlib.contextmanager
+    def deferred_writes(self, writes=None):
+        """Defers writes made in the current thread.
+
+        Instead of being stored, the written results are collected in a list,
+        which can be applied later using apply_writes(). The current thread
+        still sees the deferred writes when reading the results.
+
+        Args:
+            writes (list): List to collect the deferred writes in, e.g. one obtained
+                by get_deferred_writes() in another thread, so that writes of helper
+                threads are deferred together with writes of the thread that started them.
+
+        Yields:
+            list: List collecting the deferred writes.
+
+        """
+        if writes is None:
+            writes = []
+        previous = getattr(self._local, 'writes', None)
+        self._local.writes = writes
         try:
-            dict_to_update = self._data_store[results_type]
-        except KeyError:
-            dict_to_update = dict()
-            self._data_store[results_type] = dict_to_update
-        dict_to_update.update(data_dict)
+            yield writes
+        finally:
+            self._local.writes = previous
+
+    def get_deferred_writes(self):
+        """Gets the list collecting writes deferred in the current thread.
+
+        Returns:
+            list: The list, or None if writes are not deferred.
+
+        """
+        return getattr(self._local, 'writes', None)
+
+    def apply_writes(self, writes):
+        """Stores previously deferred writes.
+
+        Args:
+            writes (list): Writes collected by deferred_writes().
+
+        """
+        for results_type, data_dict in writes:
+            self.set_results(results_type, data_dict)
+
+    def add_timing(self, category, record):
+        """Adds a record about duration and resource usage of an action.
+
+        Unlike other results, timings are never deferred, they describe
+        all the work that was done, including stages that were discarded.
+
+        Args:
+            category (str): Category of the action, e.g. 'stages' or 'processes'.
+            record (dict): Recorded data.
+
+        """
+        with self._lock:
+            timings = self._data_store.setdefault(self.RESULTS_TIMINGS, dict())
+            timings.setdefault(category, []).append(record)
 
     def set_info_text(self, text, data):
         self.set_results(self.RESULTS_INFORMATION, {text: data})
@@ -81,10 +163,11 @@ class ResultsStore(object):
         self.set_results(self.RESULTS_SUCCESS, {text: data})
 
     def get_all(self):
-        return copy.deepcopy(self._data_store)
+        with self._lock:
+            return copy.deepcopy(self._get_data_store())
 
     def get_build(self, version):
-        builds_results = self._data_store.get(self.RESULTS_BUILDS, None)
+        builds_results = self._get_data_store().get(self.RESULTS_BUILDS, None)
         if builds_results is not None:
             return builds_results.get(version, None)
         else:
@@ -97,22 +180,25 @@ class ResultsStore(object):
         return self.get_build('new')
 
     def get_patches(self):
-        return self._data_store.get(self.RESULTS_PATCHES, None)
+        return self._get_data_store().get(self.RESULTS_PATCHES, None)
 
     def get_checkers(self):
-        return self._data_store.get(self.RESULTS_CHECKERS, {})
+        return self._get_data_store().get(self.RESULTS_CHECKERS, {})
 
     def get_build_log_hooks(self):
-        return self._data_store.get(self.RESULTS_BUILD_LOG_HOOKS, {})
+        return self._get_data_store().get(self.RESULTS_BUILD_LOG_HOOKS, {})
 
     def get_summary_info(self):
-        return self._data_store.get(self.RESULTS_INFORMATION, None)
+        return self._get_data_store().get(self.RESULTS_INFORMATION, None)
 
     def get_changes_patch(self):
-        return self._data_store.get(self.RESULTS_CHANGES_PATCH, None)
+        return self._get_data_store().get(self.RESULTS_CHANGES_PATCH, None)
 
     def get_result_message(self):
-        return self._data_store.get(self.RESULTS_SUCCESS, None)
+        return self._get_data_store().get(self.RESULTS_SUCCESS, None)
+
+    def get_timings(self):
+        return self._get_data_store().get(self.RESULTS_TIMINGS, {})
 
 
 # global results store
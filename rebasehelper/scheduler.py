@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+#
+# This tool helps you to rebase package to the latest version
+# Copyright (C) 2013-2014 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Authors: Petr Hracek <phracek@redhat.com>
+#          Tomas Hozza <thozza@redhat.com>
+
+import collections
+import sys
+import threading
+import time
+
+import six
+
+from six.moves import queue
+
+from rebasehelper.logger import logger
+from rebasehelper.results_store import results_store
+from rebasehelper.helpers.timing_helper import TimingHelper
+
+
+class Stage(object):
+
+    """Class representing a single stage of a rebase.
+
+    Attributes:
+        name(str): Name of the stage.
+        func(callable): Function performing the stage, called without arguments.
+        dependencies(list): Names of stages that have to be finished before this stage starts.
+
+    """
+
+    def __init__(self, name, func, dependencies=None):
+        self.name = name
+        self.func = func
+        self.dependencies = dependencies or []
+
+
+class StageScheduler(object):
+
+    """Class for running stages of a rebase according to their dependencies.
+
+    Stages are declared in the order they would be run sequentially, a stage can only depend
+    on stages declared before it. Stages whose dependencies are finished are run concurrently,
+    up to the specified limit.
+
+    To keep the outcome the same as if the stages were run sequentially, writes to results_store
+    made by a stage are deferred and applied in the order of declaration. If a stage fails,
+    only stages declared before it can still be started, results of stages declared after
+    the first failed one are discarded and its exception is raised once all running stages
+    are finished.
+
+    Attributes:
+        workers(int): Maximal number of stages running at the same time, unlimited if None.
+            With 1, the stages are run sequentially in the calling thread.
+        stages(collections.OrderedDict): Declared stages.
+        timings(collections.OrderedDict): Duration of each finished stage in seconds.
+        failed_stage(str): Name of the stage that failed or None.
+
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers
+        self.stages = collections.OrderedDict()
+        self.timings = collections.OrderedDict()
+        self.failed_stage = None
+        self._lock = threading.Lock()
+
+    def add_stage(self, name, func, dependencies=None):
+        """Declares a stage.
+
+        Args:
+            name (str): Name of the stage.
+            func (callable): Function performing the stage, called without arguments.
+            dependencies (list): Names of previously declared stages this stage depends on.
+
+        Raises:
+            ValueError: If the name is already used or a dependency was not declared.
+
+        """
+        if name in self.stages:
+            raise ValueError("Stage '{}' is already declared".format(name))
+        for dependency in dependencies or []:
+            if dependency not in self.stages:
+                raise ValueError("Stage '{}' depends on undeclared stage '{}'".format(name, dependency))
+        self.stages[name] = Stage(name, func, dependencies)
+
+    def _run_stage(self, stage):
+        with TimingHelper.measure('stages', stage.name) as record:
+            try:
+                stage.func()
+            finally:
+                duration = time.time() - record['start']
+                with self._lock:
+                    self.timings[stage.name] = duration
+                logger.verbose("Stage '%s' finished in %.2f seconds", stage.name, duration)
+
+    def run(self):
+        """Runs all declared stages.
+
+        Raises:
+            Exception: Exception raised by the failed stage.
+
+        """
+        if self.workers == 1:
+            for stage in six.itervalues(self.stages):
+                try:
+                    self._run_stage(stage)
+                except BaseException:
+                    self.failed_stage = stage.name
+                    raise
+            return
+        self._run_concurrently()
+
+    def _run_concurrently(self):
+        stages = list(six.itervalues(self.stages))
+        index = {s.name: i for i, s in enumerate(stages)}
+        finished_queue = queue.Queue()
+        finished = {}
+        started = set()
+        running = set()
+        committed = 0
+        failure = None
+
+        def worker(stage):
+            exc_info = None
+            with results_store.deferred_writes() as writes:
+                try:
+                    self._run_stage(stage)
+                except BaseException:  # pylint: disable=broad-except
+                    exc_info = sys.exc_info()
+            finished_queue.put((stage.name, writes, exc_info))
+
+        while True:
+            # apply results of finished stages in the order of declaration
+            while failure is None and committed < len(stages) and stages[committed].name in finished:
+                writes, exc_info = finished[stages[committed].name]
+                results_store.apply_writes(writes)
+                if exc_info is not None:
+                    self.failed_stage = stages[committed].name
+                    failure = exc_info
+                else:
+                    committed += 1
+            if failure is not None and not running:
+                six.reraise(*failure)
+            if committed == len(stages):
+                return
+            # start stages whose dependencies are committed, after a failure only those
+            # that would have been run before the failed stage if running sequentially
+            if failure is None:
+                failed = [index[n] for n, f in six.iteritems(finished) if f[1] is not None]
+                limit = min(failed) if failed else len(stages)
+                for stage in stages[:limit]:
+                    if self.workers and len(running) >= self.workers:
+                        break
+                    if stage.name in started:
+                        continue
+                    if all(index[d] < committed for d in stage.dependencies):
+                        started.add(stage.name)
+                        running.add(stage.name)
+                        thread = threading.Thread(target=worker, args=(stage,))
+                        thread.daemon = True
+                        thread.start()
+            # wait for a stage to finish, with a timeout to stay responsive to KeyboardInterrupt
+            while True:
+                try:
+                    name, writes, exc_info = finished_queue.get(timeout=1)
+                except queue.Empty:
+                    continue
+                break
+            running.discard(name)
+            finished[name] = (writes, exc_info)
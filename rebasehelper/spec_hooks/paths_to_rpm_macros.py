@@ -31,7 +31,8 @@ class PathsToRPMMacrosHook(BaseSpecHook):
 
     @classmethod
     def run(cls, spec_file, rebase_spec_file, **kwargs):
-        macros = [m for m in rebase_spec_file.macros if m['name'] in MacroHelper.MACROS_WHITELIST]
+        macros = [m for n in MacroHelper.MACROS_WHITELIST
+                  for m in MacroHelper.filter(rebase_spec_file.macros, name=n)]
         macros = MacroHelper.expand_macros(macros)
         # ensure maximal greediness
         macros.sort(key=lambda k: len(k['value']), reverse=True)
@@ -44,11 +44,11 @@ class PyPIURLFixHook(BaseSpecHook):
 
     @classmethod
     def run(cls, spec_file, rebase_spec_file, **kwargs):
-        for index, line in enumerate(rebase_spec_file.spec_content.sections['%package']):
-            if line.startswith("URL"):
-                rebase_spec_file.spec_content.sections['%package'][index] = cls._transform_url(line)
-            elif line.startswith("Source"):
-                rebase_spec_file.spec_content.sections['%package'][index] = cls._transform_sources_url(line)
+        section = rebase_spec_file.spec_content.sections['%package']
+        for index in section.find_tags('URL'):
+            section[index] = cls._transform_url(section[index])
+        for index in section.find_tags('Source'):
+            section[index] = cls._transform_sources_url(section[index])
         rebase_spec_file.save()
 
     @classmethod
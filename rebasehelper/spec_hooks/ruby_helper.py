@@ -80,12 +80,14 @@ class RubyHelperHook(BaseSpecHook):
             comment_re = re.compile(r'^#')
             comments = None
             # find matching Source line in the SPEC file
-            for i in range(len(rebase_spec_file.spec_content.sections['%package'])):
-                if source_re.match(rebase_spec_file.spec_content.sections['%package'][i]):
+            section = rebase_spec_file.spec_content.sections['%package']
+            tags = ['Source', 'Source0'] if idx == 0 else ['Source{}'.format(idx)]
+            for i in sorted(i for t in tags for i in section.find_tag(t)):
+                if source_re.match(section[i]):
                     # get all comments above this line
                     for j in range(i - 1, 0, -1):
-                        if not comment_re.match(rebase_spec_file.spec_content.sections['%package'][j]):
-                            comments = rebase_spec_file.spec_content.sections['%package'][j+1:i]
+                        if not comment_re.match(section[j]):
+                            comments = section[j+1:i]
                             break
                     break
             if not comments:
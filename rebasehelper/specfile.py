@@ -22,6 +22,9 @@
 
 from __future__ import print_function
 import argparse
+import bisect
+import collections
+import copy
 import itertools
 import os
 import re
@@ -45,10 +48,13 @@ from rebasehelper.archive import Archive
 from rebasehelper.exceptions import RebaseHelperError, DownloadError, ParseError, LookasideCacheError
 from rebasehelper.argument_parser import SilentArgumentParser
 from rebasehelper.helpers.download_helper import DownloadHelper
-from rebasehelper.helpers.macro_helper import MacroHelper
+from rebasehelper.helpers.macro_helper import MacroHelper, MacroSnapshot
+from rebasehelper.helpers.parallel_helper import ParallelHelper
 from rebasehelper.helpers.rpm_helper import RpmHelper
+from rebasehelper.helpers.spec_cache_helper import SpecCacheHelper
 from rebasehelper.helpers.git_helper import GitHelper
 from rebasehelper.helpers.lookaside_cache_helper import LookasideCacheHelper
+from rebasehelper.helpers.timing_helper import TimingHelper
 
 
 def get_rebase_name(dir_name, name):
@@ -103,6 +109,352 @@ class PatchObject(object):
         return self.strip
 
 
+class SpecSection(list):
+
+    """List of lines of a SPEC file section with an index of lines of interest.
+
+    Tag lines, macro definitions and %setup/%patch-like directives are indexed
+    by their name. The index is updated by every modification of the list, lines
+    are classified only when they are added or replaced and positions of other
+    lines are just shifted, so lookups never need to scan the section.
+    """
+
+    TAG_RE = re.compile(r'^(?P<name>\w+)\s*:')
+    TAG_NUMBER_RE = re.compile(r'\d+$')
+    MACRO_DEFINITION_RE = re.compile(r'^\s*%(global|define)\s+(?P<name>\w+)')
+    DIRECTIVE_RE = re.compile(r'^\s*%(?P<name>setup|autosetup|patch|autopatch)\d*(\s|$)')
+
+    def __init__(self, lines=()):
+        super(SpecSection, self).__init__(lines)
+        self._reindex()
+
+    def __copy__(self):
+        return SpecSection(self)
+
+    def __deepcopy__(self, memo):
+        # lines are immutable
+        return SpecSection(self)
+
+    def __reduce__(self):
+        return SpecSection, (list(self),)
+
+    @classmethod
+    def _get_keys(cls, line):
+        keys = []
+        match = cls.TAG_RE.match(line)
+        if match:
+            keys.append(('tag', match.group('name')))
+            keys.append(('tag_family', cls.TAG_NUMBER_RE.sub('', match.group('name'))))
+        match = cls.MACRO_DEFINITION_RE.match(line)
+        if match:
+            keys.append(('macro', match.group('name')))
+        match = cls.DIRECTIVE_RE.match(line)
+        if match:
+            keys.append(('directive', match.group('name')))
+        return keys
+
+    def _reindex(self):
+        self._index = {}
+        for i, line in enumerate(self):
+            for key in self._get_keys(line):
+                self._index.setdefault(key, []).append(i)
+
+    def _add(self, i, line):
+        for key in self._get_keys(line):
+            bisect.insort(self._index.setdefault(key, []), i)
+
+    def _remove(self, i, line):
+        for key in self._get_keys(line):
+            positions = self._index[key]
+            del positions[bisect.bisect_left(positions, i)]
+            if not positions:
+                del self._index[key]
+
+    def _shift(self, start, delta):
+        """Shifts positions of lines starting at the specified position."""
+        for positions in six.itervalues(self._index):
+            for j in range(bisect.bisect_left(positions, start), len(positions)):
+                positions[j] += delta
+
+    def _normalize(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('list index out of range')
+        return i
+
+    def __setitem__(self, i, value):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                super(SpecSection, self).__setitem__(i, value)
+                self._reindex()
+                return
+            value = list(value)
+            del self[start:max(start, stop)]
+            for j, line in enumerate(value):
+                self.insert(start + j, line)
+            return
+        i = self._normalize(i)
+        self._remove(i, self[i])
+        super(SpecSection, self).__setitem__(i, value)
+        self._add(i, value)
+
+    def __delitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                super(SpecSection, self).__delitem__(i)
+                self._reindex()
+                return
+            stop = max(start, stop)
+            for j in range(start, stop):
+                self._remove(j, self[j])
+            super(SpecSection, self).__delitem__(i)
+            self._shift(stop, start - stop)
+            return
+        i = self._normalize(i)
+        self._remove(i, self[i])
+        super(SpecSection, self).__delitem__(i)
+        self._shift(i + 1, -1)
+
+    if six.PY2:
+        def __setslice__(self, i, j, sequence):
+            self.__setitem__(slice(i, j), sequence)
+
+        def __delslice__(self, i, j):
+            self.__delitem__(slice(i, j))
+
+    def insert(self, i, line):
+        i = max(0, min(i + len(self) if i < 0 else i, len(self)))
+        self._shift(i, 1)
+        super(SpecSection, self).insert(i, line)
+        self._add(i, line)
+
+    def append(self, line):
+        self.insert(len(self), line)
+
+    def extend(self, lines):
+        for line in list(lines):
+            self.append(line)
+
+    def __iadd__(self, lines):
+        self.extend(lines)
+        return self
+
+    def __imul__(self, n):
+        super(SpecSection, self).__imul__(n)
+        self._reindex()
+        return self
+
+    def pop(self, i=-1):
+        i = self._normalize(i)
+        line = self[i]
+        del self[i]
+        return line
+
+    def remove(self, line):
+        del self[self.index(line)]
+
+    def sort(self, *args, **kwargs):
+        super(SpecSection, self).sort(*args, **kwargs)
+        self._reindex()
+
+    def reverse(self):
+        super(SpecSection, self).reverse()
+        self._reindex()
+
+    def _find(self, key):
+        return list(self._index.get(key, []))
+
+    def find_tag(self, name):
+        """Gets positions of lines defining the specified tag, e.g. Source0."""
+        return self._find(('tag', name))
+
+    def find_tags(self, family):
+        """Gets positions of lines defining tags of the specified family, e.g. Source, Source0, Source1..."""
+        return self._find(('tag_family', family))
+
+    def find_macro_definition(self, name):
+        """Gets positions of lines defining the specified macro using %global or %define."""
+        return self._find(('macro', name))
+
+    def find_directive(self, name):
+        """Gets positions of lines starting with the specified directive, e.g. patch for %patch0."""
+        return self._find(('directive', name))
+
+
+class MacroDefinitions(object):
+
+    """Index of macro definitions in a SPEC file section.
+
+    Definitions are found once in the joined content of the section, rewriting
+    a definition updates the content and the index in place. References to other
+    defined macros in values of definitions are resolved lazily and cached.
+
+    Attributes:
+        content(str): Content of the section, lines separated by newlines.
+        definitions(list): Matches of all definitions, in order of appearance.
+
+    """
+
+    DEFINITION_RE = re.compile(
+        r'''
+        ^
+        (?P<cond>%{!?\?\w+:\s*)?
+        (?(cond)%global|%(global|define))
+        \s+
+        (?P<name>\w+)
+        (?P<options>\(.+?\))?
+        \s+
+        (?P<value>
+            (%((?P<b>{)|(?P<s>\()))?
+            .+?
+            (?(b)})(?(s)\))
+        )
+        (?(cond)})
+        $
+        ''',
+        re.VERBOSE | re.MULTILINE | re.DOTALL)
+
+    REFERENCE_RE = re.compile(r'%(?P<brace>{\??)?(?P<name>\w+)(?(brace)})')
+
+    def __init__(self, lines):
+        self.content = '\n'.join(lines)
+        self._build()
+
+    def _build(self):
+        self.definitions = list(self.DEFINITION_RE.finditer(self.content))
+        self._first = {}
+        for i, match in enumerate(self.definitions):
+            self._first.setdefault(match.group('name'), i)
+        self._dependencies = {}
+
+    def __contains__(self, name):
+        return name in self._first
+
+    def get_lines(self):
+        return self.content.split('\n')
+
+    def get_value(self, name):
+        """Gets raw value of the first definition of a macro or None if it is not defined."""
+        if name not in self._first:
+            return None
+        return self.definitions[self._first[name]].group('value')
+
+    def find_references(self, s):
+        """Finds references to defined macros in a string.
+
+        Returns:
+            list: Tuples of macro name and span of the reference.
+
+        """
+        return [(m.group('name'), m.span()) for m in self.REFERENCE_RE.finditer(s) if m.group('name') in self]
+
+    def get_dependencies(self, name):
+        """Gets references to defined macros in value of a macro."""
+        if name not in self._dependencies:
+            self._dependencies[name] = self.find_references(self.get_value(name) or '')
+        return self._dependencies[name]
+
+    def redefine(self, name, value):
+        """Replaces value of the first definition of a macro, removing its options.
+
+        Args:
+            name (str): Name of the macro.
+            value (str): New raw value.
+
+        """
+        if name not in self._first:
+            return
+        index = self._first[name]
+        match = self.definitions[index]
+        content = self.content[:match.start('value')] + value + self.content[match.end('value'):]
+        end = match.end() - match.end('value') + match.start('value') + len(value)
+        if match.group('options'):
+            content = content[:match.start('options')] + content[match.end('options'):]
+            end -= match.end('options') - match.start('options')
+        self.content = content
+        new_match = self.DEFINITION_RE.match(content, match.start())
+        if not new_match or new_match.end() != end or new_match.group('name') != name:
+            # the definition is now parsed differently, index everything again
+            self._build()
+            return
+        # the rest of the content is unchanged, only shift positions of following definitions
+        offset = end - match.end()
+        self.definitions[index] = new_match
+        for i in range(index + 1, len(self.definitions)):
+            self.definitions[i] = self.DEFINITION_RE.match(content, self.definitions[i].start() + offset)
+        self._dependencies.pop(name, None)
+
+
+class SpecSections(CaseInsensitiveDict):
+
+    """Case insensitive dict of SPEC file sections, ensuring that all sections are indexed.
+
+    A section can also be stored as raw text, it is split into lines and indexed
+    only when it is accessed for the first time. Sections that are never accessed
+    are written back unchanged without being split at all.
+    """
+
+    class RawText(object):
+
+        """Text of a section that has not been split into lines yet."""
+
+        __slots__ = ['text']
+
+        def __init__(self, text):
+            self.text = text
+
+    def __setitem__(self, key, value):
+        if not isinstance(value, SpecSection):
+            value = SpecSection(value)
+        super(SpecSections, self).__setitem__(key, value)
+
+    def __getitem__(self, key):
+        original_key, value = self._store[key.lower()]
+        if isinstance(value, self.RawText):
+            value = SpecSection(value.text.splitlines())
+            self._store[key.lower()] = (original_key, value)
+        return value
+
+    def set_text(self, key, text):
+        """Stores a section as raw text.
+
+        Args:
+            key (str): Section header.
+            text (str): Content of the section, lines separated by newlines.
+
+        """
+        self._store[key.lower()] = (key, self.RawText(text))
+
+    def get_text(self, key):
+        """Gets content of a section as text, each line terminated by a newline."""
+        value = self._store[key.lower()][1]
+        if isinstance(value, self.RawText):
+            if value.text and not value.text.endswith('\n'):
+                return value.text + '\n'
+            return value.text
+        return ''.join(line + '\n' for line in value)
+
+    def lower_items(self):
+        return ((k, self[k]) for k in list(self._store))
+
+    def copy(self):
+        """Creates a copy sharing raw text of sections with the original.
+
+        Sections that have already been split into lines are stored as raw text
+        in the copy, so modifications of either of the objects don't affect the other
+        and the copy pays for splitting and indexing only of sections it accesses.
+        """
+        result = SpecSections()
+        for lower_key, (key, value) in six.iteritems(self._store):
+            if not isinstance(value, self.RawText):
+                value = self.RawText(self.get_text(key))
+            result._store[lower_key] = (key, value)  # pylint: disable=protected-access
+        return result
+
+
 class SpecContent(object):
     """Class representing content of a SPEC file."""
 
@@ -139,46 +491,86 @@ class SpecContent(object):
         '%transfiletriggerpostun',
     ]
 
+    # matches lines starting with any of the section headers
+    SECTION_HEADERS_RE = re.compile('|'.join(re.escape(h) for h in SECTION_HEADERS), re.IGNORECASE)
+    # matches whole section header lines in content
+    SECTION_HEADER_LINES_RE = re.compile(r'^(?:{})[^\n]*'.format(SECTION_HEADERS_RE.pattern),
+                                         re.IGNORECASE | re.MULTILINE)
+    # line boundaries other than newline recognized by str.splitlines()
+    EXTRA_LINE_BOUNDARIES_RE = re.compile(u'[\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]')
+
     def __init__(self, content):
         self.sections = self._split_sections(content)
 
+    def copy(self):
+        """Creates a copy of the content, see SpecSections.copy()."""
+        result = SpecContent.__new__(SpecContent)
+        result.sections = self.sections.copy()
+        return result
+
     def __str__(self):
         """Join SPEC file sections back together."""
         content = []
-        for header, section in six.iteritems(self.sections):
+        for header in self.sections:
             if header != '%package':
                 content.append(header + '\n')
-            for line in section:
-                content.append(line + '\n')
+            content.append(self.sections.get_text(header))
         return ''.join(content)
 
     @classmethod
     def _split_sections(cls, content):
         """Splits content of a SPEC file into sections.
 
+        Section headers are found in a single pass over the content and sections
+        are kept as raw text until they are accessed.
+
         Args:
             content (str): Content of the SPEC file
 
         """
-        lines = content.splitlines()
-        section_headers_re = [re.compile(r'^{0}.*'.format(re.escape(x)), re.IGNORECASE) for x in cls.SECTION_HEADERS]
+        sections = SpecSections()
+        if cls.EXTRA_LINE_BOUNDARIES_RE.search(content):
+            # raw text would not split into the same lines, split eagerly
+            lines = content.splitlines()
+            header = '%package'
+            start = 0
+            for i, line in enumerate(lines):
+                if cls.SECTION_HEADERS_RE.match(line):
+                    sections[header] = lines[start:i]
+                    header = line
+                    start = i + 1
+            sections[header] = lines[start:]
+            return sections
+
+        header = '%package'
+        start = 0
+        for match in cls.SECTION_HEADER_LINES_RE.finditer(content):
+            sections.set_text(header, content[start:match.start()])
+            header = match.group()
+            # skip the newline terminating the header
+            start = match.end() + 1
+        sections.set_text(header, content[start:])
+        return sections
 
-        section_beginnings = []
-        for i, line in enumerate(lines):
-            if line.startswith('%'):
-                for header in section_headers_re:
-                    if header.match(line):
-                        section_beginnings.append(i)
-        section_beginnings.append(None)
 
-        sections = CaseInsensitiveDict()
-        sections['%package'] = lines[:section_beginnings[0]]
+class LazyAttribute(object):
 
-        for i in range(len(section_beginnings) - 1):
-            start = section_beginnings[i] + 1
-            end = section_beginnings[i + 1]
-            sections[lines[start - 1]] = lines[start:end]
-        return sections
+    """Attribute computed by a method when it is accessed for the first time.
+
+    The value is stored in the instance, so it can also be overridden by assignment.
+    Stored values are discarded by SpecFile._update_data().
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        value = instance.__dict__[self.name] = self.func(instance)
+        return value
 
 
 class SpecFile(object):
@@ -189,15 +581,28 @@ class SpecFile(object):
     download = False
     spec_content = None
     spc = None
-    hdr = None
+    header = None
+    raw_sources = None
     extra_version = None
-    category = None
-    sources = None
-    patches = None
+    extra_version_separator = ''
+    packages = None
     prep_section = []
     removed_patches = []
 
+    # macros defined by configuration and command line, SPEC files define macros at higher levels
+    CONFIG_MACROS_MAX_LEVEL = -7
+
+    # maximal time in seconds to wait for a worker process to parse a SPEC file
+    PARSE_TIMEOUT = 300
+
     def __init__(self, path, changelog_entry, sources_location='', download=True):
+        """Constructs a SpecFile object.
+
+        :param path: path to the SPEC file
+        :param changelog_entry: changelog entry to be added when the SPEC file is updated
+        :param sources_location: path to the directory with sources
+        :param download: whether remote sources should be downloaded
+        """
         self.path = path
         self.download = download
         self.sources_location = sources_location
@@ -209,11 +614,13 @@ class SpecFile(object):
         self.removed_patches = []
         self._update_data()
 
-    def download_remote_sources(self):
+    def download_remote_sources(self, extract=None):
         """
         Method that iterates over all sources and downloads ones, which contain URL instead of just a file.
 
-        :return: None
+        :param extract: dict mapping basenames of sources to directories the sources should be extracted to
+            while they are being downloaded
+        :return: list of paths to sources that have been extracted while being downloaded
         """
         try:
             # try to download old sources from Fedora lookaside cache
@@ -224,16 +631,40 @@ class SpecFile(object):
 
         # filter out only sources with URL
         remote_files = [source for source in self.sources if bool(urllib.parse.urlparse(source).scheme)]
+        extracted = []
         # download any sources that are not yet downloaded
         for remote_file in remote_files:
             local_file = os.path.join(self.sources_location, os.path.basename(remote_file))
             if not os.path.isfile(local_file):
                 logger.verbose("File '%s' doesn't exist locally, downloading it.", local_file)
+                destination = (extract or {}).get(os.path.basename(local_file))
+                stream = None
+                if destination:
+                    try:
+                        stream = Archive(local_file).open_stream(destination)
+                    except NotImplementedError:
+                        # unsupported archive type
+                        pass
                 try:
-                    DownloadHelper.download_file(remote_file, local_file)
+                    DownloadHelper.download_file(remote_file, local_file, consumer=stream)
                 except DownloadError as e:
+                    if stream is not None:
+                        stream.abort()
                     raise RebaseHelperError("Failed to download file from URL {}. "
                                             "Reason: '{}'. ".format(remote_file, str(e)))
+                except BaseException:
+                    if stream is not None:
+                        stream.abort()
+                    raise
+                if stream is not None:
+                    try:
+                        stream.close()
+                    except IOError as e:
+                        logger.verbose("Extraction of '%s' during download failed: %s", local_file, six.text_type(e))
+                        shutil.rmtree(destination, ignore_errors=True)
+                    else:
+                        extracted.append(local_file)
+        return extracted
 
     def _update_data(self):
         """
@@ -241,73 +672,294 @@ class SpecFile(object):
 
         :return:
         """
-        def guess_category():
-            def _decode(s):
-                if six.PY3:
-                    return s.decode(constants.DEFENC)
-                return s
-            for pkg in self.spc.packages:
-                for category, regexp in six.iteritems(constants.PACKAGE_CATEGORIES):
-                    if regexp.match(_decode(pkg.header[rpm.RPMTAG_NAME])):
-                        return category
-                    for provide in pkg.header[rpm.RPMTAG_PROVIDENAME]:
-                        if regexp.match(_decode(provide)):
-                            return category
-            return None
-
-        def replace_macro(macro, value):
-            m = '%{{{}}}'.format(macro)
-            while MacroHelper.expand(m, m) != m:
-                rpm.delMacro(macro)
-            rpm.addMacro(macro, value)
-        # ensure that %{_sourcedir} macro is set to proper location
-        replace_macro('_sourcedir', self.sources_location)
+        try:
+            with open(self.path, 'rb') as f:
+                content = f.read()
+        except IOError:
+            raise RebaseHelperError("Unable to open and read SPEC file '%s'" % self.path)
+        # other threads must not change macro context in the middle of parsing
+        # and before everything depending on macros is computed
+        with MacroHelper.lock:
+            self._set_sourcedir(self.sources_location)
+            key = SpecCacheHelper.get_key(content, self._get_cache_context(self.sources_location))
+            # e.g. expanded %prep differs once sources are downloaded
+            record = SpecCacheHelper.lookup(key, lambda r: self._get_file_states(r['files']) == r['files'])
+            if record is None and not ParallelHelper.has_process_pool():
+                self._parse_in_process(content, key)
+                return
+        if record is None:
+            # worker processes have their own librpm state, so the SPEC file is parsed
+            # without holding the lock and other threads can parse or expand macros meanwhile
+            try:
+                record = ParallelHelper.call_in_process(self._parse_isolated, self.path, content,
+                                                        self.sources_location, timeout=self.PARSE_TIMEOUT)
+            except RuntimeError as e:
+                logger.verbose("Parsing '%s' in a worker process failed: %s", self.path, six.text_type(e))
+                with MacroHelper.lock:
+                    self._set_sourcedir(self.sources_location)
+                    self._parse_in_process(content, key)
+                return
+            SpecCacheHelper.store(key, record)
+        # define macros the SPEC file defines, as if it was parsed in this process
+        with MacroHelper.lock:
+            self._set_sourcedir(self.sources_location)
+            self.spc = None
+            self._replay_macros(record['macros'])
+            self._set_data(record['data'], MacroHelper.dump())
+
+    def _parse_in_process(self, content, key):
+        """Parses the SPEC file in this process and caches the result, MacroHelper.lock must be held
+
+        :param content: content of the SPEC file
+        :param key: spec cache key
+        """
         # explicitly discard old instance to prevent rpm from destroying
         # "sources" and "patches" lua tables after new instance is created
         self.spc = None
-        # load rpm information
-        try:
-            self.spc = RpmHelper.parse_spec(self.path, flags=rpm.RPMSPEC_ANYARCH)
-        except ValueError:
+        self.spc = self._parse(self.path)
+        record = self._get_record(self.spc, content, self.sources_location)
+        SpecCacheHelper.store(key, record)
+        self._set_data(record['data'], MacroHelper.dump())
+
+    @classmethod
+    def _get_cache_context(cls, sources_location):
+        """Gets everything except content of a SPEC file the result of parsing it depends on
+
+        Those are version of RPM, location of sources and macros coming from configuration
+        and command line. Macros left in the context by previously parsed SPEC files
+        are not taken into account.
+
+        :param sources_location: path to the directory with sources
+        :return: string to be used as context part of a spec cache key
+        """
+        macros = MacroSnapshot(MacroHelper.filter(MacroHelper.dump(), max_level=cls.CONFIG_MACROS_MAX_LEVEL))
+        return '\0'.join([rpm.__version__, sources_location, macros.fingerprint])
+
+    @classmethod
+    def _get_record(cls, spc, content, sources_location):
+        """Gets a record of parsing a SPEC file, to be cached
+
+        Must be called right after the SPEC file is parsed.
+
+        :param spc: parsed SPEC file, rpm.spec
+        :param content: content of the SPEC file
+        :param sources_location: path to the directory with sources
+        :return: picklable dict of data returned by _get_spec_data(), macros defined
+            after parsing the SPEC file and states of files referenced by it
+        """
+        data = cls._get_spec_data(spc)
+        files = cls._get_file_states(cls._get_referenced_files(content, data, sources_location))
+        return dict(data=data, macros=list(MacroHelper.dump()), files=files)
+
+    @classmethod
+    def _parse_isolated(cls, path, content, sources_location):
+        """Parses a SPEC file in a worker process, see ParallelHelper.call_in_process()
+
+        :param path: path to the SPEC file
+        :param content: content of the SPEC file
+        :param sources_location: path to the directory with sources
+        :return: record of parsing the SPEC file, see _get_record()
+        """
+        cls._set_sourcedir(sources_location)
+        return cls._get_record(cls._parse(path), content, sources_location)
+
+    @staticmethod
+    def _get_referenced_files(content, data, sources_location):
+        """Gets paths to files the result of parsing a SPEC file depends on
+
+        Those are local copies of Sources and Patches and files included using %include.
+        Must be called right after the SPEC file is parsed, paths of included files
+        are expanded in the current macro context.
+
+        :param content: content of the SPEC file
+        :param data: data returned by _get_spec_data()
+        :param sources_location: path to the directory with sources
+        :return: list of paths
+        """
+        paths = [os.path.join(sources_location, os.path.basename(source[0])) for source in data['sources']]
+        for line in content.decode(constants.DEFENC, 'replace').splitlines():
+            match = re.match(r'^\s*%include\s+(\S.*?)\s*$', line)
+            if match:
+                paths.append(os.path.abspath(MacroHelper.expand(match.group(1), match.group(1))))
+        return paths
+
+    @staticmethod
+    def _get_file_states(paths):
+        """Gets states of files, used to detect changes of files referenced by a SPEC file
+
+        :param paths: list of paths to the files
+        :return: dict mapping paths to lists of size and modification time, or None if a file doesn't exist
+        """
+        result = {}
+        for path in paths:
             try:
-                # try again with RPMSPEC_FORCE flag (the default)
-                self.spc = RpmHelper.parse_spec(self.path)
-            except ValueError:
-                raise RebaseHelperError("Problem with parsing SPEC file '%s'" % self.path)
-        self.category = guess_category()
-        self.sources = self._get_spec_sources_list(self.spc)
-        self.prep_section = self.spc.prep
+                st = os.stat(path)
+            except OSError:
+                result[path] = None
+            else:
+                result[path] = [st.st_size, st.st_mtime]
+        return result
+
+    @classmethod
+    def _replay_macros(cls, macros):
+        """Defines macros that parsing a SPEC file would define
+
+        Used when data obtained by parsing the SPEC file are taken from cache, so that
+        macro context is the same as if it was parsed.
+
+        :param macros: macros defined after the SPEC file was parsed
+        """
+        def top(snapshot):
+            # a macro can be defined multiple times, only the topmost definition is effective
+            result = collections.OrderedDict()
+            for m in snapshot:
+                result.setdefault(m['name'], m)
+            return result
+
+        current = top(MacroHelper.dump())
+        for name, m in six.iteritems(top(macros)):
+            if m['level'] <= cls.CONFIG_MACROS_MAX_LEVEL:
+                # part of the cache key, so already defined
+                continue
+            if name in current and (current[name]['options'], current[name]['value']) == (m['options'], m['value']):
+                continue
+            if m['options']:
+                # parametric macros can't be defined using rpm.addMacro()
+                MacroHelper.expand('%define {}{} {}'.format(name, m['options'], m['value']))
+            else:
+                MacroHelper.add_macro(name, m['value'])
+
+    @property
+    def hdr(self):
+        """Header of the source package, rpm.hdr
+
+        The SPEC file is parsed again if the data were obtained from cache.
+        """
+        with MacroHelper.lock:
+            if self.spc is None:
+                self._set_sourcedir(self.sources_location)
+                self.spc = self._parse(self.path)
+            return self.spc.sourceHeader
+
+    def _set_data(self, data, macros):
+        """Sets attributes from data obtained by parsing the SPEC file
+
+        :param data: data returned by _get_spec_data()
+        :param macros: snapshot of macros defined after parsing the SPEC file
+        """
+        self.packages = data['packages']
+        self.prep_section = data['prep']
         # HEADER of SPEC file
-        self.hdr = self.spc.sourceHeader
-        # determine the extra_version
+        self.header = data['header']
+        self.raw_sources = data['sources']
+        # discard attributes computed from previous data
+        for name, attr in six.iteritems(vars(SpecFile)):
+            if isinstance(attr, LazyAttribute):
+                self.__dict__.pop(name, None)
+        self.macros = macros
+        # determine the extra_version, it depends on macros, so it can't be computed lazily
         logger.debug("Updating the extra version")
         _, self.extra_version, separator = SpecFile.extract_version_from_archive_name(
             self.get_archive(),
             self._get_raw_source_string(0))
         self.set_extra_version_separator(separator)
 
-        self.patches = self._get_initial_patches_list()
-        self.macros = MacroHelper.dump()
+    @staticmethod
+    def _set_sourcedir(sources_location):
+        """Ensures that %{_sourcedir} macro is set to proper location"""
+        m = '%{_sourcedir}'
+        if MacroHelper.expand(m, m) == sources_location:
+            # already set, don't invalidate macro context needlessly
+            return
+        while MacroHelper.expand(m, m) != m:
+            MacroHelper.del_macro('_sourcedir')
+        MacroHelper.add_macro('_sourcedir', sources_location)
+
+    @staticmethod
+    def _parse(path):
+        """Parses a SPEC file using librpm"""
+        try:
+            return RpmHelper.parse_spec(path, flags=rpm.RPMSPEC_ANYARCH)
+        except ValueError:
+            try:
+                # try again with RPMSPEC_FORCE flag (the default)
+                return RpmHelper.parse_spec(path)
+            except ValueError:
+                raise RebaseHelperError("Problem with parsing SPEC file '%s'" % path)
+
+    @staticmethod
+    def _get_spec_data(spec_object):
+        """Gets data needed by SpecFile from a parsed SPEC file.
+
+        Args:
+            spec_object (rpm.spec): Parsed SPEC file.
+
+        Returns:
+            dict: Data serializable to JSON, so that they can be cached.
+
+        """
+        def _decode(s):
+            if six.PY3 and isinstance(s, bytes):
+                return s.decode(constants.DEFENC)
+            return s
+
+        hdr = spec_object.sourceHeader
+        return dict(
+            packages=[dict(name=_decode(pkg.header[rpm.RPMTAG_NAME]),
+                           provides=[_decode(p) for p in pkg.header[rpm.RPMTAG_PROVIDENAME]])
+                      for pkg in spec_object.packages],
+            sources=[list(source) for source in spec_object.sources],
+            prep=spec_object.prep,
+            header=dict(
+                name=_decode(hdr[rpm.RPMTAG_NAME]),
+                version=_decode(hdr[rpm.RPMTAG_VERSION]),
+                release=_decode(hdr[rpm.RPMTAG_RELEASE]),
+                epoch=hdr[rpm.RPMTAG_EPOCHNUM],
+                requires=[_decode(r) for r in hdr[rpm.RPMTAG_REQUIRES]],
+            ),
+        )
+
+    @LazyAttribute
+    def category(self):
+        """Category of the package guessed from names and provides of its packages"""
+        for pkg in self.packages:
+            for category, regexp in six.iteritems(constants.PACKAGE_CATEGORIES):
+                if regexp.match(pkg['name']):
+                    return category
+                for provide in pkg['provides']:
+                    if regexp.match(provide):
+                        return category
+        return None
+
+    @LazyAttribute
+    def sources(self):
+        """List of Sources in SPEC file, see _get_spec_sources_list()"""
+        return self._get_spec_sources_list(self.raw_sources)
+
+    @LazyAttribute
+    def patches(self):
+        """Applied and not applied patches, see _get_initial_patches_list()"""
+        return self._get_initial_patches_list()
 
     ###########################
     # SOURCES RELATED METHODS #
     ###########################
 
     @staticmethod
-    def _get_spec_sources_list(spec_object):
+    def _get_spec_sources_list(sources):
         """
-        Method uses RPM API to get list of Sources from the SPEC file and returns the list of sources. If the Source
+        Method gets list of Sources obtained from the SPEC file using RPM API. If the Source
         contains URL, the URL will be included in the list. This means no modifications of Sources are done at this
         point.
 
-        :param spec_object: instance of rpm.spec object
-        :type spec_object: rpm.spec
+        :param sources: sources of rpm.spec object
+        :type sources: list
         :return: list of Sources in SPEC file in the exact order as they are listed in SPEC file.
         :rtype: list
         """
         # the sources list returned by RPM API contains list of items (path, index, source_type).
         # source type "1" is a regular source
-        regular_sources = [source[:2] for source in spec_object.sources if source[2] == 1]
+        regular_sources = [source[:2] for source in sources if source[2] == 1]
         regular_sources = [source[0] for source in sorted(regular_sources, key=itemgetter(1))]
         return regular_sources
 
@@ -339,8 +991,10 @@ class SpecFile(object):
         source_re_str = r'^Source0?\s*:\s*(.*?)$' if source_num == 0 else r'^Source{0}\s*:\s*(.*?)$'.format(source_num)
         source_re = re.compile(source_re_str)
 
-        for line in self.spec_content.sections['%package']:
-            match = source_re.search(line)
+        section = self.spec_content.sections['%package']
+        tags = ['Source', 'Source0'] if source_num == 0 else ['Source{}'.format(source_num)]
+        for index in sorted(i for t in tags for i in section.find_tag(t)):
+            match = source_re.search(section[index])
             if match:
                 return match.group(1)
 
@@ -352,7 +1006,7 @@ class SpecFile(object):
         """Method returns a list of patches from a spec file"""
         patches_applied = []
         patches_not_used = []
-        patches_list = [p for p in self.spc.sources if p[2] == 2]
+        patches_list = [p for p in self.raw_sources if p[2] == 2]
         strip_options = self._get_patch_strip_options(patches_list)
 
         for filename, num, _ in patches_list:
@@ -443,33 +1097,36 @@ class SpecFile(object):
         if '%prep' not in self.spec_content.sections:
             return
 
-        i = 0
-        while i < len(self.spec_content.sections['%prep']):
-            line = self.spec_content.sections['%prep'][i]
-            if line.startswith('%patch'):
-                for num in reversed(comment_out):
-                    if line.startswith('%patch{}'.format(num)):
-                        if disable_inapplicable_patches:
-                            self.spec_content.sections['%prep'][i] = '#%{}'.format(line)
-                        self.spec_content.sections['%prep'].insert(i, '# The following patch contains conflicts')
-                        comment_out.remove(num)
-                        i += 1
-                        break
-                for num in reversed(remove_patches):
-                    if line.startswith('%patch{}'.format(num)):
-                        del self.spec_content.sections['%prep'][i]
-                        remove_patches.remove(num)
-                        i -= 1
-                        break
-            i += 1
+        section = self.spec_content.sections['%prep']
+        # number of lines inserted above the currently processed one, negative if removed
+        offset = 0
+        for i in section.find_directive('patch'):
+            i += offset
+            line = section[i]
+            if not line.startswith('%patch'):
+                continue
+            for num in reversed(comment_out):
+                if line.startswith('%patch{}'.format(num)):
+                    if disable_inapplicable_patches:
+                        section[i] = '#%{}'.format(line)
+                    section.insert(i, '# The following patch contains conflicts')
+                    comment_out.remove(num)
+                    i += 1
+                    offset += 1
+                    break
+            for num in reversed(remove_patches):
+                if line.startswith('%patch{}'.format(num)):
+                    del section[i]
+                    remove_patches.remove(num)
+                    offset -= 1
+                    break
 
     def update_paths_to_patches(self):
         # Fix paths in rebase_spec_file to patches to current directory
         rebased_sources_path = os.path.join(constants.RESULTS_DIR, constants.REBASED_SOURCES_DIR)
-        for index, line in enumerate(self.spec_content.sections['%package']):
-            if line.startswith('Patch'):
-                mod_line = re.sub(rebased_sources_path + os.path.sep, '', line)
-                self.spec_content.sections['%package'][index] = mod_line
+        section = self.spec_content.sections['%package']
+        for index in section.find_tags('Patch'):
+            section[index] = re.sub(rebased_sources_path + os.path.sep, '', section[index])
         self.save()
 
     def write_updated_patches(self, patches, disable_inapplicable):
@@ -486,55 +1143,55 @@ class SpecFile(object):
         inapplicable_patches = []
         modified_patches = []
 
-        i = 0
-        while i < len(self.spec_content.sections['%package']):
-            line = self.spec_content.sections['%package'][i]
-            if line.startswith('Patch'):
-                fields = line.strip().split()
-                patch_name = fields[1]
-                patch_num = self._get_patch_number(fields)
-                # We check if patch is mentioned in SPEC file but not used.
-                # We comment out the patch
-                check_not_applied = [x for x in self.get_not_used_patches() if
-                                     int(x.get_index()) == int(patch_num)]
-
-                if 'deleted' in patches:
-                    patch_removed = [x for x in patches['deleted'] if patch_name in x]
-                else:
-                    patch_removed = None
-                if 'inapplicable' in patches:
-                    patch_inapplicable = [x for x in patches['inapplicable'] if patch_name in x]
-                else:
-                    patch_inapplicable = None
-
-                if patch_removed or check_not_applied:
-                    # remove the line of the patch that was removed
-                    self.removed_patches.append(patch_name)
-                    removed_patches.append(patch_num)
-                    # find associated comments
-                    j = i
-                    while j > 0 and is_comment(self.spec_content.sections['%package'][j - 1]):
-                        j -= 1
-                    del self.spec_content.sections['%package'][j: i+1]
-                    i = j
-                    continue
+        section = self.spec_content.sections['%package']
+        # number of lines removed above the currently processed one
+        offset = 0
+        for i in section.find_tags('Patch'):
+            i -= offset
+            line = section[i]
+            fields = line.strip().split()
+            patch_name = fields[1]
+            patch_num = self._get_patch_number(fields)
+            # We check if patch is mentioned in SPEC file but not used.
+            # We comment out the patch
+            check_not_applied = [x for x in self.get_not_used_patches() if
+                                 int(x.get_index()) == int(patch_num)]
+
+            if 'deleted' in patches:
+                patch_removed = [x for x in patches['deleted'] if patch_name in x]
+            else:
+                patch_removed = None
+            if 'inapplicable' in patches:
+                patch_inapplicable = [x for x in patches['inapplicable'] if patch_name in x]
+            else:
+                patch_inapplicable = None
+
+            if patch_removed or check_not_applied:
+                # remove the line of the patch that was removed
+                self.removed_patches.append(patch_name)
+                removed_patches.append(patch_num)
+                # find associated comments
+                j = i
+                while j > 0 and is_comment(section[j - 1]):
+                    j -= 1
+                del section[j: i+1]
+                offset += i + 1 - j
+                continue
 
-                if patch_inapplicable:
-                    if disable_inapplicable:
-                        # comment out line if the patch was not applied
-                        self.spec_content.sections['%package'][i] = '#{0} {1}'.format(' '.join(fields[:-1]),
-                                                                                      os.path.basename(patch_name))
-                    inapplicable_patches.append(patch_num)
+            if patch_inapplicable:
+                if disable_inapplicable:
+                    # comment out line if the patch was not applied
+                    section[i] = '#{0} {1}'.format(' '.join(fields[:-1]), os.path.basename(patch_name))
+                inapplicable_patches.append(patch_num)
 
-                if 'modified' in patches:
-                    patch = [x for x in patches['modified'] if patch_name in x]
-                else:
-                    patch = None
-                if patch:
-                    fields[1] = os.path.join(constants.RESULTS_DIR, constants.REBASED_SOURCES_DIR, patch_name)
-                    self.spec_content.sections['%package'][i] = ' '.join(fields)
-                    modified_patches.append(patch_num)
-            i += 1
+            if 'modified' in patches:
+                patch = [x for x in patches['modified'] if patch_name in x]
+            else:
+                patch = None
+            if patch:
+                fields[1] = os.path.join(constants.RESULTS_DIR, constants.REBASED_SOURCES_DIR, patch_name)
+                section[i] = ' '.join(fields)
+                modified_patches.append(patch_num)
 
         self._process_patches(inapplicable_patches, removed_patches, disable_inapplicable)
 
@@ -554,7 +1211,7 @@ class SpecFile(object):
 
         :return:
         """
-        return self.hdr[rpm.RPMTAG_EPOCHNUM]
+        return self.header['epoch']
 
     def get_release(self):
         """
@@ -562,7 +1219,7 @@ class SpecFile(object):
 
         :return:
         """
-        return self.hdr[rpm.RPMTAG_RELEASE].decode(constants.DEFENC) if six.PY3 else self.hdr[rpm.RPMTAG_RELEASE]
+        return self.header['release']
 
     def get_release_number(self):
         """
@@ -582,7 +1239,7 @@ class SpecFile(object):
 
         :return:
         """
-        return self.hdr[rpm.RPMTAG_VERSION].decode(constants.DEFENC) if six.PY3 else self.hdr[rpm.RPMTAG_VERSION]
+        return self.header['version']
 
     def get_extra_version(self):
         """
@@ -629,13 +1286,15 @@ class SpecFile(object):
         :return:
         """
         release = '{}.{}%{{?dist}}'.format(self.get_release_number(), macro)
-        for index, line in enumerate(self.spec_content.sections['%package']):
+        section = self.spec_content.sections['%package']
+        for index in section.find_tag('Release'):
+            line = section[index]
             if line.startswith('Release:'):
                 logger.verbose("Commenting out original Release line '%s'", line.strip())
-                self.spec_content.sections['%package'][index] = '#{0}'.format(line)
+                section[index] = '#{0}'.format(line)
                 line = 'Release: {}'.format(release)
                 logger.verbose("Inserting new Release line '%s'", line)
-                self.spec_content.sections['%package'].insert(index + 1, line)
+                section.insert(index + 1, line)
                 self.save()
                 break
 
@@ -648,20 +1307,19 @@ class SpecFile(object):
         """
         search_re = re.compile(r'^Release\s*:\s*[0-9.]*[0-9]+\.{0}%{{\?dist}}\s*'.format(macro))
 
-        for index, line in enumerate(self.spec_content.sections['%package']):
+        section = self.spec_content.sections['%package']
+        for index in section.find_tag('Release'):
+            line = section[index]
             match = search_re.search(line)
             if match:
                 # We will uncomment old line, so sanity check first
-                if not self.spec_content.sections['%package'][index - 1].startswith('#Release:'):
+                if not section[index - 1].startswith('#Release:'):
                     raise RebaseHelperError("Redefined Release line in SPEC is not 'commented out' "
-                                            "old line: '{0}'"
-                                            .format(self.spec_content.sections['%package'][index - 1].strip()))
-                logger.verbose("Uncommenting original Release line "
-                               "'%s'", self.spec_content.sections['%package'][index - 1].strip())
-                self.spec_content.sections['%package'][index - 1] = self.spec_content.sections[
-                    '%package'][index - 1].lstrip('#')
+                                            "old line: '{0}'".format(section[index - 1].strip()))
+                logger.verbose("Uncommenting original Release line '%s'", section[index - 1].strip())
+                section[index - 1] = section[index - 1].lstrip('#')
                 logger.verbose("Removing redefined Release line '%s'", line.strip())
-                self.spec_content.sections['%package'].pop(index)
+                section.pop(index)
                 self.save()
                 break
 
@@ -685,8 +1343,9 @@ class SpecFile(object):
         logger.verbose("Updating extra version in SPEC to '%s'", extra_version)
 
         #  try to find existing extra version definition
-        for index, line in enumerate(self.spec_content.sections['%package']):
-            match = extra_version_re.search(line)
+        section = self.spec_content.sections['%package']
+        for index in section.find_macro_definition('REBASE_EXTRA_VER'):
+            match = extra_version_re.search(section[index])
             if match:
                 extra_version_line_index = index
                 break
@@ -709,11 +1368,13 @@ class SpecFile(object):
 
                 # change the Source0 definition
                 source0_re = re.compile(r'^Source0?\s*:.+')
-                for index, line in enumerate(self.spec_content.sections['%package']):
+                section = self.spec_content.sections['%package']
+                for index in sorted(section.find_tag('Source') + section.find_tag('Source0')):
+                    line = section[index]
                     if source0_re.search(line):
                         # comment out the original Source0 line
                         logger.verbose("Commenting out original Source0 line '%s'", line.strip())
-                        self.spec_content.sections['%package'][index] = '#{0}'.format(line)
+                        section[index] = '#{0}'.format(line)
                         # construct new Source0 line. The idea is that we use the expanded archive name to create
                         # new Source0. We used raw original Source0 before, but it didn't work reliably.
                         source0_raw = line
@@ -732,7 +1393,7 @@ class SpecFile(object):
                         new_source0_line = source0_raw.replace(os.path.basename(source0_raw),
                                                                new_basename_with_macro)
                         logger.verbose("Inserting new Source0 line '%s'", new_source0_line)
-                        self.spec_content.sections['%package'].insert(index + 1, new_source0_line)
+                        section.insert(index + 1, new_source0_line)
                         break
         else:
             # set the Release to 1 and revert the redefined Release with macro if needed
@@ -774,68 +1435,46 @@ class SpecFile(object):
 
     def set_tag(self, tag, value, preserve_macros=False):
         """Sets value of a tag while trying to preserve macros if requested"""
-        macro_def_re = re.compile(
-            r'''
-            ^
-            (?P<cond>%{!?\?\w+:\s*)?
-            (?(cond)%global|%(global|define))
-            \s+
-            (?P<name>\w+)
-            (?P<options>\(.+?\))?
-            \s+
-            (?P<value>
-                (%((?P<b>{)|(?P<s>\()))?
-                .+?
-                (?(b)})(?(s)\))
-            )
-            (?(cond)})
-            $
-            ''',
-            re.VERBOSE | re.MULTILINE | re.DOTALL)
+        definitions = MacroDefinitions(self.spec_content.sections['%package']) if preserve_macros else None
+        expanded_values = {}
+        redefined = []
 
         def _get_macro_value(macro):
             """Returns raw value of a macro"""
-            for match in macro_def_re.finditer('\n'.join(self.spec_content.sections['%package'])):
-                if match.group('name') == macro:
-                    return match.group('value')
-            return None
+            return definitions.get_value(macro)
 
         def _redefine_macro(macro, value):
             """Replaces value of an existing macro"""
-            content = '\n'.join(self.spec_content.sections['%package'])
-            for match in macro_def_re.finditer(content):
-                if match.group('name') != macro:
-                    continue
-                content = content[:match.start('value')] + value + content[match.end('value'):]
-                if match.group('options'):
-                    content = content[:match.start('options')] + content[match.end('options'):]
-                break
-            self.spec_content.sections['%package'] = content.split('\n')
+            definitions.redefine(macro, value)
+            expanded_values.clear()
+            redefined.append(macro)
+
+        def _save_redefinitions():
+            """Writes redefined macros to the SPEC file, updating rpm context"""
+            if not redefined:
+                return
+            self.spec_content.sections['%package'] = definitions.get_lines()
             self.save()
+            del redefined[:]
 
         def _find_macros(s):
             """Returns all redefinable macros present in a string"""
-            macro_re = re.compile(r'%(?P<brace>{\??)?(?P<name>\w+)(?(brace)})')
-            macros = []
-            for match in macro_def_re.finditer('\n'.join(self.spec_content.sections['%package'])):
-                macros.append(match.group('name'))
-            result = []
-            for match in macro_re.finditer(s):
-                if not match:
-                    continue
-                if match.group('name') not in macros:
-                    continue
-                result.append((match.group('name'), match.span()))
-            return result
+            return definitions.find_references(s)
 
-        def _expand_macros(s):
+        def _expand_macro(macro):
+            """Returns value of a macro with redefinable macros containing redefinable macros expanded"""
+            if macro not in expanded_values:
+                value = _get_macro_value(macro)
+                expanded_values[macro] = _expand_macros(value, definitions.get_dependencies(macro)) if value else None
+            return expanded_values[macro]
+
+        def _expand_macros(s, macros=None):
             """Expands all redefinable macros containing redefinable macros"""
             replace = []
-            for macro, span in _find_macros(s):
-                value = _get_macro_value(macro)
-                if not value:
+            for macro, span in _find_macros(s) if macros is None else macros:
+                rep = _expand_macro(macro)
+                if not rep:
                     continue
-                rep = _expand_macros(value)
                 if _find_macros(rep):
                     replace.append((rep, span))
             for rep, span in reversed(replace):
@@ -937,10 +1576,10 @@ class SpecFile(object):
             for macro in macros:
                 m = '%{{{}}}'.format(macro)
                 while MacroHelper.expand(m, m) != m:
-                    rpm.delMacro(macro)
+                    MacroHelper.del_macro(macro)
                 value = _get_macro_value(macro)
                 if value and MacroHelper.expand(value):
-                    rpm.addMacro(macro, value)
+                    MacroHelper.add_macro(macro, value)
 
         def _process_value(curval, newval):
             """
@@ -1019,6 +1658,7 @@ class SpecFile(object):
                 else:
                     tokens[index] = values[index]
             result = ''.join(tokens)
+            _save_redefinitions()
             _sync_macros(curval + result)
             # only change value if necessary
             if MacroHelper.expand(curval) == MacroHelper.expand(result):
@@ -1026,18 +1666,21 @@ class SpecFile(object):
             return result
 
         tag_re = re.compile(r'^(?P<name>\w+)\s*:\s*(?P<value>.+)$')
-        for index, line in enumerate(self.spec_content.sections['%package']):
-            match = tag_re.match(line)
-            if not match:
-                continue
-            if match.group('name') != tag:
-                continue
-            if preserve_macros:
-                value = _process_value(match.group('value'), value)
-            new_line = line[:match.start('value')] + value + line[match.end('value'):]
-            self.spec_content.sections['%package'][index] = new_line
-            break
-        self.save()
+        # macros are redefined and expanded in several steps, keep macro context consistent
+        with MacroHelper.lock:
+            for index in self.spec_content.sections['%package'].find_tag(tag):
+                line = self.spec_content.sections['%package'][index]
+                match = tag_re.match(line)
+                if not match:
+                    continue
+                if match.group('name') != tag:
+                    continue
+                if preserve_macros:
+                    value = _process_value(match.group('value'), value)
+                new_line = line[:match.start('value')] + value + line[match.end('value'):]
+                self.spec_content.sections['%package'][index] = new_line
+                break
+            self.save()
 
     def set_version(self, version):
         """
@@ -1191,27 +1834,49 @@ class SpecFile(object):
         except IOError:
             raise RebaseHelperError("Unable to open and read SPEC file '%s'" % self.path)
         self.spec_content = SpecContent(content)
+        self._saved_content = content
 
     def _write_spec_file_to_disc(self):
         """Write the current SPEC file to the disc"""
         logger.verbose("Writing SPEC file '%s' to the disc", self.path)
+        content = str(self.spec_content)
         try:
             with open(self.path, "w") as f:
-                f.write(str(self.spec_content))
+                f.write(content)
         except IOError:
             raise RebaseHelperError("Unable to write updated data to SPEC file '%s'" % self.path)
+        self._saved_content = content
 
     def copy(self, new_path=None):
         """
         Create a copy of the current object and copy the SPEC file the new object
         represents to a new location.
 
+        If the content of the current object is the same as on the disc, the copy
+        reuses already parsed data instead of parsing the copied SPEC file again
+        and shares content of sections with the current object until they are accessed.
+        Data of the copy are refreshed by librpm only when it is saved.
+
         :param new_path: new path to which to copy the SPEC file
         :return: copy of the current object
         """
         if new_path:
             shutil.copy(self.path, new_path)
-        new_object = SpecFile(new_path, self.changelog_entry, self.sources_location, self.download)
+        if str(self.spec_content) != self._saved_content:
+            # unsaved changes, the copy has to be created from the copied file
+            return SpecFile(new_path, self.changelog_entry, self.sources_location, self.download)
+        new_object = SpecFile.__new__(SpecFile)
+        new_object.__dict__.update(self.__dict__)
+        new_object.path = new_path or self.path
+        new_object.spec_content = self.spec_content.copy()
+        new_object.spc = None
+        new_object.removed_patches = []
+        new_object.raw_sources = list(self.raw_sources)
+        new_object.header = dict(self.header)
+        if 'sources' in self.__dict__:
+            new_object.sources = list(self.sources)
+        if 'patches' in self.__dict__:
+            new_object.patches = {k: [copy.copy(p) for p in v] for k, v in six.iteritems(self.patches)}
         return new_object
 
     def save(self):
@@ -1257,7 +1922,7 @@ class SpecFile(object):
 
         :return:
         """
-        return self.hdr[rpm.RPMTAG_NAME].decode(constants.DEFENC) if six.PY3 else self.hdr[rpm.RPMTAG_NAME]
+        return self.header['name']
 
     def get_requires(self):
         """
@@ -1265,7 +1930,7 @@ class SpecFile(object):
 
         :return:
         """
-        return [r.decode(constants.DEFENC) if six.PY3 else r for r in self.hdr[rpm.RPMTAG_REQUIRES]]
+        return list(self.header['requires'])
 
     def get_new_log(self):
         new_record = []
@@ -1357,7 +2022,7 @@ class SpecFile(object):
                     new_dirname = dirname
 
                     # get %{name} and %{version} macros
-                    macros = [m for m in MacroHelper.filter(self.macros, level=-3) if m['name'] in ('name', 'version')]
+                    macros = [m for n in ('name', 'version') for m in MacroHelper.filter(self.macros, name=n, level=-3)]
                     # add all macros from spec file scope
                     macros.extend(MacroHelper.filter(self.macros, level=0))
                     # ensure maximal greediness
@@ -1475,7 +2140,7 @@ class SpecHooksRunner(object):
         return list(self.spec_hooks)
 
     def get_available_spec_hooks(self):
-        return [k for k, v in six.iteritems(self.spec_hooks) if v]
+        return self.spec_hooks.get_available()
 
     def run_spec_hooks(self, spec_file, rebase_spec_file, **kwargs):
         """
@@ -1493,7 +2158,8 @@ class SpecHooksRunner(object):
             categories = spec_hook.CATEGORIES
             if not categories or spec_file.category in categories:
                 logger.info("Running '%s' spec hook", name)
-                spec_hook.run(spec_file, rebase_spec_file, **kwargs)
+                with TimingHelper.measure('hooks', name, type='spec'):
+                    spec_hook.run(spec_file, rebase_spec_file, **kwargs)
 
 
 # Global instance of SpecHooksRunner. It is enough to load it once per application run.
@@ -25,6 +25,7 @@ import os
 from rebasehelper.logger import logger
 from rebasehelper.build_helper import SRPMBuildToolBase, SourcePackageBuildError, MockTemporaryEnvironment
 from rebasehelper.helpers.path_helper import PathHelper
+from rebasehelper.helpers.build_cache_helper import BuildCacheHelper
 from rebasehelper.helpers.process_helper import ProcessHelper
 
 
@@ -33,6 +34,10 @@ class MockSRPMBuildTool(SRPMBuildToolBase):
     CMD = "mock"
     logs = []
 
+    @classmethod
+    def get_build_environment(cls, **kwargs):
+        return BuildCacheHelper.get_mock_config(cls.get_srpm_builder_options(**kwargs))
+
     @classmethod
     def _build_srpm(cls, spec, workdir, results_dir, srpm_results_dir, srpm_builder_options):
         """
@@ -78,8 +83,9 @@ class MockSRPMBuildTool(SRPMBuildToolBase):
         else:
             logfile = root_log_path
         logs = [l for l in PathHelper.find_all_files(results_dir, '*.log')]
-        cls.logs = [os.path.join(srpm_results_dir, os.path.basename(l)) for l in logs]
-        raise SourcePackageBuildError("Building SRPM failed!", logfile=logfile)
+        logs = [os.path.join(srpm_results_dir, os.path.basename(l)) for l in logs]
+        cls.logs = logs
+        raise SourcePackageBuildError("Building SRPM failed!", logfile=logfile, logs=logs)
 
     @classmethod
     def build(cls, spec, results_dir, **kwargs):
@@ -31,6 +31,8 @@ from rebasehelper.helpers.process_helper import ProcessHelper
 class RpmbuildSRPMBuildTool(SRPMBuildToolBase):
 
     DEFAULT = True
+    # every build runs in its own temporary rpmbuild tree
+    PARALLEL_SAFE = True
 
     CMD = "rpmbuild"
     logs = []
@@ -69,8 +71,9 @@ class RpmbuildSRPMBuildTool(SRPMBuildToolBase):
         # An error occurred, raise an exception
         logfile = build_log_path
         logs = [l for l in PathHelper.find_all_files(results_dir, '*.log')]
-        cls.logs = [os.path.join(srpm_results_dir, os.path.basename(l)) for l in logs]
-        raise SourcePackageBuildError("Building SRPM failed!", logfile=logfile)
+        logs = [os.path.join(srpm_results_dir, os.path.basename(l)) for l in logs]
+        cls.logs = logs
+        raise SourcePackageBuildError("Building SRPM failed!", logfile=logfile, logs=logs)
 
     @classmethod
     def build(cls, spec, results_dir, **kwargs):
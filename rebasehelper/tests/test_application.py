@@ -20,13 +20,21 @@
 # Authors: Petr Hracek <phracek@redhat.com>
 #          Tomas Hozza <thozza@redhat.com>
 
+import json
 import os
 
 import pytest
 
-from rebasehelper.cli import CLI
+from rebasehelper.cli import CLI, CliHelper
 from rebasehelper.config import Config
 from rebasehelper.application import Application
+from rebasehelper.build_log_hook import build_log_hook_runner
+from rebasehelper.build_helper import build_helper, srpm_build_helper, BuildToolBase
+from rebasehelper.checker import checkers_runner
+from rebasehelper.exceptions import RebaseHelperError
+from rebasehelper.results_store import results_store, ResultsStore
+from rebasehelper.helpers.parallel_helper import ParallelHelper
+from rebasehelper.helpers.source_cache_helper import SourceCacheHelper
 from rebasehelper import constants
 
 
@@ -61,6 +69,10 @@ class TestApplication(object):
 
     cmd_line_args = ['--not-download-sources', '1.0.3']
 
+    @pytest.fixture(autouse=True)
+    def cache(self, workdir, monkeypatch):
+        monkeypatch.setenv('XDG_CACHE_HOME', os.path.join(workdir, 'cache'))
+
     def test_application_sources(self, workdir):
         expected_dict = {
             'new': {
@@ -145,3 +157,279 @@ class TestApplication(object):
         Application._update_gitignore(sources, workdir)  # pylint: disable=protected-access
         with open(os.path.join(workdir, '.gitignore')) as f:
             assert f.readlines() == result
+
+    @pytest.mark.parametrize('workers', [None, 1])
+    def test_prepare_sources_extraction_workers(self, workdir, workers):
+        cli = CLI(self.cmd_line_args + (['--extraction-workers', str(workers)] if workers else []))
+        config = Config()
+        config.merge(cli)
+        execution_dir, results_dir, debug_log_file = Application.setup(config)
+        app = Application(config, execution_dir, results_dir, debug_log_file)
+        sources = app.prepare_sources()
+        # temporary extraction directories are removed
+        assert sorted(os.listdir(os.path.join(workdir, constants.WORKSPACE_DIR))) == \
+            sorted([constants.OLD_SOURCES_DIR, constants.NEW_SOURCES_DIR])
+        # rest of source archives are extracted to their targets
+        for sources_dir in sources:
+            assert os.path.isdir(os.path.join(sources_dir, 'misc'))
+
+    def test_prepare_sources_process_pool(self, workdir):
+        cli = CLI(self.cmd_line_args + ['--no-source-cache'])
+        config = Config()
+        config.merge(cli)
+        execution_dir, results_dir, debug_log_file = Application.setup(config)
+        app = Application(config, execution_dir, results_dir, debug_log_file)
+        ParallelHelper.start_process_pool(2)
+        try:
+            sources = app.prepare_sources()
+        finally:
+            ParallelHelper.stop_process_pool()
+        for sources_dir in sources:
+            assert os.path.isdir(os.path.join(sources_dir, 'misc'))
+
+    def test_prepare_sources_cache_eviction(self, workdir, monkeypatch):
+        events = []
+        lookup = SourceCacheHelper.lookup
+
+        def lookup_wrapper(cls, *args, **kwargs):
+            result = lookup(*args, **kwargs)
+            events.append('lookup')
+            return result
+
+        def evict_wrapper(cls, max_size):
+            events.append('evict')
+
+        monkeypatch.setattr(SourceCacheHelper, 'lookup', classmethod(lookup_wrapper))
+        monkeypatch.setattr(SourceCacheHelper, 'evict', classmethod(evict_wrapper))
+        cli = CLI(self.cmd_line_args)
+        config = Config()
+        config.merge(cli)
+        execution_dir, results_dir, debug_log_file = Application.setup(config)
+        app = Application(config, execution_dir, results_dir, debug_log_file)
+        app.prepare_sources()
+        # the cache is evicted once, when no extraction is materializing a cached tree
+        assert events.count('evict') == 1
+        assert events[-1] == 'evict'
+        assert 'lookup' in events
+
+    def test_prepare_sources_batch(self, workdir, monkeypatch):
+        prepared = os.path.join(workdir, 'prepared.json')
+        prepare_sources = Application.prepare_sources
+
+        def prepare_sources_wrapper(app):
+            sources = prepare_sources(app)
+            with open(prepared, 'w') as f:
+                # the workspace is removed when the rebase finishes
+                json.dump([os.path.isdir(os.path.join(s, 'misc')) for s in sources], f)
+            return sources
+
+        # the wrapper is inherited by the forked batch worker
+        monkeypatch.setattr(Application, 'prepare_sources', prepare_sources_wrapper)
+        summary = os.path.join(workdir, 'summary.json')
+        # packages are rebased in daemonic processes, which can't start the process pool
+        CliHelper.run_batch([workdir, '--workers', '1', '--summary', summary, '--'] +
+                            self.cmd_line_args + ['--patch-only'])
+        with open(summary) as f:
+            message = json.load(f)['packages'][0].get('message') or ''
+        assert 'daemonic' not in message
+        with open(prepared) as f:
+            # rest of source archives are extracted to their targets
+            assert json.load(f) == [True, True]
+
+    def test_prepare_sources_cache(self, workdir):
+        trees = []
+        for _ in range(2):
+            cli = CLI(self.cmd_line_args)
+            config = Config()
+            config.merge(cli)
+            execution_dir, results_dir, debug_log_file = Application.setup(config)
+            app = Application(config, execution_dir, results_dir, debug_log_file)
+            stats = SourceCacheHelper.get_stats()
+            sources = app.prepare_sources()
+            trees.append(sorted(os.path.relpath(os.path.join(root, name), workdir)
+                                for sources_dir in sources
+                                for root, dirs, files in os.walk(sources_dir)
+                                for name in dirs + files))
+        # the second run materializes all archives from the cache
+        assert SourceCacheHelper.get_stats()['misses'] == stats['misses']
+        assert SourceCacheHelper.get_stats()['hits'] > stats['hits']
+        assert trees[0] == trees[1]
+
+    @pytest.mark.parametrize('log, result', [
+        ('RPM build errors:\n    File not found: /builddir/build/BUILDROOT/test-1.0.3-1.x86_64/usr/bin/test\n', True),
+        ('BUILDSTDERR: error: Installed (but unpackaged) file(s) found:\nBUILDSTDERR:    /usr/bin/test\n', True),
+        ('error: Bad exit status from /var/tmp/rpm-tmp.1234 (%build)\n', False),
+        (None, False),
+    ], ids=[
+        'missing',
+        'unpackaged',
+        'build',
+        'no-log',
+    ])
+    def test_build_failed_in_files(self, workdir, log, result):
+        if log is not None:
+            os.makedirs(os.path.join(workdir, 'new-build', 'RPM'))
+            with open(os.path.join(workdir, 'new-build', 'RPM', 'build.log'), 'w') as f:
+                f.write(log)
+        assert Application._build_failed_in_files(workdir) == result  # pylint: disable=protected-access
+
+    @pytest.mark.parametrize('log, section, result', [
+        ('File not found: /usr/bin/test\n', '%files', True),
+        ('File not found: /usr/bin/test\n', '%install', False),
+        ('error: Bad exit status from /var/tmp/rpm-tmp.1234 (%build)\n', '%files', False),
+    ], ids=[
+        'files-failure-files-changed',
+        'files-failure-install-changed',
+        'build-failure-files-changed',
+    ])
+    def test_prepare_next_run_incremental(self, workdir, monkeypatch, log, section, result):
+        cli = CLI(self.cmd_line_args + ['--non-interactive', '--incremental-rebuilds'])
+        config = Config()
+        config.merge(cli)
+        execution_dir, results_dir, debug_log_file = Application.setup(config)
+        app = Application(config, execution_dir, results_dir, debug_log_file)
+        results_store.set_build_data('new', {'binary_package_build_error': 'Building RPMs failed!'})
+        os.makedirs(os.path.join(results_dir, 'new-build', 'RPM'))
+        with open(os.path.join(results_dir, 'new-build', 'RPM', 'build.log'), 'w') as f:
+            f.write(log)
+
+        def run_hooks(spec_file, rebase_spec_file, **kwargs):
+            rebase_spec_file.spec_content.sections[section].append('# changed by build log hook')
+            return True
+
+        monkeypatch.setattr(build_log_hook_runner, 'run', run_hooks)
+        assert app.prepare_next_run(results_dir)
+        assert app.incremental_build == result
+        assert not os.path.exists(os.path.join(results_dir, 'new-build'))
+
+    @pytest.mark.parametrize('old_build, reused', [
+        (dict(srpm='test-1.0.2-1.src.rpm', rpm=['test-1.0.2-1.x86_64.rpm'], logs=['build.log']), True),
+        (dict(srpm='test-1.0.2-1.src.rpm', logs=['build.log'], binary_package_build_error='Building RPMs failed!'),
+         False),
+    ], ids=[
+        'old-build-succeeded',
+        'old-build-failed',
+    ])
+    def test_prepare_next_run_reuse_old_build(self, workdir, monkeypatch, old_build, reused):
+        cli = CLI(self.cmd_line_args + ['--non-interactive'])
+        config = Config()
+        config.merge(cli)
+        execution_dir, results_dir, debug_log_file = Application.setup(config)
+        app = Application(config, execution_dir, results_dir, debug_log_file)
+        store = ResultsStore()
+        monkeypatch.setattr('rebasehelper.application.results_store', store)
+        store.set_build_data('old', old_build)
+        store.set_build_data('new', dict(srpm='test-1.0.3-1.src.rpm', logs=['build.log'],
+                                         binary_package_build_error='Building RPMs failed!'))
+        for version in ['old', 'new']:
+            os.makedirs(os.path.join(results_dir, '{}-build'.format(version), 'RPM'))
+
+        def run_hooks(spec_file, rebase_spec_file, **kwargs):
+            rebase_spec_file.spec_content.sections['%build'].append('# changed by build log hook')
+            return True
+
+        monkeypatch.setattr(build_log_hook_runner, 'run', run_hooks)
+        assert app.prepare_next_run(results_dir)
+        assert app.reuse_old_build == reused
+        # results of the old version build are kept only if they are going to be reused
+        assert os.path.exists(os.path.join(results_dir, 'old-build')) == reused
+        assert not os.path.exists(os.path.join(results_dir, 'new-build'))
+        versions = app._get_versions_to_build()  # pylint: disable=protected-access
+        assert versions == (['new'] if reused else ['old', 'new'])
+
+        class SRPMBuildTool(object):
+            PARALLEL_SAFE = False
+
+        built = []
+
+        def build_source_package(builder, version):
+            built.append(version)
+            return dict(srpm='{}.src.rpm'.format(version)), None
+
+        monkeypatch.setattr(srpm_build_helper, 'get_tool', lambda tool: SRPMBuildTool)
+        monkeypatch.setattr(app, '_build_source_package', build_source_package)
+        app.build_source_packages()
+        assert built == versions
+        assert store.get_new_build() == dict(srpm='new.src.rpm')
+        if reused:
+            assert store.get_old_build() == old_build
+        else:
+            assert store.get_old_build() == dict(srpm='old.src.rpm')
+
+    @pytest.mark.parametrize('category, incremental, marked', [
+        ('RPM', True, True),
+        ('RPM', False, False),
+        ('SRPM', True, False),
+    ], ids=[
+        'rpm-incremental',
+        'rpm-full',
+        'srpm-incremental',
+    ])
+    def test_run_package_checkers_incremental(self, workdir, monkeypatch, category, incremental, marked):
+        cli = CLI(self.cmd_line_args + ['--non-interactive'])
+        config = Config()
+        config.merge(cli)
+        execution_dir, results_dir, debug_log_file = Application.setup(config)
+        app = Application(config, execution_dir, results_dir, debug_log_file)
+        store = ResultsStore()
+        monkeypatch.setattr('rebasehelper.application.results_store', store)
+        store.set_build_data('new', dict(rpm=['test-1.0.3-1.x86_64.rpm'], incremental=incremental))
+        monkeypatch.setattr(checkers_runner, 'run_checkers',
+                            lambda results_dir, checker_names, **kwargs: [('rpmdiff', dict(path='rpmdiff'))])
+        app.run_package_checkers(results_dir, category=category)
+        # results of checkers comparing short-circuited packages are marked
+        expected = dict(path='rpmdiff', incremental=True) if marked else dict(path='rpmdiff')
+        assert store.get_checkers() == dict(rpmdiff=expected)
+
+    @pytest.mark.parametrize('buildtool, args, error', [
+        ('unsafe', ['--parallel-builds'], '--parallel-builds can be used only with the following build tools'),
+        ('unsafe', ['--parallel-builds', '--build-cpu-split', '2,2'],
+         '--parallel-builds and --build-cpu-split can be used only with the following build tools'),
+        ('safe', ['--build-cpu-split', '2,2'], '--build-cpu-split can be used only with: --parallel-builds'),
+        ('safe', ['--parallel-builds', '--build-cpu-split', '2'], '--build-cpu-split requires two positive numbers'),
+        ('safe', ['--parallel-builds', '--build-cpu-split', '2,2,2'],
+         '--build-cpu-split requires two positive numbers'),
+        ('safe', ['--parallel-builds', '--build-cpu-split', '0,2'], '--build-cpu-split requires two positive numbers'),
+        ('safe', ['--parallel-builds', '--build-cpu-split', 'a,b'], '--build-cpu-split requires two positive numbers'),
+    ], ids=[
+        'parallel-builds-unsafe-tool',
+        'build-cpu-split-unsafe-tool',
+        'build-cpu-split-without-parallel-builds',
+        'build-cpu-split-single',
+        'build-cpu-split-three',
+        'build-cpu-split-zero',
+        'build-cpu-split-not-numbers',
+    ])
+    def test_parallel_builds_options(self, workdir, monkeypatch, buildtool, args, error):
+        class SafeTool(BuildToolBase):  # pylint: disable=abstract-method
+            PARALLEL_SAFE = True
+
+        class UnsafeTool(BuildToolBase):  # pylint: disable=abstract-method
+            PARALLEL_SAFE = False
+
+        cli = CLI(self.cmd_line_args + args)
+        config = Config()
+        config.merge(cli)
+        monkeypatch.setattr(build_helper, 'build_tools', {'safe': SafeTool, 'unsafe': UnsafeTool})
+        config.config['buildtool'] = buildtool
+        execution_dir, results_dir, debug_log_file = Application.setup(config)
+        app = Application(config, execution_dir, results_dir, debug_log_file)
+        with pytest.raises(RebaseHelperError) as excinfo:
+            app.run()
+        assert excinfo.value.msg.startswith(error)
+
+    @pytest.mark.parametrize('args, result', [
+        (['--build-cpu-split', '1,3'], [1, 3]),
+        ([], None),
+    ], ids=[
+        'specified',
+        'default',
+    ])
+    def test_get_build_cpu_split(self, workdir, monkeypatch, args, result):
+        monkeypatch.setattr('multiprocessing.cpu_count', lambda: 5)
+        cli = CLI(self.cmd_line_args + ['--parallel-builds'] + args)
+        config = Config()
+        config.merge(cli)
+        execution_dir, results_dir, debug_log_file = Application.setup(config)
+        app = Application(config, execution_dir, results_dir, debug_log_file)
+        assert app._get_build_cpu_split() == (result or [2, 3])  # pylint: disable=protected-access
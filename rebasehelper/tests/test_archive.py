@@ -20,11 +20,18 @@
 # Authors: Petr Hracek <phracek@redhat.com>
 #          Tomas Hozza <thozza@redhat.com>
 
+import io
 import os
+import random
+import subprocess
+import tarfile
+import time
 
 import pytest
 
-from rebasehelper.archive import Archive
+from rebasehelper.archive import (Archive, Bz2ArchiveType, SevenZipArchiveType, TarBz2ArchiveType, TarLzArchiveType,
+                                  TarXzArchiveType, TarZstArchiveType, ZipArchiveType)
+from rebasehelper.helpers.path_helper import PathHelper
 
 
 class TestArchive(object):
@@ -33,6 +40,9 @@ class TestArchive(object):
     TAR_XZ = 'archive.tar.xz'
     TAR_BZ2 = 'archive.tar.bz2'
     ZIP = 'archive.zip'
+    TAR_ZST = 'archive.tar.zst'
+    TAR_LZ = 'archive.tar.lz'
+    SEVEN_ZIP = 'archive.7z'
     BZ2 = 'file.txt.bz2'
     INVALID_TAR_BZ2 = 'archive-invalid.tar.bz2'
     INVALID_TAR_XZ = 'archive-invalid.tar.xz'
@@ -48,6 +58,9 @@ class TestArchive(object):
         TAR_BZ2,
         BZ2,
         ZIP,
+        TAR_ZST,
+        TAR_LZ,
+        SEVEN_ZIP,
         INVALID_TAR_BZ2,
         INVALID_TAR_XZ,
     ]
@@ -55,6 +68,8 @@ class TestArchive(object):
     @pytest.fixture
     def extracted_archive(self, archive, workdir):
         a = Archive(archive)
+        if a.get_extraction_engine() is None:
+            pytest.skip('no extraction engine available')
         d = os.path.join(workdir, 'dir')
         a.extract_archive(d)
         return d
@@ -66,6 +81,9 @@ class TestArchive(object):
         TAR_BZ2,
         BZ2,
         ZIP,
+        TAR_ZST,
+        TAR_LZ,
+        SEVEN_ZIP,
     ], ids=[
         'tar.gz',
         'tgz',
@@ -73,6 +91,9 @@ class TestArchive(object):
         'tar.bz2',
         'bz2',
         'zip',
+        'tar.zst',
+        'tar.lz',
+        '7z',
     ])
     def test_archive(self, extracted_archive):
         extracted_file = os.path.join(extracted_archive, self.ARCHIVED_FILE)
@@ -84,6 +105,37 @@ class TestArchive(object):
         with open(extracted_file) as f:
             assert f.read().strip() == self.ARCHIVED_FILE_CONTENT
 
+    @pytest.mark.parametrize('archive, filename, archive_type', [
+        (TAR_XZ, 'archive.tar.xz', TarXzArchiveType),
+        (TAR_XZ, 'archive.tar.gz', TarXzArchiveType),
+        (TAR_ZST, 'archive', TarZstArchiveType),
+        (TAR_LZ, 'archive-1.0.tar', TarLzArchiveType),
+        (ZIP, 'archive.jar', ZipArchiveType),
+        (SEVEN_ZIP, 'archive.tar.bz2', SevenZipArchiveType),
+        (BZ2, 'file.txt.bz2', Bz2ArchiveType),
+        (TAR_BZ2, 'archive.tar.bz2', TarBz2ArchiveType),
+        (None, 'archive-1.0.tar.lz', TarLzArchiveType),
+        (BZ2, 'file.txt', None),
+    ], ids=[
+        'extension',
+        'wrong-extension',
+        'no-extension',
+        'tar-extension',
+        'unknown-extension',
+        '7z',
+        'bz2',
+        'tar.bz2',
+        'not-downloaded',
+        'not-recognized',
+    ])
+    def test_get_archive_type(self, archive, filename, archive_type):
+        if archive is not None and archive != filename:
+            os.rename(archive, filename)
+        if archive_type is None:
+            with open(filename, 'w') as f:
+                f.write('not an archive')
+        assert Archive.get_archive_type(filename) is archive_type
+
     @pytest.mark.parametrize('archive', [
         INVALID_TAR_BZ2,
         INVALID_TAR_XZ,
@@ -96,3 +148,152 @@ class TestArchive(object):
         d = os.path.join(workdir, 'dir')
         with pytest.raises(IOError):
             a.extract_archive(d)
+
+    @staticmethod
+    def create_archive(filename, files=100, size=1024):
+        rng = random.Random(0)
+        mode = 'w:' + {'.tar.xz': 'xz', '.tar.gz': 'gz', '.tar.bz2': 'bz2', '.tar': ''}[filename[filename.find('.'):]]
+        with tarfile.open(filename, mode) as tar:
+            for i in range(files):
+                data = '{} {}\n'.format(i, rng.random()).encode('ascii') * rng.randrange(size // 20 + 1)
+                info = tarfile.TarInfo('archive/dir{}/file{}'.format(i % 10, i))
+                info.size = len(data)
+                info.mode = 0o755 if i % 7 == 0 else 0o640
+                info.mtime = 1500000000 + i
+                tar.addfile(info, io.BytesIO(data))
+            info = tarfile.TarInfo('archive/link')
+            info.type = tarfile.SYMTYPE
+            info.linkname = 'dir0/file0'
+            tar.addfile(info)
+            info = tarfile.TarInfo('archive/dir0')
+            info.type = tarfile.DIRTYPE
+            info.mode = 0o700
+            info.mtime = 1400000000
+            tar.addfile(info)
+
+    @staticmethod
+    def get_tree(path, archive):
+        with tarfile.open(archive) as tar:
+            members = [os.path.normpath(n) for n in tar.getnames()]
+        tree = {}
+        for root, dirs, files in os.walk(path):
+            for name in dirs + files:
+                p = os.path.join(root, name)
+                st = os.lstat(p)
+                if os.path.islink(p):
+                    tree[os.path.relpath(p, path)] = ('link', os.readlink(p))
+                elif os.path.isdir(p):
+                    # directories not present in the archive are created with current time
+                    mtime = st.st_mtime if os.path.relpath(p, path) in members else None
+                    tree[os.path.relpath(p, path)] = ('dir', st.st_mode, mtime)
+                else:
+                    with open(p, 'rb') as f:
+                        tree[os.path.relpath(p, path)] = ('file', st.st_mode, st.st_mtime, f.read())
+        return tree
+
+    @pytest.mark.parametrize('archive', [
+        TAR_GZ,
+        TGZ,
+        TAR_XZ,
+        TAR_BZ2,
+    ], ids=[
+        'tar.gz',
+        'tgz',
+        'tar.xz',
+        'tar.bz2',
+    ])
+    def test_extraction_engines(self, archive, workdir):
+        a = Archive(archive)
+        assert a.get_extraction_engine() is not None
+        trees = {}
+        for name in Archive.get_extraction_engines():
+            d = os.path.join(workdir, name)
+            a.extract_archive(d, engine=name)
+            trees[name] = self.get_tree(d, archive)
+        assert all(t == trees['python'] for t in trees.values())
+
+    @pytest.mark.parametrize('archive', [
+        INVALID_TAR_BZ2,
+        INVALID_TAR_XZ,
+    ], ids=[
+        'tar.bz2',
+        'tar.xz',
+    ])
+    def test_extraction_engines_invalid_archive(self, archive, workdir):
+        a = Archive(archive)
+        for name in Archive.get_extraction_engines():
+            with pytest.raises(IOError):
+                a.extract_archive(os.path.join(workdir, name), engine=name)
+
+    @pytest.mark.parametrize('extension', ['.tar.xz', '.tar.gz', '.tar.bz2', '.tar'])
+    def test_extraction_engines_benchmark(self, extension, workdir):
+        filename = 'benchmark' + extension
+        self.create_archive(filename, files=1000, size=8192)
+        trees = {}
+        timings = {}
+        for name in Archive.get_extraction_engines():
+            d = os.path.join(workdir, name)
+            start = time.time()
+            Archive(filename).extract_archive(d, engine=name)
+            timings[name] = time.time() - start
+            trees[name] = self.get_tree(d, filename)
+        print('\n{}: {}'.format(extension, ', '.join('{} {:.3f}s'.format(k, v) for k, v in sorted(timings.items()))))
+        assert len(trees['python']) == 1000 + 12
+        assert all(t == trees['python'] for t in trees.values())
+
+    @pytest.mark.parametrize('extension', ['.tar.xz', '.tar.gz', '.tar.bz2', '.tar'])
+    def test_open_stream(self, extension, workdir):
+        filename = 'stream' + extension
+        self.create_archive(filename)
+        a = Archive(filename)
+        a.extract_archive(os.path.join(workdir, 'python'), engine='python')
+        stream = a.open_stream(os.path.join(workdir, 'stream'))
+        if stream is None:
+            pytest.skip('no streaming extraction engine available')
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(1000), b''):
+                stream.write(chunk)
+        stream.close()
+        assert self.get_tree(os.path.join(workdir, 'stream'), filename) == \
+            self.get_tree(os.path.join(workdir, 'python'), filename)
+
+    @pytest.mark.parametrize('archive', [
+        INVALID_TAR_BZ2,
+        INVALID_TAR_XZ,
+    ], ids=[
+        'tar.bz2',
+        'tar.xz',
+    ])
+    def test_open_stream_invalid_archive(self, archive, workdir):
+        stream = Archive(archive).open_stream(os.path.join(workdir, 'stream'))
+        if stream is None:
+            pytest.skip('no streaming extraction engine available')
+        with open(archive, 'rb') as f:
+            stream.write(f.read())
+        with pytest.raises(IOError):
+            stream.close()
+
+    @pytest.mark.parametrize('extension', ['.tar.zst', '.tar.lz', '.7z'])
+    def test_extraction_engines_external(self, extension, workdir):
+        if not PathHelper.find_executable('bsdtar'):
+            pytest.skip('bsdtar is not available')
+        self.create_archive('reference.tar')
+        Archive('reference.tar').extract_archive(os.path.join(workdir, 'reference'), engine='python')
+        reference = self.get_tree(os.path.join(workdir, 'reference'), 'reference.tar')
+        filename = 'archive' + extension
+        options = {'.tar.zst': ['--zstd'], '.tar.lz': ['--lzip'], '.7z': ['--format', '7zip']}[extension]
+        subprocess.check_call(['bsdtar'] + options + ['-cf', filename, '@reference.tar'])
+        archive_type = Archive.get_archive_type(filename)
+        engines = [n for n, e in Archive.get_extraction_engines().items() if e.supports(archive_type)]
+        assert engines
+        for name in engines:
+            d = os.path.join(workdir, name)
+            Archive(filename).extract_archive(d, engine=name)
+            assert self.get_tree(d, 'reference.tar') == reference
+        if extension != '.7z':
+            stream = Archive(filename).open_stream(os.path.join(workdir, 'stream'))
+            with open(filename, 'rb') as f:
+                for chunk in iter(lambda: f.read(1000), b''):
+                    stream.write(chunk)
+            stream.close()
+            assert self.get_tree(os.path.join(workdir, 'stream'), 'reference.tar') == reference
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+#
+# This tool helps you to rebase package to the latest version
+# Copyright (C) 2013-2014 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Authors: Petr Hracek <phracek@redhat.com>
+#          Tomas Hozza <thozza@redhat.com>
+
+import os
+
+import pytest
+
+from rebasehelper.build_helper import BuildToolBase, SRPMBuildToolBase
+from rebasehelper.build_tools.mock_tool import MockBuildTool
+from rebasehelper.srpm_build_tools.mock_tool import MockSRPMBuildTool
+
+
+class TestBuildHelper(object):
+
+    @pytest.mark.parametrize('cpus, result', [
+        (4, ['--define', '_smp_mflags -j4']),
+        (1, ['--define', '_smp_mflags -j1']),
+        (None, None),
+    ], ids=[
+        'limited',
+        'single',
+        'unlimited',
+    ])
+    def test_get_smp_mflags_options(self, cpus, result):
+        assert BuildToolBase.get_smp_mflags_options(cpus=cpus) == result
+
+    def test_get_smp_mflags_options_no_cpus(self):
+        assert BuildToolBase.get_smp_mflags_options(builder_options='--nocheck') is None
+
+    def test_mock_uniqueext(self):
+        old = MockBuildTool._get_uniqueext('old')  # pylint: disable=protected-access
+        new = MockBuildTool._get_uniqueext('new')  # pylint: disable=protected-access
+        assert old != new
+        # chroots are unique also between concurrently running processes
+        assert str(os.getpid()) in old
+        assert MockBuildTool._get_uniqueext(None) is None  # pylint: disable=protected-access
+
+    def test_get_build_environment(self):
+        # builds in the host environment are described by BuildCacheHelper.get_environment()
+        assert BuildToolBase.get_build_environment(builder_options='--nocheck') is None
+        assert SRPMBuildToolBase.get_build_environment(srpm_builder_options='--nocheck') is None
+        assert MockBuildTool.get_build_environment(builder_options='-r fedora-29-x86_64')['root'] == \
+            'fedora-29-x86_64'
+        assert MockSRPMBuildTool.get_build_environment(srpm_builder_options='-r fedora-29-x86_64')['root'] == \
+            'fedora-29-x86_64'
+        assert MockBuildTool.get_build_environment()['root'] == 'default'
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+#
+# This tool helps you to rebase package to the latest version
+# Copyright (C) 2013-2014 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Authors: Petr Hracek <phracek@redhat.com>
+#          Tomas Hozza <thozza@redhat.com>
+
+import os
+import threading
+import time
+
+import pytest
+
+from rebasehelper.checker import BaseChecker, CheckersRunner
+from rebasehelper.checkers.abipkgdiff_tool import AbiCheckerTool
+from rebasehelper.exceptions import CheckerNotFoundError
+from rebasehelper.helpers.rpm_helper import RpmHelper
+from rebasehelper.results_store import ResultsStore
+
+
+def make_checker(name, category='RPM', parallel_safe=True, barrier=None, error=None):
+    """Creates a checker recording its last run in class attributes."""
+    class Checker(BaseChecker):  # pylint: disable=abstract-method
+        CATEGORY = category
+        PARALLEL_SAFE = parallel_safe
+        started = None
+
+        @classmethod
+        def run_check(cls, results_dir, **kwargs):
+            cls.results_dir = os.path.join(results_dir, cls.name)
+            os.makedirs(cls.results_dir)
+            cls.started = threading.current_thread()
+            if barrier is not None:
+                barrier.wait()
+            if error is not None:
+                raise error
+            return dict(path=cls.results_dir, category=kwargs.get('category'))
+
+    Checker.name = name
+    return Checker
+
+
+class Barrier(object):
+    """Makes threads wait for each other, fails if they don't run concurrently."""
+
+    def __init__(self, parties):
+        self.parties = parties
+        self.waiting = 0
+        self.condition = threading.Condition()
+
+    def wait(self):
+        with self.condition:
+            self.waiting += 1
+            self.condition.notify_all()
+            deadline = time.time() + 10
+            while self.waiting < self.parties:
+                assert time.time() < deadline, 'checkers are not running concurrently'
+                self.condition.wait(1)
+
+
+class TestCheckersRunner(object):
+
+    @pytest.fixture
+    def runner(self):
+        runner = CheckersRunner.__new__(CheckersRunner)
+        runner.checkers = {}
+        return runner
+
+    def test_run_checker_timing(self, runner, workdir, monkeypatch):
+        store = ResultsStore()
+        monkeypatch.setattr('rebasehelper.helpers.timing_helper.results_store', store)
+        runner.checkers['rpm'] = make_checker('rpm')
+        assert runner.run_checker(workdir, 'rpm', category='RPM') == dict(path=os.path.join(workdir, 'rpm'),
+                                                                         category='RPM')
+        assert [(r['name'], r['type']) for r in store.get_timings()['checkers']] == [('rpm', 'RPM')]
+
+    def test_run_checkers_concurrently(self, runner, workdir):
+        barrier = Barrier(3)
+        for name in ['first', 'second', 'third']:
+            runner.checkers[name] = make_checker(name, barrier=barrier)
+        runner.checkers['serial'] = make_checker('serial', parallel_safe=False)
+        runner.checkers['source'] = make_checker('source', category='SOURCE')
+        names = ['third', 'serial', 'missing', 'source', 'first', 'second']
+        results = runner.run_checkers(workdir, names, category='RPM')
+        # results keep order of checker names, checkers of other categories are not run
+        assert [n for n, _ in results] == ['third', 'serial', 'first', 'second']
+        for name, result in results:
+            assert result == dict(path=os.path.join(workdir, name), category='RPM')
+            assert runner.checkers[name].results_dir == os.path.join(workdir, name)
+        assert runner.checkers['serial'].started is threading.current_thread()
+        assert runner.checkers['source'].started is None
+
+    def test_run_checkers_concurrent_runs(self, runner, workdir):
+        # SRPM and RPM checkers can run concurrently in separate stages
+        barrier = Barrier(2)
+        runner.checkers['srpm'] = make_checker('srpm', category='SRPM', barrier=barrier)
+        runner.checkers['rpm'] = make_checker('rpm', category='RPM', barrier=barrier)
+        results = {}
+
+        def run(category):
+            results[category] = runner.run_checkers(os.path.join(workdir, category), ['srpm', 'rpm'],
+                                                    category=category)
+
+        threads = [threading.Thread(target=run, args=(c,)) for c in ['SRPM', 'RPM']]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results == {
+            'SRPM': [('srpm', dict(path=os.path.join(workdir, 'SRPM', 'srpm'), category='SRPM'))],
+            'RPM': [('rpm', dict(path=os.path.join(workdir, 'RPM', 'rpm'), category='RPM'))],
+        }
+        assert runner.checkers['srpm'].results_dir == os.path.join(workdir, 'SRPM', 'srpm')
+        assert runner.checkers['rpm'].results_dir == os.path.join(workdir, 'RPM', 'rpm')
+
+    def test_run_checkers_not_found(self, runner, workdir):
+        runner.checkers['first'] = make_checker('first', error=CheckerNotFoundError())
+        runner.checkers['second'] = make_checker('second')
+        runner.checkers['serial'] = make_checker('serial', parallel_safe=False, error=CheckerNotFoundError())
+        results = runner.run_checkers(workdir, ['first', 'second', 'serial'], category='RPM')
+        # missing checkers are only reported
+        assert results == [('second', dict(path=os.path.join(workdir, 'second'), category='RPM'))]
+
+    def test_run_checkers_failure(self, runner, workdir):
+        runner.checkers['first'] = make_checker('first')
+        runner.checkers['failing'] = make_checker('failing', error=RuntimeError('checker failed'))
+        runner.checkers['third'] = make_checker('third')
+        runner.checkers['serial'] = make_checker('serial', parallel_safe=False)
+        with pytest.raises(RuntimeError) as excinfo:
+            runner.run_checkers(workdir, ['first', 'failing', 'third', 'serial'], category='RPM')
+        assert str(excinfo.value) == 'checker failed'
+        # concurrently running checkers are finished, remaining ones are not run
+        assert runner.checkers['third'].started is not None
+        assert runner.checkers['serial'].started is None
+
+
+class TestBaseChecker(object):
+
+    @pytest.mark.parametrize('jobs', [None, 1, 2])
+    def test_run_commands(self, workdir, jobs):
+        # later commands finish first when running concurrently
+        commands = [
+            ['sh', '-c', 'sleep 0.3; echo first; exit 1'],
+            ['sh', '-c', 'sleep 0.2; echo second'],
+            ['sh', '-c', 'echo third; exit 3'],
+        ]
+        outputs = [os.path.join(workdir, '{}.txt'.format(n)) for n in ['first', 'second', 'third']]
+        checker = make_checker('test')
+        assert checker.run_commands(commands, outputs, jobs) == [1, 0, 3]
+        for output in outputs:
+            with open(output) as f:
+                assert f.read() == '{}\n'.format(os.path.splitext(os.path.basename(output))[0])
+
+    def test_run_commands_jobs(self, workdir):
+        commands = [['sh', '-c', 'touch {}.pid; sleep 0.3; ls | grep -c pid$; rm {}.pid'.format(n, n)]
+                    for n in range(4)]
+        outputs = [os.path.join(workdir, '{}.txt'.format(n)) for n in range(4)]
+        assert make_checker('test').run_commands(commands, outputs, 2) == [0, 0, 0, 0]
+        for output in outputs:
+            with open(output) as f:
+                # at most two commands run at the same time
+                assert int(f.read()) <= 2
+
+    def test_run_commands_not_found(self, workdir):
+        commands = [['sh', '-c', 'echo first'], ['rebase-helper-missing-checker']]
+        outputs = [os.path.join(workdir, 'first.txt'), os.path.join(workdir, 'missing.txt')]
+        with pytest.raises(CheckerNotFoundError) as excinfo:
+            make_checker('test').run_commands(commands, outputs)
+        assert str(excinfo.value) == "Checker 'test' was not found or installed."
+        # remaining commands are finished
+        with open(outputs[0]) as f:
+            assert f.read() == 'first\n'
+
+
+class TestAbiCheckerTool(object):
+
+    def test_run_check_concurrent_runs(self, workdir, monkeypatch):
+        store = ResultsStore()
+        store.set_build_data('old', dict(rpm=['test-1.0-1.x86_64.rpm', 'test-debuginfo-1.0-1.x86_64.rpm']))
+        store.set_build_data('new', dict(rpm=['test-1.1-1.x86_64.rpm', 'test-debuginfo-1.1-1.x86_64.rpm']))
+        monkeypatch.setattr('rebasehelper.checkers.abipkgdiff_tool.results_store', store)
+        monkeypatch.setattr(RpmHelper, 'ARCHES', ['x86_64'])
+        monkeypatch.setattr(AbiCheckerTool, 'name', 'abipkgdiff')
+        barrier = Barrier(2)
+
+        def run_commands(commands, output_files, jobs=None):
+            # only the first run finds ABI changes
+            changed = os.path.join(workdir, 'first') in output_files[0]
+            for output_file in output_files:
+                with open(output_file, 'w') as f:
+                    if changed:
+                        f.write("==== changes of 'libtest.so.1' ====\n")
+            barrier.wait()
+            return [4 if changed else 0 for _ in commands]
+
+        monkeypatch.setattr(AbiCheckerTool, 'run_commands', staticmethod(run_commands))
+        results = {}
+
+        def run(name):
+            results[name] = AbiCheckerTool.run_check(os.path.join(workdir, name))
+
+        threads = [threading.Thread(target=run, args=(n,)) for n in ['first', 'second']]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results['first']['abi_changes']
+        assert results['first']['packages'] == {'test': {'libtest.so.1': {}}}
+        assert not results['second']['abi_changes']
+        assert results['second']['packages'] == {}
@@ -20,9 +20,16 @@
 # Authors: Petr Hracek <phracek@redhat.com>
 #          Tomas Hozza <thozza@redhat.com>
 
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
 import six
 
-from rebasehelper.cli import CLI
+from rebasehelper.cli import CLI, BatchCLI
 
 
 class TestCLI(object):
@@ -71,3 +78,92 @@ class TestCLI(object):
         cli = CLI(arguments)
         for key, value in six.iteritems(cli.args.__dict__):
             assert value == conf[key]
+
+
+class TestBatchCLI(object):
+    def test_get_packages(self):
+        with open('packages', 'w') as f:
+            f.write('# comment\n'
+                    'pkg2 --buildtool mock\n'
+                    '\n')
+        cli = BatchCLI(['pkg1', '--packages-file', 'packages', '--max-builds', '2', '--', '--outputtool', 'json'])
+        assert cli.max_builds == 2
+        assert cli.max_downloads is None
+        assert cli.get_packages() == [
+            (os.path.abspath('pkg1'), ['--outputtool', 'json', '--non-interactive']),
+            (os.path.abspath('pkg2'), ['--outputtool', 'json', '--buildtool', 'mock', '--non-interactive']),
+        ]
+
+
+class TestCLIStartup(object):
+
+    PLUGIN_PACKAGES = ('rebasehelper.build_tools.', 'rebasehelper.srpm_build_tools.', 'rebasehelper.checkers.',
+                       'rebasehelper.output_tools.', 'rebasehelper.versioneers.', 'rebasehelper.spec_hooks.',
+                       'rebasehelper.build_log_hooks.')
+
+    @staticmethod
+    def run(tmpdir, code, *args):
+        env = dict(os.environ, XDG_CACHE_HOME=str(tmpdir), PYTHONPATH=os.pathsep.join(sys.path))
+        return subprocess.check_output([sys.executable, '-c', code] + list(args), env=env,
+                                       stderr=subprocess.STDOUT, cwd=str(tmpdir))
+
+    @classmethod
+    def get_imported_plugins(cls, tmpdir, code, *args):
+        """Runs the code in a new interpreter and gets plugin modules imported by the time it exits."""
+        code = ('import atexit, json, sys\n'
+                'atexit.register(lambda: sys.stdout.write("\\n" + json.dumps(sorted(m for m in sys.modules '
+                'if m.startswith({!r})))))\n'.format(cls.PLUGIN_PACKAGES)) + code
+        output = cls.run(tmpdir, code, *args)
+        return json.loads(output.decode('utf-8').splitlines()[-1])
+
+    @pytest.mark.parametrize('code, args', [
+        ('from rebasehelper.cli import CLI; CLI.build_parser()', []),
+        ('from rebasehelper.cli import CliHelper; CliHelper.run()', ['--version']),
+        ('from rebasehelper.cli import CliHelper; CliHelper.run()', ['--help']),
+    ], ids=[
+        'build-parser',
+        'version',
+        'help',
+    ])
+    def test_plugins_not_imported(self, tmpdir, code, args):
+        # neither building the plugin index in the first run nor reading it in the second one imports plugins
+        for _ in range(2):
+            assert self.get_imported_plugins(tmpdir, code, *args) == []
+
+    def test_help_defaults(self, tmpdir):
+        output = self.run(tmpdir, 'from rebasehelper.cli import CliHelper; CliHelper.run()', '--help')
+        output = ' '.join(output.decode('utf-8').split())
+        # choices and defaults are rendered without importing plugins
+        assert '--buildtool {copr,koji,mock,rpmbuild}' in output
+        assert 'build tool to use, defaults to mock' in output
+        assert 'defaults to abipkgdiff,licensecheck,pkgdiff,rpmdiff if available' in output
+
+    @pytest.mark.benchmark
+    @pytest.mark.parametrize('args', [
+        ['--version'],
+        ['--help'],
+    ], ids=[
+        'version',
+        'help',
+    ])
+    def test_startup_time(self, tmpdir, args):
+        def measure(code):
+            # take the best of several runs to reduce noise
+            result = None
+            for _ in range(5):
+                start = time.time()
+                self.run(tmpdir, code, *args)
+                duration = time.time() - start
+                result = duration if result is None else min(result, duration)
+            return result
+
+        code = 'from rebasehelper.cli import CliHelper; CliHelper.run()'
+        # the same command importing all plugins beforehand, as it used to
+        eager_code = ('from rebasehelper.plugins import PluginIndex\n'
+                      'for entries in PluginIndex.get_index().values():\n'
+                      '    for entry in entries:\n'
+                      '        PluginIndex.load_plugin(entry["name"], entry["target"])\n') + code
+        lazy_time = measure(code)
+        eager_time = measure(eager_code)
+        assert lazy_time < 2.0
+        assert lazy_time < eager_time
@@ -20,13 +20,16 @@
 # Authors: Petr Hracek <phracek@redhat.com>
 #          Tomas Hozza <thozza@redhat.com>
 
+import errno
+import logging
 import os
 import random
 import string
 import sys
+import threading
+import time
 
 import git
-import rpm
 import pytest
 
 from six import StringIO
@@ -37,10 +40,18 @@ from rebasehelper.helpers.input_helper import InputHelper
 from rebasehelper.helpers.download_helper import DownloadHelper
 from rebasehelper.helpers.process_helper import ProcessHelper
 from rebasehelper.helpers.path_helper import PathHelper
+from rebasehelper.helpers.parallel_helper import ParallelHelper
+from rebasehelper.helpers.build_cache_helper import BuildCacheHelper
+from rebasehelper.helpers.spec_cache_helper import SpecCacheHelper
+from rebasehelper.helpers.source_cache_helper import SourceCacheHelper
+from rebasehelper.helpers.timing_helper import TimingHelper
+from rebasehelper.helpers.limit_helper import LimitHelper
 from rebasehelper.helpers.rpm_helper import RpmHelper
 from rebasehelper.helpers.macro_helper import MacroHelper
 from rebasehelper.helpers.lookaside_cache_helper import LookasideCacheHelper
 from rebasehelper.exceptions import DownloadError
+from rebasehelper.logger import LoggerHelper, ColorizingStreamHandler
+from rebasehelper.results_store import results_store
 
 
 class TestGitHelper(object):
@@ -119,6 +130,23 @@ class TestConsoleHelper(object):
         assert capturer.stdout == 'test stdout'
         assert capturer.stderr == 'test stderr'
 
+    def test_capture_output_other_threads(self):
+        test_logger = LoggerHelper.get_basic_logger('rebase-helper-test-capture', logging.INFO)
+        handler = ColorizingStreamHandler()
+        test_logger.addHandler(handler)
+        thread = threading.Thread(target=test_logger.info, args=('from other thread',))
+        try:
+            with ConsoleHelper.Capturer(stdout=True) as capturer:
+                thread.start()
+                # console output of other threads waits until stdout is restored
+                thread.join(0.5)
+                assert thread.is_alive()
+                os.write(sys.__stdout__.fileno(), b'from capturing thread\n')  # pylint: disable=no-member
+            thread.join()
+        finally:
+            test_logger.removeHandler(handler)
+        assert capturer.stdout == 'from capturing thread\n'
+
     @pytest.mark.parametrize('specification, expected_rgb, expected_bit_width', [
         ('rgb:0000/0000/0000', (0x0, 0x0, 0x0), 16),
         ('rgb:ffff/ffff/ffff', (0xffff, 0xffff, 0xffff), 16),
@@ -256,6 +284,38 @@ class TestDownloadHelper(object):
             DownloadHelper.download_file(url, local_file)
         assert not os.path.isfile(local_file)
 
+    @pytest.mark.parametrize('exists', [False, True], ids=['download', 'skip'])
+    def test_download_consumer(self, exists, monkeypatch):
+        """Test that downloaded data are written to a consumer"""
+        content = b''.join(str(i).encode('ascii') for i in range(10000))
+        local_file = 'local_file'
+        if exists:
+            with open(local_file, 'wb') as f:
+                f.write(content)
+
+        class Response(object):
+            status_code = 200
+            headers = {'content-length': str(len(content))}
+
+            @staticmethod
+            def iter_content(chunk_size):
+                for i in range(0, len(content), chunk_size):
+                    yield content[i:i + chunk_size]
+
+        class Consumer(object):
+            data = b''
+
+            def write(self, data):
+                self.data += data
+
+        monkeypatch.setattr(DownloadHelper, 'request', staticmethod(lambda url, **kwargs: Response()))
+        consumer = Consumer()
+        DownloadHelper.download_file('http://example.com/local_file', local_file, blocksize=1000,
+                                     consumer=consumer)
+        assert consumer.data == content
+        with open(local_file, 'rb') as f:
+            assert f.read() == content
+
 
 class TestProcessHelper(object):
     """ ProcessHelper tests """
@@ -524,6 +584,418 @@ class TestPathHelper(object):
         def test_find_without_recursion(self, filelist):
             assert PathHelper.find_first_file(os.path.curdir, "*.spec") == os.path.abspath(filelist[-1])
 
+    def test_find_executable(self, workdir, monkeypatch):
+        os.makedirs('bin')
+        with open(os.path.join('bin', 'tool'), 'w') as f:
+            f.write('#!/bin/sh\n')
+        with open(os.path.join('bin', 'data'), 'w') as f:
+            f.write('data\n')
+        os.chmod(os.path.join('bin', 'tool'), 0o755)
+        monkeypatch.setenv('PATH', os.path.abspath('bin'))
+        assert PathHelper.find_executable('tool') == os.path.abspath(os.path.join('bin', 'tool'))
+        assert PathHelper.find_executable('data') is None
+        assert PathHelper.find_executable('missing') is None
+
+    def test_get_cache_path(self, workdir, monkeypatch):
+        monkeypatch.setenv('XDG_CACHE_HOME', os.path.abspath('cache'))
+        assert PathHelper.get_cache_path('test') == os.path.abspath(os.path.join('cache', 'test'))
+        monkeypatch.delenv('XDG_CACHE_HOME')
+        monkeypatch.setenv('HOME', os.path.abspath('home'))
+        assert PathHelper.get_cache_path('test') == os.path.abspath(os.path.join('home', '.cache', 'test'))
+        # the environment is not modified
+        assert 'XDG_CACHE_HOME' not in os.environ
+
+
+# state changed by functions called in worker processes
+STATE = dict(value=1)
+
+
+def change_state(x):
+    STATE['value'] += x
+    return os.getpid(), STATE['value']
+
+
+def fail(message):
+    raise ValueError(message)
+
+
+class TestParallelHelper(object):
+    """ ParallelHelper tests """
+
+    def test_run(self):
+        def func(x, y):
+            time.sleep(0.1 * (3 - x))
+            return x * y
+        assert ParallelHelper.run(func, [(1, 2), (2, 3), (3, 4)]) == [2, 6, 12]
+
+    def test_run_failure(self):
+        finished = []
+
+        def func(x):
+            if x == 1:
+                raise ValueError(x)
+            time.sleep(0.1)
+            finished.append(x)
+            return x
+        with pytest.raises(ValueError):
+            ParallelHelper.run(func, [(0,), (1,), (2,)])
+        # all calls are finished before the exception is propagated
+        assert sorted(finished) == [0, 2]
+
+    def test_run_empty(self):
+        assert ParallelHelper.run(lambda: None, []) == []
+
+    @pytest.fixture
+    def process_pool(self):
+        ParallelHelper.start_process_pool(2)
+        yield
+        ParallelHelper.stop_process_pool()
+
+    def test_call_in_process(self, process_pool):
+        pid, value = ParallelHelper.call_in_process(change_state, 2)
+        assert pid != os.getpid()
+        assert value == 3
+        # state of the current process is not affected
+        assert STATE['value'] == 1
+        results = ParallelHelper.run(ParallelHelper.call_in_process, [(os.getpid,) for _ in range(4)])
+        assert os.getpid() not in results
+
+    def test_call_in_process_failure(self, process_pool):
+        with pytest.raises(ValueError, match='failure'):
+            ParallelHelper.call_in_process(fail, 'failure')
+        with pytest.raises(RuntimeError, match='did not finish'):
+            ParallelHelper.call_in_process(time.sleep, 2, timeout=0.2)
+
+    def test_call_in_process_no_pool(self):
+        assert not ParallelHelper.has_process_pool()
+        with pytest.raises(RuntimeError, match='not running'):
+            ParallelHelper.call_in_process(os.getpid)
+
+
+class TestBuildCacheHelper(object):
+
+    class FakeSpec(object):
+
+        def __init__(self, path, sources):
+            self.path = path
+            self.sources = sources
+
+        def get_path(self):
+            return self.path
+
+        def get_sources(self):
+            return self.sources
+
+        def get_patches(self):
+            return []
+
+    @pytest.fixture
+    def spec(self, monkeypatch):
+        monkeypatch.setenv('XDG_CACHE_HOME', os.path.abspath('cache'))
+        for name in ['test.spec', 'test-1.0.tar.gz']:
+            with open(name, 'w') as f:
+                f.write(name)
+        return self.FakeSpec(os.path.abspath('test.spec'), [os.path.abspath('test-1.0.tar.gz')])
+
+    def test_get_key(self, spec):
+        key = BuildCacheHelper.get_key(spec, 'rpmbuild', None)
+        assert key == BuildCacheHelper.get_key(spec, 'rpmbuild', None)
+        assert key != BuildCacheHelper.get_key(spec, 'mock', None)
+        with open('test-1.0.tar.gz', 'a') as f:
+            f.write('modified')
+        assert key != BuildCacheHelper.get_key(spec, 'rpmbuild', None)
+        os.remove('test-1.0.tar.gz')
+        assert BuildCacheHelper.get_key(spec, 'rpmbuild', None) is None
+
+    @pytest.mark.parametrize('macro, value', [
+        ('dist', '.fc29'),
+        ('_arch', 'ppc64le'),
+    ])
+    def test_get_key_environment(self, spec, macro, value):
+        key = BuildCacheHelper.get_key(spec, 'rpmbuild', None)
+        MacroHelper.add_macro(macro, value)
+        try:
+            assert key != BuildCacheHelper.get_key(spec, 'rpmbuild', None)
+        finally:
+            MacroHelper.del_macro(macro)
+        assert key == BuildCacheHelper.get_key(spec, 'rpmbuild', None)
+
+    def test_get_key_rpm_version(self, spec, monkeypatch):
+        key = BuildCacheHelper.get_key(spec, 'rpmbuild', None)
+        monkeypatch.setattr('rpm.__version__', '0.0.1')
+        assert key != BuildCacheHelper.get_key(spec, 'rpmbuild', None)
+
+    @pytest.mark.parametrize('options, root', [
+        (None, 'default'),
+        (['-r', 'fedora-29-x86_64'], 'fedora-29-x86_64'),
+        (['--nocheck', '-rfedora-29-x86_64'], 'fedora-29-x86_64'),
+        (['--root=fedora-29-x86_64', '--nocheck'], 'fedora-29-x86_64'),
+        (['--root', 'fedora-29-x86_64'], 'fedora-29-x86_64'),
+    ], ids=[
+        'default',
+        'short',
+        'short-joined',
+        'long-joined',
+        'long',
+    ])
+    def test_get_mock_config(self, monkeypatch, options, root):
+        monkeypatch.setattr(BuildCacheHelper, 'MOCK_CONFIG_DIR', os.path.abspath('mock'))
+        os.makedirs('mock')
+        assert BuildCacheHelper.get_mock_config(options) == dict(root=root, config=None)
+        with open(os.path.join('mock', root + '.cfg'), 'w') as f:
+            f.write("config_opts['root'] = '{}'\n".format(root))
+        config = BuildCacheHelper.get_mock_config(options)
+        assert config['root'] == root
+        assert config['config'] is not None
+        with open(os.path.join('mock', root + '.cfg'), 'a') as f:
+            f.write("config_opts['dist'] = 'fc29'\n")
+        assert BuildCacheHelper.get_mock_config(options)['config'] != config['config']
+
+    def test_get_mock_config_path(self):
+        with open('custom.cfg', 'w') as f:
+            f.write("config_opts['root'] = 'custom'\n")
+        config = BuildCacheHelper.get_mock_config(['-r', os.path.abspath('custom.cfg')])
+        assert config['root'] == os.path.abspath('custom.cfg')
+        assert config['config'] is not None
+
+    def test_store_lookup(self, spec):
+        key = BuildCacheHelper.get_key(spec, 'rpmbuild', None)
+        assert BuildCacheHelper.lookup(key, 'results') is None
+        os.makedirs('SRPM')
+        for name in ['test-1.0-1.src.rpm', 'build.log']:
+            with open(os.path.join('SRPM', name), 'w') as f:
+                f.write(name)
+        build_dict = dict(name='test', version='1.0', srpm=os.path.abspath('SRPM/test-1.0-1.src.rpm'),
+                          logs=[os.path.abspath('SRPM/build.log')])
+        BuildCacheHelper.store(key, build_dict, ['srpm', 'logs'], 'SRPM')
+        cached = BuildCacheHelper.lookup(key, 'results')
+        assert cached == dict(srpm=os.path.join('results', 'SRPM', 'test-1.0-1.src.rpm'),
+                              logs=[os.path.join('results', 'SRPM', 'build.log')])
+        assert os.path.isfile(cached['srpm'])
+        entries = BuildCacheHelper.get_entries()
+        assert len(entries) == 1
+        assert entries[0]['name'] == 'test'
+        assert BuildCacheHelper.evict(entries[0]['size']) == 0
+        assert BuildCacheHelper.prune() == 1
+        assert BuildCacheHelper.lookup(key, 'results') is None
+
+
+class TestSourceCacheHelper(object):
+
+    @pytest.fixture
+    def cache(self, monkeypatch):
+        monkeypatch.setenv('XDG_CACHE_HOME', os.path.abspath('cache'))
+        monkeypatch.setattr(SourceCacheHelper, '_hits', 0)
+        monkeypatch.setattr(SourceCacheHelper, '_misses', 0)
+        with open('test-1.0.tar.gz', 'w') as f:
+            f.write('test-1.0.tar.gz')
+        return SourceCacheHelper.get_key('test-1.0.tar.gz')
+
+    @staticmethod
+    def extract(path):
+        os.makedirs(os.path.join(path, 'test-1.0', 'src'))
+        for name, mode in [('README', 0o644), ('configure', 0o755), ('src/main.c', 0o600)]:
+            with open(os.path.join(path, 'test-1.0', name), 'w') as f:
+                f.write(name)
+            os.chmod(os.path.join(path, 'test-1.0', name), mode)
+        os.symlink('README', os.path.join(path, 'test-1.0', 'README.md'))
+
+    @staticmethod
+    def get_tree(path):
+        tree = {}
+        for root, dirs, files in os.walk(path):
+            for name in dirs + files:
+                p = os.path.join(root, name)
+                if os.path.islink(p):
+                    tree[os.path.relpath(p, path)] = os.readlink(p)
+                elif os.path.isfile(p):
+                    with open(p) as f:
+                        tree[os.path.relpath(p, path)] = (os.stat(p).st_mode, f.read())
+                else:
+                    tree[os.path.relpath(p, path)] = os.stat(p).st_mode
+        return tree
+
+    def test_store_lookup(self, cache):
+        self.extract('extracted')
+        assert not SourceCacheHelper.lookup(cache, 'materialized')
+        assert SourceCacheHelper.store(cache, 'test-1.0.tar.gz', self.extract)
+        assert SourceCacheHelper.lookup(cache, 'materialized')
+        assert self.get_tree('materialized') == self.get_tree('extracted')
+        assert SourceCacheHelper.get_stats() == dict(hits=1, misses=1)
+        entries = SourceCacheHelper.get_entries()
+        assert len(entries) == 1
+        assert entries[0]['name'] == 'test-1.0.tar.gz'
+        assert entries[0]['files'] == 4
+        # replacing a materialized file doesn't affect the cache
+        os.remove(os.path.join('materialized', 'test-1.0', 'README'))
+        with open(os.path.join('materialized', 'test-1.0', 'README'), 'w') as f:
+            f.write('modified')
+        assert SourceCacheHelper.lookup(cache, 'materialized2')
+        assert self.get_tree('materialized2') == self.get_tree('extracted')
+        assert SourceCacheHelper.evict(entries[0]['size']) == 0
+        assert SourceCacheHelper.prune() == 1
+        assert not SourceCacheHelper.lookup(cache, 'materialized3')
+
+    def test_modified_in_place(self, cache):
+        self.extract('extracted')
+        SourceCacheHelper.store(cache, 'test-1.0.tar.gz', self.extract)
+        SourceCacheHelper.lookup(cache, 'materialized')
+        cached = os.path.join(SourceCacheHelper.get_cache_dir(), cache, SourceCacheHelper.TREE_DIR, 'test-1.0')
+        # materialized files never share data with the cache
+        assert not os.path.samefile(os.path.join('materialized', 'test-1.0', 'configure'),
+                                    os.path.join(cached, 'configure'))
+        with open(os.path.join('materialized', 'test-1.0', 'configure'), 'a') as f:
+            f.write('modified')
+        assert SourceCacheHelper.lookup(cache, 'materialized2')
+        assert self.get_tree('materialized2') == self.get_tree('extracted')
+
+    def test_modified_in_place_hardlink(self, cache):
+        self.extract('extracted')
+        SourceCacheHelper.store(cache, 'test-1.0.tar.gz', self.extract)
+        SourceCacheHelper.lookup(cache, 'materialized', hardlink=True)
+        with open(os.path.join('materialized', 'test-1.0', 'configure'), 'a') as f:
+            f.write('modified')
+        # the cached tree is either unaffected, or the damaged entry is detected
+        if SourceCacheHelper.lookup(cache, 'materialized2', hardlink=True):
+            assert self.get_tree('materialized2') == self.get_tree('extracted')
+        else:
+            assert not SourceCacheHelper.get_entries()
+
+    def test_scan_only_hardlinked(self, cache, monkeypatch):
+        self.extract('extracted')
+        SourceCacheHelper.store(cache, 'test-1.0.tar.gz', self.extract)
+        scans = []
+        scan = SourceCacheHelper._scan  # pylint: disable=protected-access
+
+        def scan_wrapper(tree_dir):
+            scans.append(tree_dir)
+            return scan(tree_dir)
+
+        monkeypatch.setattr(SourceCacheHelper, '_scan', staticmethod(scan_wrapper))
+        # copied or reflinked files can't modify the cache
+        assert SourceCacheHelper.lookup(cache, 'materialized')
+        assert SourceCacheHelper.lookup(cache, 'materialized2')
+        assert scans == []
+        # once hardlinked, the entry is checked on every lookup
+        assert SourceCacheHelper.lookup(cache, 'materialized3', hardlink=True)
+        assert scans == []
+        assert SourceCacheHelper.lookup(cache, 'materialized4')
+        assert len(scans) == 1
+
+    def test_store_failure(self, cache):
+        def extract(path):
+            raise IOError('damaged archive')
+        assert not SourceCacheHelper.store(cache, 'test-1.0.tar.gz', extract)
+        assert os.listdir(SourceCacheHelper.get_cache_dir()) == []
+
+
+class TestSpecCacheHelper(object):
+
+    @pytest.fixture
+    def cache(self, monkeypatch):
+        monkeypatch.setenv('XDG_CACHE_HOME', os.path.abspath('cache'))
+        monkeypatch.setattr(SpecCacheHelper, '_entries', {})
+
+    def test_get_key(self):
+        key = SpecCacheHelper.get_key(b'Name: test', 'context')
+        assert key == SpecCacheHelper.get_key(b'Name: test', 'context')
+        assert key != SpecCacheHelper.get_key(b'Name: test2', 'context')
+        assert key != SpecCacheHelper.get_key(b'Name: test', 'context2')
+
+    @pytest.mark.parametrize('persistent', [False, True], ids=['memory', 'disk'])
+    def test_store_lookup(self, cache, monkeypatch, persistent):
+        monkeypatch.setattr(SpecCacheHelper, 'persistent', persistent)
+        data = dict(packages=[dict(name='test', provides=[])], sources=[['test-1.0.tar.gz', 0, 1]], prep='%setup -q',
+                    header=dict(name='test', version='1.0', release='1', epoch=0, requires=[]))
+        key = SpecCacheHelper.get_key(b'Name: test', 'context')
+        assert SpecCacheHelper.lookup(key) is None
+        SpecCacheHelper.store(key, data)
+        assert SpecCacheHelper.lookup(key) == data
+        # simulate a subsequent run
+        monkeypatch.setattr(SpecCacheHelper, '_entries', {})
+        if persistent:
+            assert SpecCacheHelper.lookup(key) == data
+        else:
+            assert SpecCacheHelper.lookup(key) is None
+
+    def test_lookup_invalid(self, cache):
+        key = SpecCacheHelper.get_key(b'Name: test', 'context')
+        SpecCacheHelper.store(key, dict(files={'test-1.0.tar.gz': None}))
+        stats = SpecCacheHelper.get_stats()
+        assert SpecCacheHelper.lookup(key, lambda d: d['files']['test-1.0.tar.gz'] is not None) is None
+        assert SpecCacheHelper.lookup(key, lambda d: d['files']['test-1.0.tar.gz'] is None) is not None
+        assert SpecCacheHelper.get_stats() == dict(hits=stats['hits'] + 1, misses=stats['misses'] + 1)
+
+
+class TestTimingHelper(object):
+
+    @pytest.fixture(autouse=True)
+    def clear_results_store(self):
+        results_store.clear()
+        yield
+        results_store.clear()
+
+    def test_measure(self):
+        with TimingHelper.measure('stages', 'test', version='old') as record:
+            time.sleep(0.1)
+            record['cached'] = True
+        with pytest.raises(ValueError):
+            with TimingHelper.measure('stages', 'fail'):
+                raise ValueError()
+        stages = results_store.get_timings()['stages']
+        assert [s['name'] for s in stages] == ['test', 'fail']
+        assert stages[0]['version'] == 'old'
+        assert stages[0]['cached']
+        assert stages[0]['wall_time'] >= 0.1
+        assert 'failed' not in stages[0]
+        assert stages[1]['failed']
+
+    def test_process(self):
+        assert ProcessHelper.run_subprocess(['sh', '-c', 'exit 3']) == 3
+        process = results_store.get_timings()['processes'][-1]
+        assert process['command'] == 'sh -c exit 3'
+        assert process['returncode'] == 3
+        assert process['max_rss'] > 0
+
+    def test_process_interrupted(self, monkeypatch):
+        wait4 = os.wait4
+        interrupted = []
+
+        def interrupted_wait4(pid, options):
+            if not interrupted:
+                interrupted.append(pid)
+                raise OSError(errno.EINTR, 'Interrupted system call')
+            return wait4(pid, options)
+
+        monkeypatch.setattr(os, 'wait4', interrupted_wait4)
+        assert ProcessHelper.run_subprocess(['sh', '-c', 'exit 3']) == 3
+        assert interrupted
+        assert results_store.get_timings()['processes'][-1]['returncode'] == 3
+
+
+class TestLimitHelper(object):
+
+    def test_limit(self):
+        running = []
+        peak = []
+
+        def func(x):
+            with LimitHelper.limit('builds'):
+                running.append(x)
+                peak.append(len(running))
+                time.sleep(0.1)
+                running.remove(x)
+
+        LimitHelper.set_semaphores(LimitHelper.create_semaphores(builds=2, downloads=None))
+        try:
+            assert 'downloads' not in LimitHelper.semaphores
+            ParallelHelper.run(func, [(x,) for x in range(5)])
+            assert max(peak) == 2
+        finally:
+            LimitHelper.set_semaphores({})
+        with pytest.raises(ValueError):
+            LimitHelper.create_semaphores(unknown=1)
+
 
 class TestRpmHelper(object):
     """ RpmHelper class tests. """
@@ -581,7 +1053,7 @@ class TestRpmHelper(object):
 class TestMacroHelper(object):
 
     def test_get_macros(self):
-        rpm.addMacro('test_macro', 'test_macro value')
+        MacroHelper.add_macro('test_macro', 'test_macro value')
         macros = MacroHelper.dump()
         macros = MacroHelper.filter(macros, name='test_macro', level=-1)
         assert len(macros) == 1
@@ -589,6 +1061,63 @@ class TestMacroHelper(object):
         assert macros[0]['value'] == 'test_macro value'
         assert macros[0]['level'] == -1
 
+    def test_expand_cache(self):
+        MacroHelper.add_macro('test_cached_macro', 'first')
+        stats = MacroHelper.get_cache_stats()
+        assert MacroHelper.expand('%{test_cached_macro}') == 'first'
+        assert MacroHelper.expand('%{test_cached_macro}') == 'first'
+        assert MacroHelper.get_cache_stats()['hits'] == stats['hits'] + 1
+        assert MacroHelper.get_cache_stats()['misses'] == stats['misses'] + 1
+        MacroHelper.add_macro('test_cached_macro', 'second')
+        assert MacroHelper.expand('%{test_cached_macro}') == 'second'
+        MacroHelper.del_macro('test_cached_macro')
+        assert MacroHelper.expand('%{test_cached_macro}') == 'first'
+        MacroHelper.del_macro('test_cached_macro')
+        assert MacroHelper.expand('%{?test_cached_macro}') == ''
+
+    @pytest.mark.parametrize('found_in_snapshot', [
+        True,
+        False,
+    ], ids=[
+        'found_in_snapshot',
+        'added',
+    ])
+    def test_expand_uncacheable_macro(self, tmpdir, found_in_snapshot):
+        counter = tmpdir.join('counter')
+        if not found_in_snapshot:
+            MacroHelper.invalidate()
+            MacroHelper.expand('%{?nil}')
+        MacroHelper.add_macro('test_counter_macro', '%(echo >> {0}; wc -l < {0})'.format(counter))
+        MacroHelper.add_macro('test_counter_wrapper', '%{test_counter_macro}')
+        if found_in_snapshot:
+            # e.g. macros defined in a SPEC file
+            MacroHelper.invalidate()
+        assert MacroHelper.expand('%{test_counter_macro}') == '1'
+        assert MacroHelper.expand('%{test_counter_macro}') == '2'
+        assert MacroHelper.expand('%{test_counter_wrapper}') == '3'
+        assert MacroHelper.expand('%{test_counter_wrapper}') == '4'
+        MacroHelper.del_macro('test_counter_wrapper')
+        MacroHelper.del_macro('test_counter_macro')
+
+    def test_expand_defining_macro(self):
+        MacroHelper.add_macro('test_defined_macro', 'first')
+        MacroHelper.add_macro('test_defining_macro', '%global test_defined_macro second')
+        assert MacroHelper.expand('%{test_defined_macro}') == 'first'
+        MacroHelper.expand('%{test_defining_macro}')
+        assert MacroHelper.expand('%{test_defined_macro}') == 'second'
+
+    def test_dump_snapshot(self):
+        MacroHelper.add_macro('test_snapshot_macro', 'first')
+        snapshot = MacroHelper.dump()
+        assert MacroHelper.dump() is snapshot
+        macros = MacroHelper.filter(snapshot, name='test_snapshot_macro', min_level=-1)
+        assert [m['value'] for m in macros] == ['first']
+        assert macros == MacroHelper.filter(list(snapshot), name='test_snapshot_macro', min_level=-1)
+        MacroHelper.add_macro('test_snapshot_macro', 'second')
+        assert MacroHelper.dump() is not snapshot
+        macros = MacroHelper.filter(MacroHelper.dump(), name='test_snapshot_macro')
+        assert [m['value'] for m in macros] == ['second', 'first']
+
 
 class TestLookasideCacheHelper(object):
 
@@ -25,6 +25,7 @@ import json
 
 import pytest
 
+from rebasehelper.checker import checkers_runner
 from rebasehelper.output_tool import output_tools_runner
 from rebasehelper.output_tools.json_output_tool import JSONOutputTool
 from rebasehelper.output_tools.text_output_tool import TextOutputTool
@@ -69,6 +70,13 @@ class TestOutputTool(object):
         rs.set_info_text('Information text', 'some information text')
         rs.set_info_text('Next Information', 'some another information text')
         rs.set_result_message('success', data['success'])
+        rs.add_timing('stages', {'name': 'prepare_sources', 'start': 0.0, 'wall_time': 1.5})
+        rs.add_timing('builds', {'name': 'srpm', 'version': 'old', 'start': 1.5, 'wall_time': 2.0,
+                                 'cached': True})
+        rs.add_timing('downloads', {'url': 'https://example.com/test-1.2.2.tar.gz', 'bytes': 2097152,
+                                    'start': 0.0, 'wall_time': 2.0, 'throughput': 1048576.0})
+        rs.add_timing('processes', {'command': 'rpmbuild -bs test.spec', 'returncode': 0, 'start': 1.5,
+                                    'wall_time': 2.0, 'cpu_time': 1.0, 'max_rss': 10485760})
 
         return rs
 
@@ -122,7 +130,22 @@ Binary packages and logs are in directory rebase-helper-results/new-build/RPM:
 - test-1.2.2-1.x86_64.rpm
 - test-devel-1.2.2-1.x86_64.rpm
 - logfile3.log
-- logfile4.log""".format(workdir=workdir)
+- logfile4.log
+
+Timings
+=======
+
+Stages:
+- prepare_sources                                1.50 s
+
+Builds:
+- old srpm                                       2.00 s (cached)
+
+Downloads:
+- test-1.2.2.tar.gz: 2.00 MiB in 2.00 s (1.00 MiB/s)
+
+Slowest commands (1 in total, 1.00 s of CPU time):
+- 2.00 s, CPU 1.00 s, peak RSS 10.00 MiB: rpmbuild -bs test.spec""".format(workdir=workdir)
         return expected_output
 
     @staticmethod
@@ -169,6 +192,22 @@ Binary packages and logs are in directory rebase-helper-results/new-build/RPM:
             },
             ResultsStore.RESULTS_SUCCESS: {
                 "success": "Success"
+            },
+            ResultsStore.RESULTS_TIMINGS: {
+                "stages": [
+                    {"name": "prepare_sources", "start": 0.0, "wall_time": 1.5}
+                ],
+                "builds": [
+                    {"name": "srpm", "version": "old", "start": 1.5, "wall_time": 2.0, "cached": True}
+                ],
+                "downloads": [
+                    {"url": "https://example.com/test-1.2.2.tar.gz", "bytes": 2097152, "start": 0.0,
+                     "wall_time": 2.0, "throughput": 1048576.0}
+                ],
+                "processes": [
+                    {"command": "rpmbuild -bs test.spec", "returncode": 0, "start": 1.5, "wall_time": 2.0,
+                     "cpu_time": 1.0, "max_rss": 10485760}
+                ]
             }
         }
         return expected_output
@@ -181,6 +220,29 @@ Binary packages and logs are in directory rebase-helper-results/new-build/RPM:
             lines = [y.strip() for y in f.readlines()]
             assert lines == self.get_expected_text_output(os.path.dirname(results_file_path)).split('\n')
 
+    def test_text_output_tool_incremental(self, results_file_path, monkeypatch):
+        class Checker(object):
+            @classmethod
+            def format(cls, data):
+                return ['rpmdiff output']
+
+        monkeypatch.setattr(checkers_runner, 'checkers', {'rpmdiff': Checker})
+        rs = ResultsStore()
+        rs.set_build_data('new', {'srpm': './test-1.2.2-1.src.rpm', 'rpm': ['./test-1.2.2-1.x86_64.rpm'],
+                                  'logs': ['build.log'], 'incremental': True})
+        rs.set_checker_output('rpmdiff', {'incremental': True})
+        rs.set_result_message('success', 'Success')
+        TextOutputTool.print_summary(results_file_path, rs)
+
+        with open(results_file_path) as f:
+            lines = [y.strip() for y in f.readlines()]
+            assert 'Incrementally rebuilt binary packages and logs are in directory ' \
+                'rebase-helper-results/new-build/RPM:' in lines
+            # short-circuited packages can't be installed, differences in their dependencies are expected
+            assert lines.count(TextOutputTool.SHORT_CIRCUITED_MESSAGE) == 2
+            index = lines.index('rpmdiff output')
+            assert lines[index + 1] == TextOutputTool.SHORT_CIRCUITED_MESSAGE
+
     def test_json_output_tool(self, results_file_path, results_store):
         assert JSONOutputTool.name in output_tools_runner.output_tools
         JSONOutputTool.print_summary(results_file_path, results_store)
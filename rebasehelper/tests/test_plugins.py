@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+#
+# This tool helps you to rebase package to the latest version
+# Copyright (C) 2013-2014 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Authors: Petr Hracek <phracek@redhat.com>
+#          Tomas Hozza <thozza@redhat.com>
+
+import os
+import sys
+import textwrap
+
+import pytest
+
+from rebasehelper.plugins import PluginIndex, PluginLoader
+
+
+class TestPluginIndex(object):
+
+    ENTRY_POINTS = textwrap.dedent("""\
+        [rebasehelper.test_plugins]
+        default = rebasehelper_test_plugins:DefaultPlugin
+        other = rebasehelper_test_plugins:OtherPlugin
+        broken = rebasehelper_test_plugins:MissingPlugin
+        """)
+
+    PLUGINS = textwrap.dedent("""\
+        from rebasehelper.plugins import Plugin
+
+
+        class DefaultPlugin(Plugin):
+            DEFAULT = True
+
+
+        class OtherPlugin(Plugin):
+            pass
+        """)
+
+    @pytest.fixture
+    def distribution(self, workdir, monkeypatch):
+        monkeypatch.setenv('XDG_CACHE_HOME', os.path.join(workdir, 'cache'))
+        monkeypatch.setattr(PluginIndex, '_index', None)
+        monkeypatch.setattr(PluginIndex, 'get_search_paths', staticmethod(lambda: [workdir]))
+        monkeypatch.syspath_prepend(workdir)
+        os.makedirs(os.path.join(workdir, 'test_plugins-1.0.dist-info'))
+        with open(os.path.join(workdir, 'test_plugins-1.0.dist-info', 'entry_points.txt'), 'w') as f:
+            f.write(self.ENTRY_POINTS)
+        with open(os.path.join(workdir, 'rebasehelper_test_plugins.py'), 'w') as f:
+            f.write(self.PLUGINS)
+        yield workdir
+        sys.modules.pop('rebasehelper_test_plugins', None)
+
+    def test_index(self, distribution):
+        index = PluginIndex.get_index()
+        assert index['rebasehelper.test_plugins'] == [
+            dict(name='default', target='rebasehelper_test_plugins:DefaultPlugin'),
+            dict(name='other', target='rebasehelper_test_plugins:OtherPlugin'),
+            dict(name='broken', target='rebasehelper_test_plugins:MissingPlugin'),
+        ]
+        # building the index doesn't import plugins
+        assert 'rebasehelper_test_plugins' not in sys.modules
+        # the index is cached
+        cached_index = PluginIndex._index  # pylint: disable=protected-access
+        PluginIndex._index = None  # pylint: disable=protected-access
+        assert PluginIndex.get_index() == cached_index
+        assert 'rebasehelper_test_plugins' not in sys.modules
+
+    def test_lazy_availability(self, distribution):
+        plugins = PluginLoader.load('rebasehelper.test_plugins')
+        assert list(plugins) == ['default', 'other', 'broken']
+        assert 'rebasehelper_test_plugins' not in sys.modules
+        # availability and default plugins are determined by importing them
+        assert plugins.get_available() == ['default', 'other']
+        assert plugins.get_default() == ['default']
+        assert 'rebasehelper_test_plugins' in sys.modules
+        assert plugins['broken'] is None
+        assert plugins['default'].name == 'default'
+
+    def test_declared_default(self, distribution):
+        plugins = PluginLoader.load('rebasehelper.test_plugins')
+        # default plugins shown in help are read from the source, broken ones are not detected
+        assert plugins.get_declared_default() == ['default']
+        assert 'rebasehelper_test_plugins' not in sys.modules
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+#
+# This tool helps you to rebase package to the latest version
+# Copyright (C) 2013-2014 Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Authors: Petr Hracek <phracek@redhat.com>
+#          Tomas Hozza <thozza@redhat.com>
+
+
+import threading
+import time
+
+import pytest
+
+from rebasehelper.results_store import results_store
+from rebasehelper.scheduler import StageScheduler
+from rebasehelper.helpers.parallel_helper import ParallelHelper
+
+
+class TestStageScheduler(object):
+
+    @pytest.fixture(autouse=True)
+    def clear_results_store(self):
+        results_store.clear()
+        yield
+        results_store.clear()
+
+    @pytest.mark.parametrize('workers', [1, None])
+    def test_dependencies(self, workers):
+        order = []
+        lock = threading.Lock()
+
+        def stage(name, duration=0):
+            def func():
+                time.sleep(duration)
+                with lock:
+                    order.append(name)
+            return func
+
+        scheduler = StageScheduler(workers)
+        scheduler.add_stage('a', stage('a', 0.2))
+        scheduler.add_stage('b', stage('b'), ['a'])
+        scheduler.add_stage('c', stage('c'))
+        scheduler.add_stage('d', stage('d'), ['b', 'c'])
+        scheduler.run()
+        assert order.index('a') < order.index('b') < order.index('d')
+        assert order.index('c') < order.index('d')
+        assert sorted(scheduler.timings) == ['a', 'b', 'c', 'd']
+
+    def test_undeclared_dependency(self):
+        scheduler = StageScheduler()
+        scheduler.add_stage('a', lambda: None)
+        with pytest.raises(ValueError):
+            scheduler.add_stage('a', lambda: None)
+        with pytest.raises(ValueError):
+            scheduler.add_stage('b', lambda: None, ['c'])
+
+    @pytest.mark.parametrize('workers', [1, None])
+    def test_failure(self, workers):
+        def fail():
+            time.sleep(0.1)
+            results_store.set_info_text('c', 'c')
+            raise RuntimeError('c failed')
+
+        scheduler = StageScheduler(workers)
+        scheduler.add_stage('a', lambda: results_store.set_info_text('a', 'a'))
+        scheduler.add_stage('b', lambda: time.sleep(0.2) or results_store.set_info_text('b', 'b'), ['a'])
+        scheduler.add_stage('c', fail)
+        scheduler.add_stage('d', lambda: results_store.set_info_text('d', 'd'))
+        with pytest.raises(RuntimeError):
+            scheduler.run()
+        assert scheduler.failed_stage == 'c'
+        # results of stages declared after the failed one are discarded
+        assert results_store.get_summary_info() == {'a': 'a', 'b': 'b', 'c': 'c'}
+
+    def test_deferred_writes_visible_to_stage(self):
+        seen = []
+
+        def stage():
+            results_store.set_build_data('old', {'srpm': 'old.src.rpm'})
+            seen.append(results_store.get_build('old'))
+
+        scheduler = StageScheduler()
+        scheduler.add_stage('a', stage)
+        scheduler.run()
+        assert seen == [{'srpm': 'old.src.rpm'}]
+        assert results_store.get_build('old') == {'srpm': 'old.src.rpm'}
+
+    def test_deferred_writes_in_helper_threads(self):
+        def stage(name):
+            def func():
+                ParallelHelper.run(lambda i: results_store.set_info_text('{}{}'.format(name, i), name), [(0,), (1,)])
+                if name == 'a':
+                    time.sleep(0.1)
+                    raise RuntimeError('a failed')
+            return func
+
+        scheduler = StageScheduler()
+        scheduler.add_stage('a', stage('a'))
+        scheduler.add_stage('b', stage('b'))
+        with pytest.raises(RuntimeError):
+            scheduler.run()
+        # writes made in threads started by the stages are deferred as well
+        assert results_store.get_summary_info() == {'a0': 'a', 'a1': 'a'}
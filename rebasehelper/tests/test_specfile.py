@@ -20,12 +20,22 @@
 # Authors: Petr Hracek <phracek@redhat.com>
 #          Tomas Hozza <thozza@redhat.com>
 
+import json
 import os
 import re
+import subprocess
+import sys
+import textwrap
+import threading
+import time
 
 import pytest
 
-from rebasehelper.specfile import SpecFile, SpecContent
+from rebasehelper.specfile import SpecFile, SpecContent, SpecSections, MacroDefinitions
+from rebasehelper.scheduler import StageScheduler
+from rebasehelper.helpers.macro_helper import MacroHelper
+from rebasehelper.helpers.parallel_helper import ParallelHelper
+from rebasehelper.helpers.spec_cache_helper import SpecCacheHelper
 from rebasehelper.spec_hooks.typo_fix import TypoFixHook
 from rebasehelper.spec_hooks.pypi_url_fix import PyPIURLFixHook
 from rebasehelper.spec_hooks.escape_macros import EscapeMacrosHook
@@ -104,6 +114,146 @@ class TestSpecFile(object):
         spec_object.save()
         assert spec_object.get_version() == NEW_VERSION
 
+    def test_copy(self, spec_object):
+        new_path = 'test-copy.spec'
+        copy = spec_object.copy(new_path)
+        assert copy.get_path() == new_path
+        assert os.path.isfile(new_path)
+        assert copy.get_version() == spec_object.get_version()
+        assert [p.get_path() for p in copy.get_patches()] == [p.get_path() for p in spec_object.get_patches()]
+        assert str(copy.spec_content) == str(spec_object.spec_content)
+        NEW_VERSION = '1.2.3.4.5'
+        copy.set_version(NEW_VERSION)
+        copy.save()
+        assert copy.get_version() == NEW_VERSION
+        assert spec_object.get_version() == self.VERSION
+        assert 'Version: {}'.format(NEW_VERSION) not in spec_object.spec_content.sections['%package']
+        with open(self.SPEC_FILE) as f:
+            assert str(spec_object.spec_content) == f.read()
+
+    def test_copy_unsaved(self, spec_object):
+        spec_object.spec_content.sections['%package'].append('# unsaved')
+        copy = spec_object.copy('test-copy.spec')
+        assert '# unsaved' not in copy.spec_content.sections['%package']
+
+    def test_cache(self, spec_object, workdir):
+        copy = spec_object.copy('test-copy.spec')
+        copy.set_version('1.2.3')
+        hits = SpecCacheHelper.get_stats()['hits']
+        # parsing the copy changed macro context, the cached macros have to be defined again
+        cached = SpecFile(self.SPEC_FILE, 'Update to %{version}', workdir, download=False)
+        assert SpecCacheHelper.get_stats()['hits'] == hits + 1
+        assert cached.header == spec_object.header
+        assert cached.get_sources() == spec_object.get_sources()
+        assert MacroHelper.expand('%{version}') == self.VERSION
+        assert cached.hdr is not None
+
+    def test_cache_sources(self, workdir):
+        sources_location = os.path.join(workdir, 'sources')
+        os.mkdir(sources_location)
+        stats = SpecCacheHelper.get_stats()
+        spec = SpecFile(self.SPEC_FILE, 'Update to %{version}', sources_location, download=False)
+        SpecFile(self.SPEC_FILE, 'Update to %{version}', sources_location, download=False)
+        assert SpecCacheHelper.get_stats() == dict(hits=stats['hits'] + 1, misses=stats['misses'] + 1)
+        # expanded %prep depends on presence of sources, the SPEC file has to be parsed again once they appear
+        with open(os.path.join(sources_location, os.path.basename(spec.get_sources()[0])), 'w') as f:
+            f.write('archive')
+        SpecFile(self.SPEC_FILE, 'Update to %{version}', sources_location, download=False)
+        assert SpecCacheHelper.get_stats() == dict(hits=stats['hits'] + 1, misses=stats['misses'] + 2)
+        SpecFile(self.SPEC_FILE, 'Update to %{version}', sources_location, download=False)
+        assert SpecCacheHelper.get_stats() == dict(hits=stats['hits'] + 2, misses=stats['misses'] + 2)
+
+    def test_persistent_cache(self, workdir):
+        script = textwrap.dedent('''
+            import json
+            import sys
+            from rebasehelper.specfile import SpecFile
+            from rebasehelper.helpers.macro_helper import MacroHelper
+            from rebasehelper.helpers.spec_cache_helper import SpecCacheHelper
+            SpecCacheHelper.persistent = True
+            spec = SpecFile(sys.argv[1], 'Update to %{version}', sys.argv[2], download=False)
+            print(json.dumps(dict(stats=SpecCacheHelper.get_stats(), header=spec.header,
+                                  sources=spec.get_sources(), version=MacroHelper.expand('%{version}'))))
+        ''')
+        env = dict(os.environ, XDG_CACHE_HOME=os.path.join(workdir, 'cache'), PYTHONPATH=os.pathsep.join(sys.path))
+
+        def run():
+            output = subprocess.check_output([sys.executable, '-c', script, self.SPEC_FILE, workdir], env=env)
+            return json.loads(output.decode('utf-8').splitlines()[-1])
+
+        first = run()
+        second = run()
+        assert first['stats'] == dict(hits=0, misses=1)
+        assert second['stats'] == dict(hits=1, misses=0)
+        assert second['header'] == first['header']
+        assert second['sources'] == first['sources']
+        assert second['version'] == first['version'] == self.VERSION
+
+    def test_concurrent_stages(self, spec_object, workdir):
+        copy = spec_object.copy('test-copy.spec')
+        copy.sources_location = os.path.join(workdir, 'new')
+        os.mkdir(copy.sources_location)
+        copy.set_version('1.2.3')
+        seen = []
+
+        def stage(spec):
+            def func():
+                for _ in range(20):
+                    spec._update_data()
+                    # macros have to be taken in the same context the SPEC file was parsed in
+                    sourcedirs = {m['value'] for m in MacroHelper.filter(spec.macros, name='_sourcedir')}
+                    seen.append(sourcedirs == {spec.sources_location})
+            return func
+
+        scheduler = StageScheduler()
+        scheduler.add_stage('old', stage(spec_object))
+        scheduler.add_stage('new', stage(copy))
+        scheduler.run()
+        assert len(seen) == 40
+        assert all(seen)
+        assert spec_object.get_version() == self.VERSION
+        assert copy.get_version() == '1.2.3'
+
+    def test_parse_in_worker_process(self, spec_object, workdir, monkeypatch):
+        monkeypatch.setattr(SpecCacheHelper, '_entries', {})
+        specs = {}
+
+        def parse(name):
+            sources_location = os.path.join(workdir, name)
+            os.mkdir(sources_location)
+            specs[name] = SpecFile(self.SPEC_FILE, 'Update to %{version}', sources_location, download=False)
+
+        ParallelHelper.start_process_pool(2)
+        try:
+            threads = [threading.Thread(target=parse, args=(n,)) for n in ['first', 'second']]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            ParallelHelper.stop_process_pool()
+        for name, spec in specs.items():
+            # parsed in a worker process, this process parses the SPEC file only if the header is needed
+            assert spec.spc is None
+            assert spec.header == spec_object.header
+            assert spec.get_prep_section() == spec_object.get_prep_section()
+            assert spec.get_version() == self.VERSION
+            assert {m['value'] for m in MacroHelper.filter(spec.macros, name='_sourcedir')} == \
+                {os.path.join(workdir, name)}
+        # macros defined by the SPEC file were replayed
+        assert MacroHelper.expand('%{version}') == self.VERSION
+        assert specs['first'].hdr is not None
+
+    def test_lazy_attributes(self, spec_object):
+        for name in ('category', 'patches'):
+            assert name not in spec_object.__dict__
+        assert spec_object.category is None
+        assert spec_object.get_extra_version_separator() == ''
+        spec_object.set_extra_version_separator('-')
+        assert spec_object.get_extra_version_separator() == '-'
+        spec_object.save()
+        assert spec_object.get_extra_version_separator() == ''
+
     def test_get_package_name(self, spec_object):
         assert spec_object.get_package_name() == self.NAME
 
@@ -237,6 +387,16 @@ class TestSpecFile(object):
         spec_object.set_extra_version('rc1')
         assert spec_object.get_extra_version() == 'rc1'
 
+    def test_get_extra_version_after_parsing_other(self, spec_object):
+        spec_object.set_extra_version('rc1')
+        copy = spec_object.copy('test-copy.spec')
+        copy.set_version('1.2.3')
+        copy.set_extra_version('')
+        # parsing the copy changed macro context, extra version must not be affected
+        assert spec_object.get_extra_version() == 'rc1'
+        assert spec_object.get_extra_version_separator() == ''
+        assert copy.get_extra_version() == ''
+
     def test_update_setup_dirname(self, spec_object):
         prep = spec_object.spec_content.sections['%prep']
         spec_object.update_setup_dirname('test-1.0.2')
@@ -390,3 +550,180 @@ class TestSpecFile(object):
         spec_object.set_tag(tag, value, preserve_macros=preserve_macros)
         for line in lines_preserve if preserve_macros else lines:
             assert line in spec_object.spec_content.sections['%package']
+
+
+class TestSpecContent(object):
+
+    CONTENT = '\n'.join([
+        '%global project test',
+        'Name: test',
+        'Version: 1.0',
+        'Release: 1%{?dist}',
+        'Source: %{name}-%{version}.tar.gz',
+        'Source1: extra.tar.gz',
+        '# comment',
+        'Patch0: fix.patch',
+        'Patch1: other.patch',
+        '%prep',
+        '%setup -q',
+        '%patch0 -p1',
+        '%patch1 -p1',
+    ])
+
+    @staticmethod
+    def assert_index_consistent(section):
+        for name, positions in [
+                ('Source', section.find_tags('Source')),
+                ('Patch', section.find_tags('Patch')),
+                ('Release', section.find_tag('Release'))]:
+            assert positions == [i for i, l in enumerate(section) if re.match(r'^{}\d*\s*:'.format(name), l)]
+
+    def test_index(self):
+        content = SpecContent(self.CONTENT)
+        package = content.sections['%package']
+        assert package.find_tag('Source') == [4]
+        assert package.find_tags('Source') == [4, 5]
+        assert package.find_tags('Patch') == [7, 8]
+        assert package.find_macro_definition('project') == [0]
+        assert content.sections['%prep'].find_directive('setup') == [0]
+        assert content.sections['%prep'].find_directive('patch') == [1, 2]
+
+    def test_index_update(self):
+        content = SpecContent(self.CONTENT)
+        package = content.sections['%package']
+        package.insert(0, 'Source2: another.tar.gz')
+        assert package.find_tags('Source') == [0, 5, 6]
+        del package[7:9]
+        assert package.find_tags('Patch') == [7]
+        package[1] = '#%global project test'
+        assert package.find_macro_definition('project') == []
+        package[4] = '#Release: 1%{?dist}'
+        package.append('Release: 2%{?dist}')
+        assert package.find_tag('Release') == [len(package) - 1]
+        assert package.pop(0) == 'Source2: another.tar.gz'
+        self.assert_index_consistent(package)
+        content.sections['%package'] = list(package) + ['Patch5: new.patch']
+        self.assert_index_consistent(content.sections['%package'])
+        assert str(content) == str(SpecContent(str(content)))
+
+    def test_lazy_sections(self):
+        content = SpecContent(self.CONTENT + '\n')
+        assert isinstance(content.sections._store['%prep'][1], SpecSections.RawText)
+        assert str(content) == self.CONTENT + '\n'
+        content.sections['%prep'].append('%autopatch')
+        assert isinstance(content.sections._store['%prep'][1], list)
+        assert str(content).endswith('%patch1 -p1\n%autopatch\n')
+
+    @staticmethod
+    def split_sections_naive(content):
+        lines = content.splitlines()
+        headers_re = [re.compile(r'^{0}.*'.format(re.escape(h)), re.IGNORECASE) for h in SpecContent.SECTION_HEADERS]
+        sections = [('%package', [])]
+        for line in lines:
+            if any(r.match(line) for r in headers_re):
+                sections.append((line, []))
+            else:
+                sections[-1][1].append(line)
+        return sections
+
+    def generate_content(self, length):
+        chunk = [
+            '%package -n sub{0}',
+            'Summary: Subpackage {0}',
+            'Requires: %{{name}} = %{{version}}-%{{release}}',
+            '%description -n sub{0}',
+            'Description of subpackage {0}.',
+            '',
+            '%files -n sub{0}',
+            '%{{_libdir}}/sub{0}/*.so',
+            '%doc README.{0}',
+            '',
+        ]
+        lines = self.CONTENT.splitlines()
+        while len(lines) < length:
+            lines.extend(l.format(len(lines)) for l in chunk)
+        return '\n'.join(lines) + '\n'
+
+    def test_split_sections_single_pass(self, monkeypatch):
+        class CountingPattern(object):
+            def __init__(self, pattern):
+                self.pattern = pattern
+                self.calls = 0
+
+            def __getattr__(self, name):
+                self.calls += 1
+                return getattr(self.pattern, name)
+
+        single_pass = CountingPattern(SpecContent.SECTION_HEADER_LINES_RE)
+        per_line = CountingPattern(SpecContent.SECTION_HEADERS_RE)
+        monkeypatch.setattr(SpecContent, 'SECTION_HEADER_LINES_RE', single_pass)
+        monkeypatch.setattr(SpecContent, 'SECTION_HEADERS_RE', per_line)
+        content = self.generate_content(1000)
+        spec_content = SpecContent(content)
+        # headers are found by a single scan of the whole content, not by matching each line
+        assert single_pass.calls == 1
+        assert per_line.calls == 0
+        assert all(isinstance(v[1], SpecSections.RawText)
+                   for v in spec_content.sections._store.values())  # pylint: disable=protected-access
+        assert str(spec_content) == content
+        assert [(h, list(spec_content.sections[h])) for h in spec_content.sections] == \
+            self.split_sections_naive(content)
+
+    @pytest.mark.benchmark
+    @pytest.mark.parametrize('length', [10000, 50000])
+    def test_split_sections_benchmark(self, length):
+        content = self.generate_content(length)
+
+        start = time.time()
+        naive = self.split_sections_naive(content)
+        naive_time = time.time() - start
+        start = time.time()
+        spec_content = SpecContent(content)
+        split_time = time.time() - start
+        start = time.time()
+        text = str(spec_content)
+        str_time = time.time() - start
+
+        assert [(h, list(spec_content.sections[h])) for h in spec_content.sections] == naive
+        assert text == content
+        assert split_time + str_time < naive_time
+
+
+class TestMacroDefinitions(object):
+
+    LINES = [
+        '%global major 1',
+        '%global minor 0',
+        '%{!?release: %global release 1}',
+        '%define func(x) %{expand:',
+        'multi-line}',
+        '%global version %{major}.%{minor}',
+        'Version: %{version}',
+    ]
+
+    def test_index(self):
+        definitions = MacroDefinitions(self.LINES)
+        assert definitions.get_value('release') == '1'
+        assert definitions.get_value('func') == '%{expand:\nmulti-line}'
+        assert definitions.get_value('undefined') is None
+        assert definitions.find_references('%{version}-%{release}%{?dist}') == [('version', (0, 10)),
+                                                                              ('release', (11, 21))]
+        assert definitions.get_dependencies('version') == [('major', (0, 8)), ('minor', (9, 17))]
+
+    @pytest.mark.parametrize('name, value', [
+        ('minor', '1'),
+        ('release', '42'),
+        ('func', 'single-line'),
+        ('major', '%{nil}'),
+    ])
+    def test_redefine(self, name, value):
+        definitions = MacroDefinitions(self.LINES)
+        definitions.get_dependencies('version')
+        definitions.redefine(name, value)
+        assert definitions.get_value(name) == value
+        rebuilt = MacroDefinitions(definitions.get_lines())
+        assert [m.span() for m in definitions.definitions] == [m.span() for m in rebuilt.definitions]
+        assert definitions.get_dependencies('version') == rebuilt.get_dependencies('version')
+        if name == 'func':
+            # options are removed
+            assert '%define func single-line' in definitions.get_lines()
@@ -52,7 +52,7 @@ class VersioneersRunner(object):
         return list(self.versioneers)
 
     def get_available_versioneers(self):
-        return [k for k, v in six.iteritems(self.versioneers) if v]
+        return self.versioneers.get_available()
 
     def run(self, versioneer, package_name, category, versioneer_blacklist=None):
         """